@@ -0,0 +1,218 @@
+"""Teste de carga: milhares de conversas sintéticas pelos handlers reais do bot.
+
+Cada motorista virtual escolhe um roteiro (orçamento, resumo diário ou
+consumo; completo, com entrada inválida ou cancelado) e manda um update de
+cada vez, esperando a resposta do anterior, como uma pessoa no celular. A
+Bot API é ``FakeBotAPI`` com ``--rtt`` de atraso por chamada.
+
+O relatório traz a vazão e p50/p95/p99 por transição de estado (ex:
+``orcamento:distancia``). ``--salvar`` grava o resultado em JSON e
+``--comparar`` confronta com uma rodada anterior: o processo termina com
+código 1 se alguma transição piorou além de ``--tolerancia``.
+
+Uso:
+    python -m benchmarks.bench_carga [motoristas] [--rtt s] [--trabalhadores n]
+                                     [--salvar base.json] [--comparar base.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+from benchmarks import updates
+from benchmarks.fake_api import FakeBotAPI
+from bot_viagem import CONTEXTO, adicionar_handlers
+from processador import ProcessadorPorChat
+from respostas import BTN_CANCELAR
+
+# Transições de estado de cada roteiro: (rótulo, fábrica do update)
+_ORCAMENTO_INICIO = [
+    ("orcamento:inicio", lambda u: updates.botao(u, "novo_orcamento")),
+    ("orcamento:categoria", lambda u: updates.botao(u, "categoria_padrao")),
+]
+_ORCAMENTO_FIM = [
+    ("orcamento:tempo", lambda u: updates.texto(u, "15")),
+    ("orcamento:condicao", lambda u: updates.botao(u, "chuva")),
+]
+_DIARIO_INICIO = [("diario:inicio", lambda u: updates.texto(u, "/diario"))]
+_DIARIO_FIM = [
+    ("diario:ganho", lambda u: updates.texto(u, "150,50")),
+    ("diario:combustivel", lambda u: updates.texto(u, "60")),
+]
+_CONSUMO_INICIO = [("consumo:inicio", lambda u: updates.texto(u, "/consumo"))]
+
+ROTEIROS = {
+    "orcamento": (_ORCAMENTO_INICIO + [("orcamento:distancia", lambda u: updates.texto(u, "5,6"))] + _ORCAMENTO_FIM, 40),
+    "orcamento_invalido": (_ORCAMENTO_INICIO + [
+        ("orcamento:distancia_invalida", lambda u: updates.texto(u, "cinco km")),
+        ("orcamento:distancia", lambda u: updates.texto(u, "5,6")),
+    ] + _ORCAMENTO_FIM, 10),
+    "orcamento_cancelado": (_ORCAMENTO_INICIO + [("orcamento:cancelar", lambda u: updates.texto(u, BTN_CANCELAR))], 10),
+    "diario": (_DIARIO_INICIO + [("diario:corridas", lambda u: updates.texto(u, "12"))] + _DIARIO_FIM, 15),
+    "diario_invalido": (_DIARIO_INICIO + [
+        ("diario:corridas_invalida", lambda u: updates.texto(u, "-3")),
+        ("diario:corridas", lambda u: updates.texto(u, "12")),
+    ] + _DIARIO_FIM, 5),
+    "diario_cancelado": (_DIARIO_INICIO + [("diario:cancelar", lambda u: updates.texto(u, BTN_CANCELAR))], 5),
+    "consumo": (_CONSUMO_INICIO + [
+        ("consumo:litros", lambda u: updates.texto(u, "40")),
+        ("consumo:km", lambda u: updates.texto(u, "520")),
+    ], 10),
+    "consumo_invalido": (_CONSUMO_INICIO + [
+        ("consumo:litros_invalido", lambda u: updates.texto(u, "0")),
+        ("consumo:litros", lambda u: updates.texto(u, "40")),
+        ("consumo:cancelar", lambda u: updates.texto(u, BTN_CANCELAR)),
+    ], 5),
+}
+
+PERCENTIS = (50, 95, 99)
+# Amostras mínimas acima de um percentil para compará-lo entre rodadas
+MIN_CAUDA = 5
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def sortear_roteiros(motoristas, semente=0):
+    """Roteiro de cada motorista, sorteado pelos pesos de ``ROTEIROS``."""
+    nomes = list(ROTEIROS)
+    pesos = [ROTEIROS[nome][1] for nome in nomes]
+    return random.Random(semente).choices(nomes, pesos, k=motoristas)
+
+
+async def rodar(motoristas, rtt=0.0, trabalhadores=64, pausa=0.0, semente=0):
+    """Roda a carga e devolve ``(duração, {transição: [latências em s]}, erros)``."""
+    api = FakeBotAPI(latencia=rtt)
+    await api.start()
+    builder = ApplicationBuilder().token(api.token).context_types(CONTEXTO).base_url(api.base_url).updater(None)
+    if trabalhadores > 1:
+        builder = builder.concurrent_updates(ProcessadorPorChat(trabalhadores))
+    app = builder.build()
+    adicionar_handlers(app)
+
+    concluidos = {}
+    erros = 0
+
+    async def concluir(update, context):
+        concluidos.pop(update.update_id).set()
+
+    async def contar_erro(update, context):
+        nonlocal erros
+        erros += 1
+
+    # Grupo 1: roda depois do handler do bot, no fim de cada update
+    app.add_handler(TypeHandler(Update, concluir), group=1)
+    app.add_error_handler(contar_erro)
+
+    latencias = defaultdict(list)
+    sorteio = random.Random(semente)
+
+    async def motorista(user_id, roteiro):
+        await asyncio.sleep(sorteio.random() * pausa)
+        for rotulo, fabrica in ROTEIROS[roteiro][0]:
+            update = Update.de_json(fabrica(user_id), app.bot)
+            concluidos[update.update_id] = pronto = asyncio.Event()
+            inicio = time.perf_counter()
+            await app.update_queue.put(update)
+            await pronto.wait()
+            latencias[rotulo].append(time.perf_counter() - inicio)
+            if pausa:
+                await asyncio.sleep(sorteio.random() * pausa)
+
+    async with app:
+        await app.start()
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            motorista(2_000_000 + i, roteiro) for i, roteiro in enumerate(sortear_roteiros(motoristas, semente))
+        ))
+        duracao = time.perf_counter() - inicio
+        await app.stop()
+    await api.stop()
+    return duracao, latencias, erros
+
+
+def resumir(duracao, latencias, erros):
+    """Resultado em formato JSON: vazão e percentis (ms) por transição."""
+    total = sum(len(v) for v in latencias.values())
+    transicoes = {}
+    for rotulo, valores in sorted(latencias.items()):
+        ordenados = sorted(valores)
+        transicoes[rotulo] = {"n": len(valores), **{f"p{p}": round(percentil(ordenados, p) * 1e3, 2) for p in PERCENTIS}}
+    return {"updates": total, "duracao_s": round(duracao, 3), "updates_por_s": round(total / duracao, 1),
+            "erros": erros, "transicoes": transicoes}
+
+
+def imprimir(resultado):
+    print(f"{resultado['updates']} updates em {resultado['duracao_s']:.2f} s: "
+          f"{resultado['updates_por_s']:.1f} updates/s, {resultado['erros']} erros")
+    print(f"{'transição':<30}{'n':>7}" + "".join(f"{f'p{p} ms':>11}" for p in PERCENTIS))
+    for rotulo, valores in resultado["transicoes"].items():
+        print(f"{rotulo:<30}{valores['n']:>7}" + "".join(f"{valores[f'p{p}']:>11.2f}" for p in PERCENTIS))
+
+
+def comparar(base, atual, tolerancia):
+    """Mostra a variação de cada percentil e devolve as transições que pioraram além da tolerância."""
+    pioras = []
+    print(f"\nComparação com a base ({base['updates_por_s']:.1f} -> {atual['updates_por_s']:.1f} updates/s)")
+    if atual["updates_por_s"] < base["updates_por_s"] * (1 - tolerancia):
+        pioras.append("vazão")
+    for rotulo, valores in atual["transicoes"].items():
+        anterior = base["transicoes"].get(rotulo)
+        if anterior is None:
+            print(f"{rotulo:<30} (nova)")
+            continue
+        variacoes = []
+        for p in PERCENTIS:
+            chave = f"p{p}"
+            variacao = (valores[chave] - anterior[chave]) / anterior[chave] if anterior[chave] else 0.0
+            variacoes.append(f"{chave} {variacao:+7.1%}")
+            # Só conta como regressão se houver amostras suficientes acima do percentil
+            if variacao > tolerancia and min(valores["n"], anterior["n"]) * (100 - p) / 100 >= MIN_CAUDA:
+                pioras.append(f"{rotulo} {chave}")
+        print(f"{rotulo:<30}" + "  ".join(variacoes))
+    return pioras
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("motoristas", type=int, nargs="?", default=2000)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--trabalhadores", type=int, default=64)
+    parser.add_argument("--pausa", type=float, default=1.0, help="pausa máxima (s) entre mensagens de um motorista")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--salvar")
+    parser.add_argument("--comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    resultado = resumir(*asyncio.run(rodar(args.motoristas, args.rtt, args.trabalhadores, args.pausa, args.semente)))
+    resultado["parametros"] = {"motoristas": args.motoristas, "rtt": args.rtt, "trabalhadores": args.trabalhadores,
+                               "pausa": args.pausa, "semente": args.semente}
+    imprimir(resultado)
+
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        if base.get("parametros") != resultado["parametros"]:
+            print("⚠️ Parâmetros diferentes da base:", base.get("parametros"))
+        pioras = comparar(base, resultado, args.tolerancia)
+        if pioras:
+            print(f"\n❌ Regressão acima de {args.tolerancia:.0%}: " + ", ".join(pioras))
+            sys.exit(1)
+        print("\n✅ Sem regressões.")
+
+
+if __name__ == '__main__':
+    main()
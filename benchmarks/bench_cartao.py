@@ -0,0 +1,112 @@
+"""Cartão do passageiro em PNG: render a frio x com fundo e glifos em cache, pool e file_id.
+
+- frio: fontes, fundo e glifos descartados antes de cada cartão (o custo de
+  desenhar tudo a cada orçamento);
+- quente: fundo pré-rasterizado e glifos prontos, como nos processos do pool;
+- pool: ``CartoesOrcamento.png`` com chaves novas (inclui a ida e volta entre
+  processos) e com chaves repetidas (cache dos PNG);
+- envio: ``reply_photo`` numa Bot API falsa, com upload e com ``file_id``.
+
+Uso: python -m benchmarks.bench_cartao [--cartoes n] [--processos n]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import cartao
+from benchmarks.fake_api import FakeBotAPI
+from telegram import Bot
+
+# Carros de uma frota pequena: cada cartão sai com o de um motorista
+CARROS = ("Toyota Yaris Hatch XL", "Chevrolet Onix Plus", "Hyundai HB20S", "Fiat Cronos Drive")
+
+
+def chaves(n, semente=0):
+    sorteio = random.Random(semente)
+    return [(sorteio.randrange(1000, 15000), round(sorteio.uniform(1, 40), 1), float(sorteio.randrange(5, 90)),
+             sorteio.choice(("Padrão", "Executivo")), sorteio.choice(CARROS)) for _ in range(n)]
+
+
+def _ms(tempos):
+    ms = sorted(t * 1e3 for t in tempos)
+    return f"p50 {statistics.median(ms):7.2f} ms  p95 {ms[int(len(ms) * 0.95)]:7.2f} ms"
+
+
+def _medir(funcao, argumentos):
+    tempos = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+async def _pool_e_envio(lista, processos):
+    cartoes = cartao.CartoesOrcamento(processos, carros=CARROS)
+    inicio = time.perf_counter()
+    cartoes.iniciar()
+    await cartoes.png(lista[0])
+    print(f"{'partida':>14}: {(time.perf_counter() - inicio) * 1e3:7.0f} ms ({processos} processos, primeiro cartão)")
+
+    async def medir(chamadas):
+        tempos = []
+        for chamada in chamadas:
+            inicio = time.perf_counter()
+            await chamada()
+            tempos.append(time.perf_counter() - inicio)
+        return tempos
+
+    novas = lista[1:]
+    print(f"{'pool (novos)':>14}: {_ms(await medir(lambda c=c: cartoes.png(c) for c in novas))}")
+    print(f"{'pool (cache)':>14}: {_ms(await medir(lambda c=c: cartoes.png(c) for c in novas))}")
+
+    # Vários pedidos do mesmo cartão ao mesmo tempo: um render só
+    renderizados = cartoes.renderizados
+    repetido = (99999, 1.0, 1.0, "Padrão", CARROS[0])
+    await asyncio.gather(*(cartoes.png(repetido) for _ in range(10)))
+    assert cartoes.renderizados == renderizados + 1
+
+    api = FakeBotAPI()
+    await api.start()
+    async with Bot(api.token, base_url=api.base_url) as bot:
+        mensagem = await bot.send_message(1, "orçamento")
+        amostra = novas[:50]
+        upload = await medir(lambda c=c: cartoes.enviar(mensagem, c, caption="orçamento") for c in amostra)
+        reenvio = await medir(lambda c=c: cartoes.enviar(mensagem, c, caption="orçamento") for c in amostra)
+    await api.stop()
+    cartoes.fechar()
+    tamanho = statistics.mean(len(cartoes._png[c]) for c in amostra)
+    print(f"{'upload':>14}: {_ms(upload)}  ({tamanho / 1024:.0f} KiB por cartão)")
+    print(f"{'file_id':>14}: {_ms(reenvio)}")
+    print(cartoes.estatisticas())
+
+
+def main(n, processos):
+    lista = chaves(n)
+
+    def frio(*chave):
+        cartao._fontes.clear()
+        cartao._fundos.clear()
+        cartao._glifos.clear()
+        cartao.renderizar(*chave)
+
+    cartao._iniciar(carros=CARROS)
+    t_frio = _medir(frio, lista[:50])
+    inicio = time.perf_counter()
+    cartao._iniciar(carros=CARROS)
+    print(f"{'_iniciar':>14}: {(time.perf_counter() - inicio) * 1e3:7.1f} ms (fundos + glifos)")
+    t_quente = _medir(cartao.renderizar, lista)
+    print(f"{'frio':>14}: {_ms(t_frio)}")
+    print(f"{'quente':>14}: {_ms(t_quente)}  ({statistics.mean(t_frio) / statistics.mean(t_quente):.1f}x)")
+
+    asyncio.run(_pool_e_envio(lista, processos))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cartoes", type=int, default=200)
+    parser.add_argument("--processos", type=int, default=2)
+    args = parser.parse_args()
+    main(args.cartoes, args.processos)
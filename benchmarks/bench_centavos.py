@@ -0,0 +1,68 @@
+"""Preço em centavos inteiros x o cálculo antigo em float, conferidos contra frações exatas.
+
+Sorteia corridas com km e minutos como o motorista digita (até 3 e 2 casas),
+calcula o preço de referência com ``fractions.Fraction`` a partir do texto e
+confere ``calcular_centavos`` e ``calcular_lote`` em todas. O cálculo antigo
+em float entra só para contar quantas corridas ele arredondava errado (ex:
+13,00 que virava 13,0000000001 e subia para 13,50) e para comparar o tempo.
+
+Uso: python -m benchmarks.bench_centavos [corridas]
+"""
+import math
+import random
+import sys
+import timeit
+from fractions import Fraction
+
+from precos import CATEGORIAS, CONDICOES, calcular_centavos, calcular_lote, tarifa_da_categoria
+
+
+def referencia(km, minutos, tarifa, multiplicador):
+    """Preço exato em centavos, com frações a partir do texto digitado."""
+    base, por_km, por_minuto, minima = (Fraction(str(valor)) for valor in tarifa)
+    bruto = (base + por_km * Fraction(km) + por_minuto * Fraction(minutos)) * Fraction(str(multiplicador))
+    return math.ceil(max(bruto, minima) * 2) * 50
+
+
+def preco_float(distance, minutes, tarifa, multiplier):
+    """O cálculo antigo: tudo em float e ``math.ceil(valor * 2) / 2``."""
+    final_raw = max((tarifa.base + tarifa.km * distance + tarifa.minuto * minutes) * multiplier, tarifa.minima)
+    return math.ceil(final_raw * 2) / 2
+
+
+def sortear(n, semente=0):
+    sorteio = random.Random(semente)
+    corridas = []
+    for _ in range(n):
+        km = f"{sorteio.uniform(0, 80):.{sorteio.randint(0, 3)}f}"
+        minutos = f"{sorteio.uniform(0, 180):.{sorteio.randint(0, 2)}f}"
+        corridas.append((km, minutos, sorteio.choice(CATEGORIAS), sorteio.choice(list(CONDICOES))))
+    return corridas
+
+
+def main(n):
+    corridas = sortear(n)
+    numeros = [(float(km), float(minutos), tarifa_da_categoria(categoria), CONDICOES[condicao][0])
+               for km, minutos, categoria, condicao in corridas]
+
+    esperados = [referencia(km, minutos, tarifa_da_categoria(categoria), CONDICOES[condicao][0])
+                 for km, minutos, categoria, condicao in corridas]
+    inteiros = [calcular_centavos(*corrida) for corrida in numeros]
+    lote = calcular_lote(*zip(*((d, m, cat, cond) for (d, m, _, _), (_, _, cat, cond) in zip(numeros, corridas))))
+    antigos = [round(preco_float(*corrida) * 100) for corrida in numeros]
+
+    assert inteiros == esperados, next((c, i, e) for c, i, e in zip(corridas, inteiros, esperados) if i != e)
+    assert lote.tolist() == esperados
+    errados = [(c, a, e) for c, a, e in zip(corridas, antigos, esperados) if a != e]
+    print(f"{n} corridas: centavos e lote iguais à referência; float antigo errou {len(errados)}")
+    for (km, minutos, categoria, condicao), antigo, esperado in errados[:5]:
+        print(f"  {km} km {minutos} min {categoria} {condicao}: float R$ {antigo / 100:.2f}, certo R$ {esperado / 100:.2f}")
+
+    amostra = numeros[:1000]
+    t_float = min(timeit.repeat(lambda: [preco_float(*c) for c in amostra], number=20, repeat=5)) / 20 / len(amostra)
+    t_int = min(timeit.repeat(lambda: [calcular_centavos(*c) for c in amostra], number=20, repeat=5)) / 20 / len(amostra)
+    print(f"por corrida: float {t_float * 1e6:.2f} µs, centavos {t_int * 1e6:.2f} µs")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,88 @@
+"""Exportação do livro de corridas: tempo e pico de memória em fluxo x tudo em memória.
+
+Grava livros sintéticos de tamanhos crescentes e exporta cada um em CSV e
+PDF. O pico de memória (``tracemalloc``) da exportação em fluxo deve ficar
+igual em todos os tamanhos; a referência monta a lista de corridas e o
+arquivo inteiro em memória, como o ``/lote`` faz com o CSV dele.
+
+Uso: python -m benchmarks.bench_exportar [n ...]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import exportar
+from corridas import REGISTRO, LivroCorridas
+
+
+def gravar_livro(pasta, user_id, n, semente=0):
+    """Livro com ``n`` corridas, uma a cada ~20 min a partir de dois anos atrás (gravado direto, sem os totais)."""
+    sorteio = random.Random(semente)
+    ts = int(time.time()) - 2 * 365 * 86400
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, f"{user_id}.bin"), "wb") as arquivo:
+        for inicio in range(0, n, 10000):
+            bloco = bytearray()
+            for _ in range(min(10000, n - inicio)):
+                ts += sorteio.randrange(60, 2400)
+                bloco += REGISTRO.pack(ts, sorteio.randrange(1000, 9000), sorteio.randrange(800, 40000),
+                                       sorteio.randrange(300, 5400), sorteio.randrange(2), sorteio.randrange(4))
+            arquivo.write(bloco)
+
+
+def em_memoria(livro, user_id):
+    """Referência: lista todas as corridas e monta o CSV inteiro num buffer."""
+    corridas = list(livro.corridas(user_id))
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    escritor.writerow(exportar.CABECALHO)
+    escritor.writerows(exportar.campos(corrida) for corrida in corridas)
+    return buffer.getvalue().encode('utf-8-sig')
+
+
+def _medir(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def main(tamanhos):
+    pasta = tempfile.mkdtemp(prefix="bench_exportar_")
+    livro = LivroCorridas(pasta)
+    print(f"{'corridas':>10} {'formato':>8} {'tamanho':>10} {'tempo':>9} {'corridas/s':>11} {'pico':>9}")
+    for user_id, n in enumerate(tamanhos):
+        gravar_livro(pasta, user_id, n)
+        for formato in exportar.FORMATOS:
+            def fluxo():
+                with tempfile.TemporaryFile() as arquivo:
+                    total = exportar.gravar(livro.corridas(user_id), formato, arquivo)
+                    return total, arquivo.tell()
+            (total, tamanho), segundos, pico = _medir(fluxo)
+            assert total.corridas == n
+            print(f"{n:>10} {formato:>8} {tamanho / 2**20:>8.1f}MB {segundos:>8.2f}s {n / segundos:>11,.0f} "
+                  f"{pico / 2**20:>7.2f}MB")
+
+        dados, segundos, pico = _medir(lambda: em_memoria(livro, user_id))
+        with tempfile.TemporaryFile() as arquivo:
+            exportar.gravar(livro.corridas(user_id), "csv", arquivo)
+            arquivo.seek(0)
+            assert arquivo.read() == dados
+        print(f"{n:>10} {'memória':>8} {len(dados) / 2**20:>8.1f}MB {segundos:>8.2f}s {n / segundos:>11,.0f} "
+              f"{pico / 2**20:>7.2f}MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tamanhos", type=int, nargs="*", default=[10_000, 100_000, 250_000])
+    args = parser.parse_args()
+    main(args.tamanhos)
@@ -0,0 +1,111 @@
+"""Frota com milhares de motoristas: consulta, recarga completa x incremental e memória do índice.
+
+Grava num SQLite temporário ``motoristas`` cadastros (um terço com tarifas
+próprias, sorteadas de poucas tabelas, como numa frota de verdade; o resto só
+com o carro) e mede:
+
+- a leitura inicial do cadastro inteiro e a memória do índice;
+- ``Frota.motorista`` por user_id (com e sem cadastro);
+- a recarga depois de alterar ``alterados`` motoristas: incremental
+  (só as versões novas) x ler tudo de novo, conferindo que dão o mesmo índice;
+- a recarga quando nada mudou (``PRAGMA data_version``).
+
+Uso: python -m benchmarks.bench_frota [motoristas] [--alterados n]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import frota
+from precos import TARIFA_EXEC, TARIFA_PADRAO
+
+CARROS = ("Fiat Uno", "Chevrolet Onix", "Hyundai HB20", "Toyota Corolla", "Renault Kwid", "VW Gol")
+# Tabelas de (base, km, minuto, mínima) Padrão e Executivo usadas pelas cooperativas
+TABELAS = (
+    ((3.5, 1.4, 0.22, 12.0), (5.5, 1.8, 0.3, 18.0)),
+    ((3.0, 1.1, 0.18, 9.0), (4.5, 1.5, 0.25, 14.0)),
+    ((4.0, 1.6, 0.25, 14.0), (6.0, 2.0, 0.35, 20.0)),
+)
+
+
+def gerar(motoristas, sorteio):
+    linhas = []
+    for user_id in range(1, motoristas + 1):
+        if sorteio.random() < 1 / 3:
+            padrao, executivo = sorteio.choice(TABELAS)
+        else:
+            padrao = executivo = (None,) * 4
+        linhas.append((user_id, sorteio.choice(CARROS), *padrao, *executivo))
+    return linhas
+
+
+def _padrao():
+    return frota.Motorista("Toyota Yaris Hatch XL", TARIFA_PADRAO, TARIFA_EXEC)
+
+
+def main(motoristas, alterados):
+    sorteio = random.Random(1)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "frota.sqlite3")
+        linhas = gerar(motoristas, sorteio)
+        inicio = time.perf_counter()
+        frota.importar(linhas, caminho)
+        print(f"{motoristas} motoristas gravados em {time.perf_counter() - inicio:.2f} s "
+              f"({os.path.getsize(caminho) / 1024:.0f} KiB)\n")
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        indice = frota.Frota(caminho, _padrao())
+        indice.recarregar()
+        t_inicial = time.perf_counter() - inicio
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"leitura inicial      {t_inicial * 1e3:9.1f} ms   (com tracemalloc) índice {memoria / 1024:.0f} KiB "
+              f"({memoria / motoristas:.0f} B por motorista, {indice.estatisticas()['tarifas_distintas']} tarifas distintas)")
+
+        repeticoes = 200_000
+        ids = [sorteio.randrange(1, 2 * motoristas) for _ in range(1000)]
+        consulta = min(timeit.repeat(lambda: [indice.motorista(i) for i in ids], number=repeticoes // 1000, repeat=5))
+        print(f"consulta por user_id {consulta / repeticoes * 1e9:9.0f} ns   (metade dos ids sem cadastro)")
+
+        t_incremental, t_completa = [], []
+        for rodada in range(5):
+            mudancas = []
+            for user_id in sorteio.sample(range(1, motoristas + 1), alterados):
+                padrao, executivo = sorteio.choice(TABELAS)
+                mudancas.append((user_id, f"{sorteio.choice(CARROS)} {rodada}", *padrao, *executivo))
+            frota.importar(mudancas, caminho)
+            frota.remover(caminho, sorteio.sample(range(1, motoristas + 1), alterados // 10))
+
+            inicio = time.perf_counter()
+            mudou = indice.recarregar()
+            t_incremental.append(time.perf_counter() - inicio)
+            assert alterados <= mudou <= alterados + alterados // 10
+
+            inicio = time.perf_counter()
+            completa = frota.Frota(caminho, _padrao())
+            completa.recarregar()
+            t_completa.append(time.perf_counter() - inicio)
+            completa.fechar()
+            # A recarga incremental chega ao mesmo índice que a leitura do zero
+            assert indice._motoristas == completa._motoristas and indice.versao == completa.versao
+
+        print(f"recarga incremental  {statistics.median(t_incremental) * 1e3:9.2f} ms   "
+              f"({alterados} alterados e {alterados // 10} removidos por rodada)")
+        print(f"recarga completa     {statistics.median(t_completa) * 1e3:9.2f} ms")
+        sem_mudanca = min(timeit.repeat(indice.recarregar, number=1000, repeat=5)) / 1000
+        print(f"recarga sem mudança  {sem_mudanca * 1e6:9.1f} µs   (PRAGMA data_version)")
+        indice.fechar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("motoristas", type=int, nargs="?", default=10_000)
+    parser.add_argument("--alterados", type=int, default=100)
+    args = parser.parse_args()
+    main(args.motoristas, args.alterados)
@@ -0,0 +1,200 @@
+"""/historico com centenas de milhares de orçamentos: FTS5 x LIKE e página por chave x OFFSET.
+
+Grava ``quantidade`` orçamentos de ``chats`` motoristas (um deles, o
+"motorista cheio", com ``--cheio`` orçamentos), parte com cliente e parte com
+rota, e mede:
+
+- a primeira página de uma busca por um termo comum e por um raro, pelo índice
+  FTS5 (``historico.HistoricoOrcamentos``) e por ``LIKE`` nos rótulos, que
+  percorre os orçamentos do chat do mais novo ao mais antigo;
+- a página N (até a última) de ``/historico`` sem termo e com termo, pela
+  chave (``id <`` o último da página anterior) e por ``OFFSET``.
+
+Confere antes que as buscas devolvem as mesmas linhas nos dois caminhos, que
+as páginas por chave, uma atrás da outra, são as mesmas do ``OFFSET`` e que
+a busca de um chat não traz a de outro com o mesmo número negativo (um grupo).
+
+Uso: python -m benchmarks.bench_historico [quantidade] [--chats n] [--cheio n]
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+import unicodedata
+
+from historico import POR_PAGINA, HistoricoOrcamentos, Orcamento, consulta_fts, palavras
+
+NOMES = ("Maria", "José", "Ana", "João", "Antônio", "Francisca", "Carlos", "Paulo", "Pedro", "Lucas", "Luiz",
+         "Marcos", "Luís", "Gabriel", "Rafael", "Daniel", "Márcia", "Fernanda", "Patrícia", "Aline", "Sandra",
+         "Juliana", "Adriana", "Camila", "Bruna", "Letícia", "Amanda", "Jéssica", "Vanessa", "Rodrigo")
+SOBRENOMES = ("Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+              "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa")
+BAIRROS = ("Asa Sul", "Asa Norte", "Lago Sul", "Lago Norte", "Sudoeste", "Noroeste", "Guará", "Águas Claras",
+           "Taguatinga", "Ceilândia", "Samambaia", "Sobradinho", "Planaltina", "Gama", "Santa Maria", "Cruzeiro",
+           "Octogonal", "Park Way", "Vicente Pires", "Jardim Botânico", "Rodoviária", "Aeroporto JK")
+# Termo comum (muitos orçamentos do chat) e raro (um cliente que aparece pouco)
+COMUM, RARO = "asa", "Zuleide"
+MOTORISTA_CHEIO = 1
+PAGINAS = (1, 10, 100, 1000)
+
+
+def _sem_acento(texto):
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+
+
+def _casa(rotulos, termo):
+    """O que o FTS5 deve achar: cada palavra do termo é início de alguma palavra do cliente ou da rota."""
+    palavras_rotulos = [w for rotulo in rotulos if rotulo for w in re.findall(r"\w+", _sem_acento(rotulo))]
+    return all(any(w.startswith(_sem_acento(p)) for w in palavras_rotulos) for p in palavras(termo))
+
+
+def gerar(quantidade, chats, cheio, semente=7):
+    """Linhas de ``orcamentos`` (sem id), em ordem de tempo; o ``RARO`` aparece 20 vezes no motorista cheio."""
+    rng = random.Random(semente)
+    linhas = []
+    ts = 1_700_000_000
+    raros = set(rng.sample(range(quantidade), 20))
+    for i in range(quantidade):
+        ts += rng.randint(1, 120)
+        chat_id = MOTORISTA_CHEIO if i in raros or rng.random() < cheio / quantidade else rng.randint(2, chats)
+        cliente = rota = None
+        if i in raros:
+            cliente = f"Dona {RARO}"
+        elif rng.random() < 0.3:
+            cliente = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}"
+        if rng.random() < 0.4:
+            origem, destino = rng.sample(BAIRROS, 2)
+            rota = f"{origem} → {destino}"
+        metros = rng.randint(800, 40_000)
+        linhas.append((chat_id, ts, 300 + metros // 8, metros, metros // 7, rng.choice(("Padrão", "Executivo")),
+                       rng.choice(("normal", "chuva", "transito")), i + 1, cliente, rota))
+    return linhas
+
+
+def _like(conn, chat_id, termo, limite):
+    # Sem índice para o texto: percorre o chat do mais novo ao mais antigo até achar ``limite``
+    padrao = f"%{termo}%"
+    return [Orcamento(*linha) for linha in conn.execute(
+        "SELECT id, ts, centavos, metros, segundos, categoria, condicao, cliente, rota FROM orcamentos "
+        "WHERE chat_id = ? AND (cliente LIKE ? OR rota LIKE ?) ORDER BY id DESC LIMIT ?",
+        (chat_id, padrao, padrao, limite))]
+
+
+def _offset(historico, chat_id, termo, pagina):
+    conn = historico._conectar()
+    colunas = "o.id, o.ts, o.centavos, o.metros, o.segundos, o.categoria, o.condicao, o.cliente, o.rota"
+    if termo:
+        sql = (f"SELECT {colunas} FROM orcamentos_busca b JOIN orcamentos o ON o.id = b.rowid "
+               f"WHERE orcamentos_busca MATCH ? AND o.chat_id = ? ORDER BY b.rowid DESC LIMIT ? OFFSET ?")
+        parametros = (consulta_fts(chat_id, termo), chat_id, POR_PAGINA, (pagina - 1) * POR_PAGINA)
+    else:
+        sql = f"SELECT {colunas} FROM orcamentos o WHERE o.chat_id = ? ORDER BY o.id DESC LIMIT ? OFFSET ?"
+        parametros = (chat_id, POR_PAGINA, (pagina - 1) * POR_PAGINA)
+    return [Orcamento(*linha) for linha in conn.execute(sql, parametros)]
+
+
+def _chaves(historico, chat_id, termo):
+    """O ``antes`` de cada página, da primeira à última, andando pela chave (o id do fim da página anterior)."""
+    chaves, antes = [None], None
+    while True:
+        pagina = historico._buscar(chat_id, termo, antes, None, POR_PAGINA)
+        if not pagina.mais_antigos:
+            break
+        antes = pagina.orcamentos[-1].id
+        chaves.append(antes)
+    return chaves
+
+
+def _cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def _conferir(historico, linhas):
+    conn = historico._conectar()
+    for termo in (COMUM, RARO.lower(), "marc", "lago norte"):
+        # FTS sem acentos x LIKE: compara com o filtro em Python (LIKE não ignora acentos)
+        fts = historico._buscar(MOTORISTA_CHEIO, termo, None, None, 50).orcamentos
+        esperado = [i + 1 for i in range(len(linhas) - 1, -1, -1)
+                    if linhas[i][0] == MOTORISTA_CHEIO and _casa(linhas[i][8:], termo)][:50]
+        assert [o.id for o in fts] == esperado, (termo, [o.id for o in fts][:5], esperado[:5])
+    assert [o.id for o in _like(conn, MOTORISTA_CHEIO, RARO, 50)] == \
+        [o.id for o in historico._buscar(MOTORISTA_CHEIO, RARO, None, None, 50).orcamentos]
+    for termo in ("", COMUM):
+        antes, pela_chave = None, []
+        for numero in range(1, 41):
+            pagina = historico._buscar(MOTORISTA_CHEIO, termo, antes, None, POR_PAGINA)
+            assert pagina.orcamentos == _offset(historico, MOTORISTA_CHEIO, termo, numero), (termo, numero)
+            pela_chave += pagina.orcamentos
+            antes = pagina.orcamentos[-1].id
+        # E de volta: depois= da ponta da página 2 devolve a página 1
+        volta = historico._buscar(MOTORISTA_CHEIO, termo, None, pela_chave[POR_PAGINA].id + 1, POR_PAGINA)
+        assert volta.orcamentos == pela_chave[:POR_PAGINA], termo
+    # Um grupo (chat negativo) com o mesmo número: o "-" não entra no índice, e a busca não pode misturar os dois
+    with conn:
+        grupo = conn.execute(
+            "INSERT INTO orcamentos (chat_id, ts, centavos, metros, segundos, categoria, condicao, cliente) "
+            "VALUES (?, 0, 1000, 1000, 60, 'Padrão', 'normal', ?)", (-MOTORISTA_CHEIO, RARO)).lastrowid
+    assert grupo not in [o.id for o in historico._buscar(MOTORISTA_CHEIO, RARO, None, None, 50).orcamentos]
+    assert [o.id for o in historico._buscar(-MOTORISTA_CHEIO, RARO, None, None, 50).orcamentos] == [grupo]
+    with conn:
+        conn.execute("DELETE FROM orcamentos WHERE id = ?", (grupo,))
+    print("conferido: FTS = filtro exato (sem acentos, por prefixo), chave = OFFSET nas 40 primeiras páginas, "
+          "chat -n separado do n\n")
+
+
+def main(quantidade, chats, cheio):
+    with tempfile.TemporaryDirectory() as pasta:
+        historico = HistoricoOrcamentos(os.path.join(pasta, "historico.sqlite3"))
+        conn = historico._conectar()
+        linhas = gerar(quantidade, chats, cheio)
+        inicio = time.perf_counter()
+        with conn:
+            conn.executemany(
+                "INSERT INTO orcamentos (chat_id, ts, centavos, metros, segundos, categoria, condicao, mensagem, "
+                "cliente, rota) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+        gravacao = time.perf_counter() - inicio
+        do_cheio = sum(1 for linha in linhas if linha[0] == MOTORISTA_CHEIO)
+        print(f"{quantidade} orçamentos de {chats} chats ({do_cheio} do motorista cheio): "
+              f"gravados em {gravacao:.1f} s ({quantidade / gravacao:,.0f}/s, com o índice FTS5), "
+              f"{os.path.getsize(historico.caminho) / 2 ** 20:.0f} MiB\n")
+
+        _conferir(historico, linhas)
+
+        # Um orçamento por vez, como o bot grava (commit a cada um)
+        inicio = time.perf_counter()
+        for linha in linhas[:2000]:
+            historico._gravar(linha[:8] + linha[9:])
+        print(f"gravação avulsa: {(time.perf_counter() - inicio) / 2000 * 1e6:.0f} µs por orçamento (na thread do banco)\n")
+
+        print(f"{'primeira página':<26} {'FTS5 (ms)':>10} {'LIKE (ms)':>10}")
+        for nome, termo in ((f"termo comum ({COMUM})", COMUM), (f"termo raro ({RARO})", RARO)):
+            fts = _cronometrar(lambda: historico._buscar(MOTORISTA_CHEIO, termo, None, None, POR_PAGINA), 20)
+            like = _cronometrar(lambda: _like(conn, MOTORISTA_CHEIO, termo, POR_PAGINA + 1), 5)
+            print(f"{nome:<26} {fts * 1e3:>10.3f} {like * 1e3:>10.3f}")
+
+        print(f"\n{'página':<26} {'chave (ms)':>10} {'OFFSET (ms)':>11}")
+        for rotulo, termo in (("sem termo", ""), (f"termo {COMUM}", COMUM)):
+            chaves = _chaves(historico, MOTORISTA_CHEIO, termo)
+            # As páginas de PAGINAS que existem e a última
+            for numero in sorted({n for n in PAGINAS if n < len(chaves)} | {len(chaves)}):
+                antes = chaves[numero - 1]
+                chave = _cronometrar(lambda: historico._buscar(MOTORISTA_CHEIO, termo, antes, None, POR_PAGINA), 20)
+                offset = _cronometrar(lambda: _offset(historico, MOTORISTA_CHEIO, termo, numero), 5)
+                print(f"{rotulo + f', página {numero}':<26} {chave * 1e3:>10.3f} {offset * 1e3:>11.3f}")
+        historico._fechar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("quantidade", type=int, nargs="?", default=300_000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--cheio", type=int, default=60_000)
+    args = parser.parse_args()
+    main(args.quantidade, args.chats, args.cheio)
@@ -0,0 +1,85 @@
+"""Rajada de envios contra uma Bot API com limites, com e sem ``LimitadorEnvios``.
+
+Manda ``mensagens`` respostas para cada um de ``chats`` chats ao mesmo tempo
+(o pico de um fim de turno) e conta os 429 recebidos, os envios perdidos e o
+tempo até a última mensagem sair. Também mede quantas chamadas o /start faz
+na primeira vez e nas seguintes.
+
+Uso: python -m benchmarks.bench_limitador [chats] [mensagens]
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Update
+from telegram.error import RetryAfter
+from telegram.ext import ApplicationBuilder
+
+from benchmarks import updates
+from benchmarks.fake_api import FakeBotAPI
+from bot_viagem import CONTEXTO, adicionar_handlers
+from limitador import LimitadorEnvios
+
+# Limites aplicados pelo servidor falso: por chat e global, por segundo
+LIMITES = (3, 30)
+
+
+async def _rajada(chats, mensagens, limitador):
+    api = FakeBotAPI(limites=LIMITES)
+    await api.start()
+    builder = ApplicationBuilder().token(api.token).base_url(api.base_url).updater(None)
+    if limitador:
+        builder = builder.rate_limiter(limitador)
+    app = builder.build()
+
+    perdidas = 0
+
+    async def enviar(chat_id, i):
+        nonlocal perdidas
+        try:
+            await app.bot.send_message(chat_id, f"Mensagem {i}")
+        except RetryAfter:
+            perdidas += 1
+
+    async with app:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(enviar(100 + c, i) for i in range(mensagens) for c in range(chats)))
+        duracao = time.perf_counter() - inicio
+    await api.stop()
+    return api.recusadas, perdidas, duracao
+
+
+async def _chamadas_start():
+    api = FakeBotAPI()
+    await api.start()
+    app = ApplicationBuilder().token(api.token).context_types(CONTEXTO).base_url(api.base_url).updater(None).build()
+    adicionar_handlers(app)
+    contagens = []
+    async with app:
+        for _ in range(2):
+            antes = len(api.chamadas)
+            await app.process_update(Update.de_json(updates.texto(100, "/start"), app.bot))
+            contagens.append(len(api.chamadas) - antes)
+    await api.stop()
+    return contagens
+
+
+async def main(chats, mensagens):
+    total = chats * mensagens
+    print(f"{total} envios ({chats} chats x {mensagens}), servidor com limite de {LIMITES[0]}/s por chat e {LIMITES[1]}/s global")
+    for nome, limitador in (("sem limitador", None), ("LimitadorEnvios", LimitadorEnvios(rajada_chat=LIMITES[0]))):
+        recusadas, perdidas, duracao = await _rajada(chats, mensagens, limitador)
+        print(f"{nome:>16}: {recusadas:4d} respostas 429  {perdidas:4d} envios perdidos  {duracao:6.2f} s")
+        if limitador:
+            print(f"{'':>16}  {limitador.estatisticas()}")
+
+    primeira, seguinte = await _chamadas_start()
+    print(f"/start: {primeira} chamadas à API na primeira vez, {seguinte} nas seguintes")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("chats", type=int, nargs="?", default=40)
+    parser.add_argument("mensagens", type=int, nargs="?", default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.mensagens))
@@ -0,0 +1,41 @@
+"""Compara o cálculo em lote (NumPy) com o laço corrida a corrida (ambos em centavos).
+
+Uso: python -m benchmarks.bench_lote [quantidade ...]
+"""
+import random
+import sys
+import timeit
+
+from precos import CATEGORIAS, CONDICOES, calcular_centavos, calcular_lote, tarifa_da_categoria
+
+
+def gerar_corridas(n, seed=42):
+    rng = random.Random(seed)
+    distancias = [round(rng.uniform(0.5, 60), 1) for _ in range(n)]
+    minutos = [float(rng.randint(3, 120)) for _ in range(n)]
+    categorias = [rng.choice(CATEGORIAS) for _ in range(n)]
+    condicoes = [rng.choice(list(CONDICOES)) for _ in range(n)]
+    return distancias, minutos, categorias, condicoes
+
+
+def laco_escalar(distancias, minutos, categorias, condicoes):
+    return [
+        calcular_centavos(d, m, tarifa_da_categoria(c), CONDICOES[cond][0])
+        for d, m, c, cond in zip(distancias, minutos, categorias, condicoes)
+    ]
+
+
+def main(tamanhos):
+    print(f"{'corridas':>10} {'escalar (ms)':>14} {'lote (ms)':>12} {'ganho':>8}")
+    for n in tamanhos:
+        corridas = gerar_corridas(n)
+        assert laco_escalar(*corridas) == calcular_lote(*corridas).tolist()
+
+        repeticoes = max(3, 20000 // n)
+        escalar = min(timeit.repeat(lambda: laco_escalar(*corridas), number=repeticoes, repeat=5)) / repeticoes
+        lote = min(timeit.repeat(lambda: calcular_lote(*corridas), number=repeticoes, repeat=5)) / repeticoes
+        print(f"{n:>10} {escalar * 1e3:>14.3f} {lote * 1e3:>12.3f} {escalar / lote:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10, 100, 500, 1000, 10000])
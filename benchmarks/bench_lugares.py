@@ -0,0 +1,89 @@
+"""Guia de lugares: abertura do índice (mmap) e busca por prefixo x varredura da lista.
+
+Gera ``n`` nomes sintéticos de bairros e pontos de referência em pt-BR (com
+acentos), monta o índice e mede prefixos digitados sem acento, como o
+motorista digita no celular.
+
+Uso: python -m benchmarks.bench_lugares [n] [--consultas n]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from lugares import GuiaLugares, gravar_indice, normalizar
+
+_TIPOS = ["Jardim", "Vila", "Parque", "Setor", "Residencial", "Conjunto", "Shopping", "Hospital", "Praça", "Estação"]
+_NOMES = ["São", "Santa", "Nossa Senhora", "Bela", "Boa", "Nova", "Alto", "Recanto", "Águas", "Lago", "Monte"]
+_COMPLEMENTOS = ["Paulo", "José", "Luzia", "Vista", "Esperança", "Aparecida", "Conceição", "Ipê", "Jatobá",
+                 "Cristóvão", "Tereza", "Sebastião", "Brasília", "Goiânia", "Norte", "Sul", "Leste", "Oeste"]
+
+
+def gerar_lugares(n, semente=0):
+    sorteio = random.Random(semente)
+    lugares = []
+    for i in range(n):
+        nome = f"{sorteio.choice(_TIPOS)} {sorteio.choice(_NOMES)} {sorteio.choice(_COMPLEMENTOS)} {i}"
+        lugares.append((nome, -15.8 + sorteio.random() * 0.3, -47.9 + sorteio.random() * 0.3, sorteio.random()))
+    return lugares
+
+
+def varredura(lugares, texto, limite=5):
+    """Referência: compara o prefixo com cada palavra de cada nome."""
+    prefixo = normalizar(texto)
+    encontrados = []
+    for numero, (nome, *_) in enumerate(lugares):
+        palavras = normalizar(nome).split()
+        if any(" ".join(palavras[i:]).startswith(prefixo) for i in range(len(palavras))):
+            encontrados.append(numero)
+            if len(encontrados) == limite:
+                break
+    return encontrados
+
+
+def _ms(tempos):
+    ms = sorted(t * 1e3 for t in tempos)
+    return f"p50 {statistics.median(ms):8.3f} ms  p99 {ms[int(len(ms) * 0.99)]:8.3f} ms"
+
+
+def main(n, consultas):
+    lugares = gerar_lugares(n)
+    inicio = time.perf_counter()
+    n_lugares, n_chaves = gravar_indice(lugares, "/tmp/bench_lugares.idx")
+    print(f"{n_lugares} lugares, {n_chaves} chaves, índice em {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    guia = GuiaLugares.abrir("/tmp/bench_lugares.idx")
+    print(f"Abertura (mmap): {(time.perf_counter() - inicio) * 1e3:.2f} ms")
+
+    # A referência percorre na ordem do índice (do mais importante para o menos)
+    ordenados = [(guia.nome(i),) for i in range(guia.n_lugares)]
+    sorteio = random.Random(1)
+    textos = []
+    for _ in range(consultas):
+        palavras = normalizar(sorteio.choice(lugares)[0]).split()
+        inicio_palavra = sorteio.randrange(len(palavras))
+        texto = " ".join(palavras[inicio_palavra:])
+        textos.append(texto[:sorteio.randint(min(3, len(texto)), len(texto))])
+
+    t_indice, t_varredura = [], []
+    for texto in textos:
+        inicio = time.perf_counter()
+        achados = guia.buscar(texto)
+        t_indice.append(time.perf_counter() - inicio)
+        if len(t_varredura) < 50:
+            inicio = time.perf_counter()
+            esperado = varredura(ordenados, texto)
+            t_varredura.append(time.perf_counter() - inicio)
+            assert achados == esperado, (texto, achados, esperado)
+
+    print(f"{'varredura':>10}: {_ms(t_varredura)}")
+    print(f"{'índice':>10}: {_ms(t_indice)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n", type=int, nargs="?", default=100_000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.n, args.consultas)
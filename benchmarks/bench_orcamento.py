@@ -0,0 +1,63 @@
+"""Latência de um orçamento: conversa em 5 passos x /orcamento em um comando.
+
+Processa os updates pelos handlers reais do bot, com a Bot API simulada por
+``FakeBotAPI`` (``--rtt`` acrescenta um atraso por chamada, como a rede real).
+
+Uso: python -m benchmarks.bench_orcamento [quantidade] [--rtt segundos]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+from benchmarks import updates
+from benchmarks.fake_api import FakeBotAPI
+from bot_viagem import CONTEXTO, adicionar_handlers
+
+
+def conversa(user_id):
+    return [
+        updates.botao(user_id, "novo_orcamento"),
+        updates.botao(user_id, "categoria_padrao"),
+        updates.texto(user_id, "5,6"),
+        updates.texto(user_id, "15"),
+        updates.botao(user_id, "chuva"),
+    ]
+
+
+def comando(user_id):
+    return [updates.texto(user_id, "/orcamento 5,6 15 chuva")]
+
+
+async def _medir(app, api, gerar, n):
+    latencias, chamadas = [], len(api.chamadas)
+    for i in range(n):
+        inicio = time.perf_counter()
+        for dados in gerar(100 + i):
+            await app.process_update(Update.de_json(dados, app.bot))
+        latencias.append(time.perf_counter() - inicio)
+    return latencias, (len(api.chamadas) - chamadas) / n
+
+
+async def main(n, rtt):
+    api = FakeBotAPI(latencia=rtt)
+    await api.start()
+    app = ApplicationBuilder().token(api.token).context_types(CONTEXTO).base_url(api.base_url).updater(None).build()
+    adicionar_handlers(app)
+    async with app:
+        for nome, gerar in (("conversa", conversa), ("/orcamento", comando)):
+            latencias, chamadas = await _medir(app, api, gerar, n)
+            ms = [x * 1e3 for x in latencias]
+            print(f"{nome:>11}: {chamadas:.0f} chamadas à API  média {statistics.mean(ms):7.2f} ms  p50 {statistics.median(ms):7.2f} ms")
+    await api.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("quantidade", type=int, nargs="?", default=200)
+    parser.add_argument("--rtt", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.quantidade, args.rtt))
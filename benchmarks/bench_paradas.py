@@ -0,0 +1,112 @@
+"""Orçamento com várias paradas: matriz de rotas e ordem de visita conforme N cresce.
+
+Usa a malha sintética de ``bench_rotas`` (ruas de mão única, avenidas). Para
+cada número de paradas sorteia percursos com todos os pontos a até ``raio``
+km de um centro (passageiros saindo do mesmo lugar) e mede:
+
+- a matriz de rotas par a par com o A* (n² buscas) x um Dijkstra por ponto
+  (n buscas) x ``GrafoRotas.matriz``, que escolhe entre os dois pelo número
+  de pontos, x a mesma matriz saindo do cache;
+- a ordem ótima (Held-Karp) x a heurística, com a diferença de preço da
+  heurística para a ótima.
+
+Até 7 paradas o Held-Karp é conferido contra todas as permutações.
+
+Uso: python -m benchmarks.bench_paradas [lado] [--percursos n] [--raio km]
+"""
+import argparse
+import itertools
+import math
+import random
+import statistics
+import time
+
+import paradas
+from benchmarks.bench_rotas import grade_sintetica
+from precos import TARIFA_PADRAO
+from rotas import montar_grafo
+
+PARADAS = (2, 4, 6, 8, 10, 12, 13, 20, 30, 50)
+# Acima disto o A* par a par e o Held-Karp ficam lentos demais para repetir
+MAX_A_ESTRELA = 30
+MAX_HELD_KARP = 13
+
+
+def _ms(tempos):
+    return f"{statistics.median(tempos) * 1e3:9.2f}"
+
+
+def sortear_pontos(grafo, quantidade, raio, sorteio):
+    """``quantidade`` nós distintos a até ``raio`` km (na grade) de um nó sorteado."""
+    centro = sorteio.randrange(grafo.n_nos)
+    graus = raio * 1000 / 111195
+    perto = [no for no in range(grafo.n_nos)
+             if abs(grafo.lats[no] - grafo.lats[centro]) <= graus and abs(grafo.lons[no] - grafo.lons[centro]) <= graus]
+    return sorteio.sample(perto, quantidade)
+
+
+def main(lado, percursos, raio):
+    inicio = time.perf_counter()
+    grafo = montar_grafo(*grade_sintetica(lado))
+    print(f"Malha {lado}x{lado}: {grafo.n_nos} nós (pré-processamento {time.perf_counter() - inicio:.1f} s), "
+          f"{percursos} percursos por linha com pontos a até {raio:g} km do centro; medianas em ms\n")
+    print(f"{'paradas':>7} {'A* n²':>9} {'Dijkstra n':>10} {'matriz':>9} {'cache':>9} {'Held-Karp':>9} {'heurística':>10} "
+          f"{'diferença':>9}")
+
+    sorteio = random.Random(1)
+    for n in PARADAS:
+        t_pares, t_dijkstra, t_matriz, t_cache, t_exato, t_heuristica, diferencas = [], [], [], [], [], [], []
+        for _ in range(percursos):
+            nos = sortear_pontos(grafo, n + 1, raio, sorteio)
+            pontos = [(grafo.lats[no], grafo.lons[no]) for no in nos]
+
+            if n <= MAX_A_ESTRELA:
+                inicio = time.perf_counter()
+                pares = [[grafo._a_estrela(a, b).segundos if a != b else 0.0 for b in nos] for a in nos]
+                t_pares.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            dijkstra = [grafo._ate_todos(no, set(nos))[0] for no in nos]
+            t_dijkstra.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            matriz = grafo.matriz(pontos)
+            t_matriz.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            assert grafo.matriz(pontos) is matriz
+            t_cache.append(time.perf_counter() - inicio)
+            # Os três caminhos dão os mesmos tempos
+            assert all(math.isclose(x, tempos[no], rel_tol=1e-4, abs_tol=1e-3)
+                       for linha, tempos in zip(matriz.segundos, dijkstra) for x, no in zip(linha, nos))
+            if n <= MAX_A_ESTRELA:
+                assert all(math.isclose(x, y, rel_tol=1e-4, abs_tol=1e-3)
+                           for linha, esperada in zip(matriz.segundos, pares) for x, y in zip(linha, esperada))
+
+            custo = paradas.custos(matriz, TARIFA_PADRAO)
+            inicio = time.perf_counter()
+            heuristica = paradas.heuristica(custo)
+            t_heuristica.append(time.perf_counter() - inicio)
+            assert sorted(heuristica) == list(range(n + 1)) and heuristica[0] == 0
+
+            if n <= MAX_HELD_KARP:
+                inicio = time.perf_counter()
+                exata = paradas.held_karp(custo)
+                t_exato.append(time.perf_counter() - inicio)
+                if n <= 7:
+                    assert paradas.custo_total(custo, exata) == min(
+                        paradas.custo_total(custo, (0, *ordem)) for ordem in itertools.permutations(range(1, n + 1)))
+                otimo = paradas.custo_total(custo, exata)
+                diferencas.append(paradas.custo_total(custo, heuristica) / otimo - 1)
+
+        print(f"{n:>7} {_ms(t_pares) if t_pares else '-':>9} {_ms(t_dijkstra):>10} {_ms(t_matriz):>9} {_ms(t_cache):>9} "
+              f"{_ms(t_exato) if t_exato else '-':>9} {_ms(t_heuristica):>10} "
+              f"{f'{statistics.mean(diferencas):.2%}' if diferencas else '-':>9}")
+    print(f"\nHeld-Karp até {paradas.MAX_EXATO} paradas; diferença = preço variável da heurística acima do ótimo (média)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("lado", type=int, nargs="?", default=100)
+    parser.add_argument("--percursos", type=int, default=10)
+    parser.add_argument("--raio", type=float, default=3.0)
+    args = parser.parse_args()
+    main(args.lado, args.percursos, args.raio)
@@ -0,0 +1,80 @@
+"""Vazão de updates sem persistência, com PicklePersistence e com PersistenciaSQLite.
+
+Processa updates de vários usuários por um handler que grava no user_data,
+chamando ``update_persistence`` periodicamente como a Application faz.
+
+Uso: python -m benchmarks.bench_persistencia [updates] [usuarios]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, PicklePersistence, TypeHandler
+
+from benchmarks.fake_api import FakeBotAPI
+from persistencia import PersistenciaSQLite
+
+# update_persistence a cada N updates (com update_interval=60 s e ~100 updates/s)
+CICLO = 100
+
+
+def _update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Motorista"},
+            "text": "12.5",
+        },
+    }
+
+
+async def _grava(update, context):
+    context.user_data['distance'] = float(update.message.text)
+    context.user_data['minutes'] = 15.0
+    context.user_data['categoria'] = 'Padrão'
+
+
+async def _medir(api, persistence, n, usuarios):
+    builder = ApplicationBuilder().token(api.token).base_url(api.base_url).updater(None)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    app = builder.build()
+    app.add_handler(TypeHandler(Update, _grava))
+
+    updates = [Update.de_json(_update(i, 1 + i % usuarios), None) for i in range(n)]
+    async with app:
+        inicio = time.perf_counter()
+        for i, update in enumerate(updates, start=1):
+            await app.process_update(update)
+            if persistence is not None and i % CICLO == 0:
+                await app.update_persistence()
+        if persistence is not None:
+            await app.update_persistence()
+            await persistence.flush()
+        return n / (time.perf_counter() - inicio)
+
+
+async def main(n, usuarios):
+    api = FakeBotAPI()
+    await api.start()
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = {
+            "sem persistência": await _medir(api, None, n, usuarios),
+            "PicklePersistence": await _medir(api, PicklePersistence(os.path.join(pasta, "bot.pickle")), n, usuarios),
+            "PersistenciaSQLite": await _medir(api, PersistenciaSQLite(os.path.join(pasta, "bot.sqlite3")), n, usuarios),
+        }
+    await api.stop()
+    print(f"{n} updates de {usuarios} usuários")
+    for nome, vazao in resultados.items():
+        print(f"{nome:>20}: {vazao:10.0f} updates/s")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(main(args[0] if args else 20000, args[1] if len(args) > 1 else 2000))
@@ -0,0 +1,102 @@
+"""Muitos motoristas orçando ao mesmo tempo: sequencial x concorrente x ``ProcessadorPorChat``.
+
+Cada motorista faz a conversa completa de orçamento (5 updates) e os updates
+de todos chegam misturados ao acaso, como no pico. A Bot API é simulada por
+``FakeBotAPI`` com ``--rtt`` de atraso por chamada. Mede updates/s, latência
+da chegada do update até o fim do handler e quantos orçamentos terminaram
+certo (updates fora de ordem embaralham a conversa).
+
+O modo sequencial (padrão da Application) roda só ``--sequencial``
+motoristas para não levar minutos; compare pelos updates/s.
+
+Uso: python -m benchmarks.bench_processador [motoristas] [--rtt s] [--trabalhadores n]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+from benchmarks.bench_orcamento import conversa
+from benchmarks.fake_api import FakeBotAPI
+from bot_viagem import CONTEXTO, adicionar_handlers
+from processador import ProcessadorPorChat
+
+
+def _intercalar(conversas):
+    """Mistura as conversas ao acaso (semente fixa), mantendo a ordem de cada uma."""
+    vez = [i for i, passos in enumerate(conversas) for _ in passos]
+    random.Random(0).shuffle(vez)
+    proximos = [iter(passos) for passos in conversas]
+    return [next(proximos[i]) for i in vez]
+
+
+async def _rodar(motoristas, rtt, concorrencia):
+    api = FakeBotAPI(latencia=rtt)
+    await api.start()
+    builder = ApplicationBuilder().token(api.token).context_types(CONTEXTO).base_url(api.base_url).updater(None)
+    if concorrencia is not None:
+        builder = builder.concurrent_updates(concorrencia)
+    app = builder.build()
+    adicionar_handlers(app)
+
+    chegada, latencias = {}, []
+    concluidos = 0
+
+    async def medir(update, context):
+        latencias.append(time.perf_counter() - chegada[update.update_id])
+
+    def contar(metodo, parametros, instante):
+        nonlocal concluidos
+        if metodo == "sendMessage" and str(parametros.get("text", "")).startswith("Olá!"):
+            concluidos += 1
+
+    # Grupo 1: roda depois do handler do bot, no fim de cada update
+    app.add_handler(TypeHandler(Update, medir), group=1)
+    api.ao_chamar(contar)
+
+    conversas = [conversa(1_000_000 + i) for i in range(motoristas)]
+    async with app:
+        await app.start()
+        inicio = time.perf_counter()
+        for dados in _intercalar(conversas):
+            update = Update.de_json(dados, app.bot)
+            chegada[update.update_id] = time.perf_counter()
+            await app.update_queue.put(update)
+        await app.update_queue.join()
+        duracao = time.perf_counter() - inicio
+        await app.stop()
+    await api.stop()
+    return len(latencias) / duracao, latencias, concluidos
+
+
+async def main(motoristas, rtt, trabalhadores, sequencial):
+    print(f"RTT da Bot API: {rtt * 1e3:.0f} ms, {trabalhadores} trabalhadores")
+    modos = (
+        ("sequencial", sequencial, None),
+        ("concorrente sem ordem", motoristas, trabalhadores),
+        ("ProcessadorPorChat", motoristas, ProcessadorPorChat(trabalhadores)),
+    )
+    for nome, n, concorrencia in modos:
+        vazao, latencias, concluidos = await _rodar(n, rtt, concorrencia)
+        ms = sorted(x * 1e3 for x in latencias)
+        p95 = ms[int(len(ms) * 0.95)]
+        print(f"{nome:>22}: {n:5d} motoristas  {vazao:7.0f} updates/s  p50 {statistics.median(ms):8.1f} ms"
+              f"  p95 {p95:8.1f} ms  orçamentos certos {concluidos}/{n}")
+        if isinstance(concorrencia, ProcessadorPorChat):
+            print(f"{'':>22}  {concorrencia.estatisticas()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("motoristas", type=int, nargs="?", default=1000)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--trabalhadores", type=int, default=64)
+    parser.add_argument("--sequencial", type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(main(args.motoristas, args.rtt, args.trabalhadores, args.sequencial))
@@ -0,0 +1,124 @@
+"""Latência dos handlers com o registro de antes (``basicConfig``) x a fila de ``registro.py``.
+
+Conversas de orçamento em 5 passos, ``--chats`` delas ao mesmo tempo, pelos
+handlers reais do bot com a Bot API simulada por ``FakeBotAPI``. Cada
+registro vai para uma saída que escreve na hora ("rápida") ou que leva
+``--escrita`` segundos por linha ("lenta": um disco cheio, um pipe que o
+journald ou o docker não esvazia). Os registros são os mesmos nos dois
+modos (os do httpx e o de fim de cada handler); muda só quem escreve: o
+próprio handler, no loop, ou a thread da fila.
+
+Para cada modo: p50 e p99 de cada update, o tempo total, o tempo até a fila
+terminar de escrever depois do último update, as linhas escritas e as que a
+amostragem deixou de fora.
+
+Uso: python -m benchmarks.bench_registro [--chats n] [--escrita s] [--amostra f]
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+
+import registro
+from benchmarks.bench_orcamento import conversa
+from benchmarks.fake_api import FakeBotAPI
+from bot_viagem import CONTEXTO, adicionar_handlers
+
+
+class Saida:
+    """Stream de texto que conta as linhas e demora ``atraso`` segundos em cada escrita."""
+
+    def __init__(self, atraso=0.0):
+        self.atraso = atraso
+        self.linhas = 0
+
+    def write(self, texto):
+        if self.atraso:
+            time.sleep(self.atraso)
+        self.linhas += texto.count("\n")
+
+    def flush(self):
+        pass
+
+
+def _basic_config(saida):
+    # O que o bot fazia antes: logging.basicConfig(format=..., level=INFO) no stderr
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    escrita = logging.StreamHandler(saida)
+    escrita.setFormatter(logging.Formatter(registro.FORMATO_TEXTO))
+    raiz.addHandler(escrita)
+    raiz.setLevel(logging.INFO)
+    return None
+
+
+def _modos(amostra):
+    return (
+        ("basicConfig", _basic_config),
+        ("fila texto", lambda saida: registro.configurar("texto", saida=saida)),
+        ("fila json", lambda saida: registro.configurar("json", saida=saida)),
+        (f"json {amostra:g}", lambda saida: registro.configurar("json", amostra=amostra, saida=saida)),
+    )
+
+
+async def _conversas(app, chats, primeiro_id):
+    latencias = []
+
+    async def uma(user_id):
+        for dados in conversa(user_id):
+            inicio = time.perf_counter()
+            await app.process_update(Update.de_json(dados, app.bot))
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(uma(primeiro_id + i) for i in range(chats)))
+    return latencias, time.perf_counter() - inicio
+
+
+async def main(chats, escrita, amostra):
+    api = FakeBotAPI()
+    await api.start()
+    app = ApplicationBuilder().token(api.token).context_types(CONTEXTO).base_url(api.base_url).updater(None).build()
+    adicionar_handlers(app)
+    print(f"{chats} conversas de 5 passos ao mesmo tempo; saída lenta: {escrita * 1e3:g} ms por linha\n")
+    print(f"{'saída':<7} {'modo':<12} {'p50 (ms)':>8} {'p99 (ms)':>8} {'total (ms)':>10} "
+          f"{'fila (ms)':>9} {'linhas':>7} {'fora':>6}")
+    primeiro_id = 1000
+    # A partida e o aquecimento dos caches (malha de rotas, cartões) ficam fora da medição, sem escrever nada
+    _basic_config(Saida())
+    async with app:
+        await _conversas(app, 4, 1)
+        for nome_saida, atraso in (("rápida", 0.0), ("lenta", escrita)):
+            for nome, configurar in _modos(amostra):
+                saida = Saida(atraso)
+                atual = configurar(saida)
+                latencias, total = await _conversas(app, chats, primeiro_id)
+                primeiro_id += chats
+                fila = time.perf_counter()
+                if atual is not None:
+                    fora = atual.estatisticas()["amostrados_fora"]
+                    atual.parar()
+                else:
+                    fora = 0
+                fila = time.perf_counter() - fila
+                ms = [x * 1e3 for x in latencias]
+                print(f"{nome_saida:<7} {nome:<12} {statistics.median(ms):>8.2f} "
+                      f"{statistics.quantiles(ms, n=100)[98]:>8.2f} {total * 1e3:>10.0f} {fila * 1e3:>9.0f} "
+                      f"{saida.linhas:>7} {fora:>6}", flush=True)
+    await api.stop()
+    print("\nfila = escrita pendente depois do último update (a thread, fora do loop); "
+          "fora = registros INFO descartados pela amostragem por chat")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--escrita", type=float, default=0.002)
+    parser.add_argument("--amostra", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(main(args.chats, args.escrita, args.amostra))
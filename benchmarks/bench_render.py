@@ -0,0 +1,93 @@
+"""Custo de montar uma resposta: teclados e textos montados a cada vez x respostas.py.
+
+Uso: python -m benchmarks.bench_render
+"""
+import timeit
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+
+from respostas import BTN_CANCELAR, MENU_PRINCIPAL, TECLADO_CANCELAR, cartao_motorista, cartao_passageiro, resumo_diario
+
+CARRO = "Toyota Yaris Hatch XL"
+
+
+def cartoes_antes(preco, distancia, minutos, multiplicador, condicao, categoria, minima):
+    # Como calculate_final montava as respostas antes de respostas.py
+    price_fmt = f"{preco:.2f}".replace('.', ',')
+    driver_msg = (
+        f"<b>🚖 PAINEL DO MOTORISTA</b>\n"
+        f"──────────────\n"
+        f"<b>💵 FINAL: R$ {price_fmt}</b>\n"
+        f"📏 Dist: {distancia} km\n"
+        f"⏱️ Tempo: {minutos:.0f} min\n"
+        f"🌧️ Fator: {multiplicador}x ({condicao})\n"
+        f"Veículo: {CARRO} ({categoria})\n"
+        f"──────────────\n"
+        f"<i>(Mínimo: R$ {minima:.2f})</i>"
+    )
+    passenger_msg = (
+        f"Olá! Segue o orçamento da sua viagem:\n\n"
+        f"<b>R$ {price_fmt}</b>\n\n"
+        f"🚗 <b>Veículo:</b> {CARRO} ({categoria})\n"
+        f"📏 <b>Distância:</b> {distancia} km\n"
+        f"⏱️ <b>Tempo Estimado:</b> {minutos:.0f} min\n\n"
+        f"<i>Qualquer dúvida, estou à disposição!</i>"
+    )
+    keyboard = [
+        [InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")],
+        [InlineKeyboardButton("⛽ Calcular Consumo", callback_data="consumo")],
+        [InlineKeyboardButton("📅 Resumo Diário", callback_data="diario")]
+    ]
+    return driver_msg, passenger_msg, InlineKeyboardMarkup(keyboard)
+
+
+def cartoes_depois(preco, distancia, minutos, multiplicador, condicao, categoria, minima):
+    return (
+        cartao_motorista(preco, distancia, minutos, multiplicador, condicao, CARRO, categoria, minima),
+        cartao_passageiro(preco, distancia, minutos, CARRO, categoria),
+        MENU_PRINCIPAL,
+    )
+
+
+def resumo_antes(rides, earned, fuel_spent, profit, profit_per_ride, margin_pct):
+    earned_fmt = f"{earned:.2f}".replace('.', ',')
+    fuel_fmt = f"{fuel_spent:.2f}".replace('.', ',')
+    profit_fmt = f"{profit:.2f}".replace('.', ',')
+    profit_per_fmt = f"{profit_per_ride:.2f}".replace('.', ',')
+    margin_fmt = f"{margin_pct:.2f}".replace('.', ',')
+    return (
+        f"📊 <b>Resumo Diário</b>\n\n"
+        f"🚖 Corridas: <b>{rides}</b>\n"
+        f"💰 Ganho total: <b>R$ {earned_fmt}</b>\n"
+        f"⛽ Combustível: <b>R$ {fuel_fmt}</b>\n\n"
+        f"🧾 Lucro líquido: <b>R$ {profit_fmt}</b>\n"
+        f"📈 Lucro por corrida: <b>R$ {profit_per_fmt}</b>\n"
+        f"📊 Margem: <b>{margin_fmt}%</b>\n"
+    )
+
+
+def teclado_cancelar_antes():
+    return ReplyKeyboardMarkup([[KeyboardButton(BTN_CANCELAR)]], resize_keyboard=True, one_time_keyboard=True)
+
+
+def _medir(nome, antes, depois):
+    n = 20000
+    t_antes = min(timeit.repeat(antes, number=n, repeat=5)) / n
+    t_depois = min(timeit.repeat(depois, number=n, repeat=5)) / n
+    print(f"{nome:>18}: antes {t_antes * 1e6:7.2f} µs  depois {t_depois * 1e6:7.2f} µs  ({t_antes / t_depois:.1f}x)")
+
+
+def main():
+    args = (13.0, 5.6, 15.0, 1.2, "Chuva/Noite", "Padrão", 10.0)
+    antes, depois = cartoes_antes(*args), cartoes_depois(*args)
+    assert antes[:2] == depois[:2] and antes[2] == depois[2]
+    resumo_args = (12, 350.5, 80.0, 270.5, 22.54, 77.18)
+    assert resumo_antes(*resumo_args) == resumo_diario(*resumo_args)
+
+    _medir("cartões + menu", lambda: cartoes_antes(*args), lambda: cartoes_depois(*args))
+    _medir("resumo diário", lambda: resumo_antes(*resumo_args), lambda: resumo_diario(*resumo_args))
+    _medir("teclado cancelar", teclado_cancelar_antes, lambda: TECLADO_CANCELAR)
+
+
+if __name__ == '__main__':
+    main()
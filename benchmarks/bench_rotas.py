@@ -0,0 +1,109 @@
+"""Consultas de rota numa malha sintética: Dijkstra x A* com landmarks x cache.
+
+A malha é uma grade ``lado`` x ``lado`` (~100 m entre esquinas) com
+avenidas mais rápidas a cada 10 quadras, ruas de mão única alternadas e
+algumas quadras fechadas. O A* é conferido contra o Dijkstra em todas as
+consultas.
+
+Uso: python -m benchmarks.bench_rotas [lado] [--consultas n] [--landmarks n]
+"""
+import argparse
+import heapq
+import math
+import random
+import statistics
+import time
+
+from rotas import GrafoRotas, montar_grafo
+
+# Centro aproximado de Brasília; 0,0009° ~ 100 m
+_LAT, _LON, _PASSO = -15.79, -47.88, 0.0009
+
+
+def grade_sintetica(lado, semente=0):
+    """Nós e arestas no formato de ``rotas.ler_osm``."""
+    sorteio = random.Random(semente)
+    coordenadas = {i * lado + j: (_LAT + i * _PASSO, _LON + j * _PASSO) for i in range(lado) for j in range(lado)}
+    arestas = []
+    for i in range(lado):
+        for j in range(lado):
+            no = i * lado + j
+            for vizinho, linha, avenida in ((no + 1, i, i % 10 == 0), (no + lado, j, j % 10 == 0)):
+                if vizinho >= lado * lado or (vizinho == no + 1 and j == lado - 1) or sorteio.random() < 0.03:
+                    continue
+                velocidade = 60 if avenida else 30
+                # Ruas comuns alternam o sentido; avenidas são de mão dupla
+                if avenida or linha % 4 == 1:
+                    arestas += [(no, vizinho, velocidade), (vizinho, no, velocidade)]
+                elif linha % 4 == 0 or linha % 4 == 2:
+                    arestas.append((no, vizinho, velocidade))
+                else:
+                    arestas.append((vizinho, no, velocidade))
+    return coordenadas, arestas
+
+
+def dijkstra(grafo, origem, destino):
+    tempo = {origem: 0.0}
+    fila = [(0.0, origem)]
+    while fila:
+        t, u = heapq.heappop(fila)
+        if u == destino:
+            return t
+        if t > tempo[u]:
+            continue
+        for aresta in range(grafo.inicios[u], grafo.inicios[u + 1]):
+            v = grafo.destinos[aresta]
+            novo = t + grafo.segundos[aresta]
+            if novo < tempo.get(v, math.inf):
+                tempo[v] = novo
+                heapq.heappush(fila, (novo, v))
+    return None
+
+
+def _ms(tempos):
+    ms = sorted(t * 1e3 for t in tempos)
+    return f"p50 {statistics.median(ms):7.2f} ms  p95 {ms[int(len(ms) * 0.95)]:7.2f} ms"
+
+
+def main(lado, consultas, landmarks):
+    inicio = time.perf_counter()
+    grafo = montar_grafo(*grade_sintetica(lado), n_landmarks=landmarks)
+    print(f"Malha {lado}x{lado}: {grafo.n_nos} nós, {len(grafo.destinos)} arestas, "
+          f"pré-processamento {time.perf_counter() - inicio:.1f} s")
+
+    grafo.salvar("/tmp/bench_rotas.grafo")
+    inicio = time.perf_counter()
+    grafo = GrafoRotas.carregar("/tmp/bench_rotas.grafo")
+    print(f"Carga do arquivo: {(time.perf_counter() - inicio) * 1e3:.0f} ms")
+
+    sorteio = random.Random(1)
+    pares = [tuple(sorteio.randrange(grafo.n_nos) for _ in range(2)) for _ in range(consultas)]
+    pontos = [(grafo.lats[a], grafo.lons[a], grafo.lats[b], grafo.lons[b]) for a, b in pares]
+
+    t_dijkstra, t_alt, t_cache = [], [], []
+    for (a, b), ponto in zip(pares, pontos):
+        inicio = time.perf_counter()
+        esperado = dijkstra(grafo, a, b)
+        t_dijkstra.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        rota = grafo.rota(*ponto)
+        t_alt.append(time.perf_counter() - inicio)
+        assert math.isclose(rota.segundos, esperado, rel_tol=1e-4), (a, b, rota, esperado)
+
+        inicio = time.perf_counter()
+        grafo.rota(*ponto)
+        t_cache.append(time.perf_counter() - inicio)
+
+    print(f"{'Dijkstra':>12}: {_ms(t_dijkstra)}")
+    print(f"{'A* + ALT':>12}: {_ms(t_alt)}  ({statistics.mean(t_dijkstra) / statistics.mean(t_alt):.1f}x)")
+    print(f"{'cache':>12}: {_ms(t_cache)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("lado", type=int, nargs="?", default=200)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--landmarks", type=int, default=8)
+    args = parser.parse_args()
+    main(args.lado, args.consultas, args.landmarks)
@@ -0,0 +1,141 @@
+"""Memória das sessões de 100 mil usuários: dict x ``Sessao`` e a varredura por TTL.
+
+Simula usuários que abandonaram fluxos no meio (orçamento, consumo e resumo
+diário), outros que só deram /start e alguns com histórico de consumo, nas
+proporções abaixo. Mede com ``tracemalloc`` a memória das sessões em dict
+(como o ``user_data`` antes) e em ``Sessao``, o tamanho gravado pela
+persistência e o tempo e o efeito da varredura (fluxos limpos, sessões
+descartadas). As conversas expiram pelo ``conversation_timeout`` do PTB, fora
+da varredura.
+
+Uso: python -m benchmarks.bench_sessoes [usuarios]
+"""
+import argparse
+import asyncio
+import pickle
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from consumo import HistoricoConsumo
+from sessao import Sessao, Varredura
+
+# (peso, nome, campos) de cada perfil de usuário
+PERFIS = (
+    (40, "orçamento abandonado", {"categoria": "Padrão", "distance": 12.5, "minutes": 25.0}),
+    (10, "rota abandonada", {"categoria": "Executivo", "origem": (-15.7939, -47.8828)}),
+    (10, "consumo abandonado", {"liters": 42.0}),
+    (10, "diário abandonado", {"diaria_rides": 14, "diaria_centavos": 31250}),
+    (20, "só /start", {"teclado_aberto": False}),
+    (10, "histórico de consumo", {"teclado_aberto": False, "consumo_hist": None}),
+)
+
+
+def gerar(usuarios, semente=0):
+    """``(user_id, campos, abandonado)`` de cada usuário; 80% sem update há mais que o TTL."""
+    sorteio = random.Random(semente)
+    pesos = [peso for peso, _, _ in PERFIS]
+    for user_id in range(1, usuarios + 1):
+        _, nome, campos = sorteio.choices(PERFIS, pesos)[0]
+        campos = dict(campos, teclado_aberto=campos.get("teclado_aberto", True))
+        if "consumo_hist" in campos:
+            historico = HistoricoConsumo()
+            for _ in range(10):
+                historico.registrar(sorteio.uniform(9, 14))
+            campos["consumo_hist"] = historico
+        yield user_id, campos, sorteio.random() < 0.8
+
+
+def _medir(construir):
+    """Objeto criado e bytes alocados por ele (com o tracemalloc já ligado)."""
+    antes = tracemalloc.get_traced_memory()[0]
+    objeto = construir()
+    return objeto, tracemalloc.get_traced_memory()[0] - antes
+
+
+def _sessao(campos):
+    sessao = Sessao()
+    sessao.update(campos)
+    return sessao
+
+
+def _varredura(usuarios, agora):
+    """``Varredura`` já no ar há mais de um TTL, com os abandonados vistos há uma hora."""
+    varredura = Varredura(ttl=1800)
+    varredura._partida = agora - 7200
+    for user_id, _, abandonado in sorted(usuarios, key=lambda usuario: not usuario[2]):
+        varredura._vistos[user_id] = agora - 3600 if abandonado else agora
+    return varredura
+
+
+def main(n):
+    usuarios = list(gerar(n))
+    historicos = sum(1 for _, campos, _ in usuarios if "consumo_hist" in campos)
+
+    tracemalloc.start()
+    dicts, mem_dict = _medir(lambda: {user_id: dict(campos) for user_id, campos, _ in usuarios})
+    sessoes, mem_sessao = _medir(lambda: {user_id: _sessao(campos) for user_id, campos, _ in usuarios})
+    print(f"{n} usuários ({historicos} com histórico de consumo, o mesmo objeto nas duas medidas)")
+    print(f"{'dict':>10}: {mem_dict / 2**20:7.1f} MB  ({mem_dict / n:5.0f} B/usuário)")
+    print(f"{'Sessao':>10}: {mem_sessao / 2**20:7.1f} MB  ({mem_sessao / n:5.0f} B/usuário, "
+          f"{mem_dict / mem_sessao:.1f}x menos)")
+
+    amostra = list(sessoes.items())[:2000]
+    tam_dict = sum(len(pickle.dumps(dicts[user_id], pickle.HIGHEST_PROTOCOL)) for user_id, _ in amostra)
+    tam_sessao = sum(len(pickle.dumps(sessao, pickle.HIGHEST_PROTOCOL)) for _, sessao in amostra)
+    print(f"{'pickle':>10}: dict {tam_dict / len(amostra):.0f} B, Sessao {tam_sessao / len(amostra):.0f} B por usuário")
+    for _, sessao in amostra:
+        copia = pickle.loads(pickle.dumps(sessao, pickle.HIGHEST_PROTOCOL))
+        assert copia.__getstate__().keys() == sessao.__getstate__().keys()
+        assert copia.em_fluxo() == sessao.em_fluxo() and copia.vazia() == sessao.vazia()
+    del dicts, amostra
+
+    agora = time.time()
+    varredura = _varredura(usuarios, agora)
+    antes = tracemalloc.get_traced_memory()[0]
+    limpas, descartaveis = varredura.varrer(sessoes, agora)
+    for user_id in descartaveis:
+        del sessoes[user_id]
+    del descartaveis
+    liberado = antes - tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    fluxos = ("distance", "origem", "liters", "diaria_rides")
+    em_fluxo = [user_id for user_id, campos, abandonado in usuarios
+                if not abandonado and any(k in campos for k in fluxos)]
+    abandonados = {user_id for user_id, campos, abandonado in usuarios if abandonado and any(k in campos for k in fluxos)}
+    # Quem não estava parado segue com o fluxo; quem estava, sem ele (e só fica se tiver histórico de consumo)
+    assert set(limpas) == abandonados and all(sessoes[user_id].em_fluxo() for user_id in em_fluxo)
+    assert all(sessoes[user_id].consumo_hist is not None
+               for user_id, _, abandonado in usuarios if abandonado and user_id in sessoes)
+    print(f"{'varredura':>10}: {len(limpas)} fluxos limpos, "
+          f"{len(sessoes)} de {n} sessões ficam ({liberado / 2**20:.1f} MB liberados)")
+
+    # Tempos sem o tracemalloc: a primeira varredura (80% expirando) e as seguintes
+    sessoes = {user_id: _sessao(campos) for user_id, campos, _ in usuarios}
+    varredura = _varredura(usuarios, agora)
+    inicio = time.perf_counter()
+    varredura.varrer(sessoes, agora)
+    meio = time.perf_counter()
+    varredura.varrer(sessoes, agora + 60)
+    fim = time.perf_counter()
+    print(f"{'tempo':>10}: {(meio - inicio) * 1e3:.0f} ms com {n - len(varredura._vistos)} expirando, "
+          f"{(fim - meio) * 1e3:.3f} ms na seguinte (ninguém mais passou do prazo)")
+
+    asyncio.run(_marcar(varredura, SimpleNamespace(effective_user=SimpleNamespace(id=n // 2))))
+
+
+async def _marcar(varredura, atualizacao, vezes=100_000):
+    """Custo do ``TypeHandler`` de atividade, que roda em todo update."""
+    inicio = time.perf_counter()
+    for _ in range(vezes):
+        await varredura.marcar_visto(atualizacao, None)
+    print(f"{'marcar':>10}: {(time.perf_counter() - inicio) / vezes * 1e6:.2f} µs por update")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("usuarios", type=int, nargs="?", default=100_000)
+    args = parser.parse_args()
+    main(args.usuarios)
@@ -0,0 +1,116 @@
+"""Transporte da Bot API: cliente padrão do PTB x ``transporte.requisicao_envios`` em HTTP/1.1 e HTTP/2.
+
+Contra a Bot API falsa com ``latencia`` por chamada e ``handshake`` por
+conexão nova (o TCP + TLS até o Telegram), dispara rajadas de ``sendMessage``
+simultâneos, uma pausa maior que os 5 s de keep-alive do httpx e a mesma
+rajada de novo (o próximo pico de updates). Para cada perfil e tamanho de
+rajada mede o tempo das duas rajadas, a CPU gasta, a vazão, as conexões
+abertas, a p99 de cada chamada e os envios perdidos por ``TimedOut`` (pool
+cheio por mais que ``pool_timeout``).
+
+Sem o limitador de envios, para medir só o transporte; a Bot API falsa roda no
+mesmo processo, então a CPU inclui a dela. O HTTP/2 é sem TLS
+(``http1=False``): no Telegram ele é negociado no TLS. O cliente padrão só
+roda até ``MAX_PADRAO``: acima disso a CPU quadrática do pool leva minutos.
+
+Uso: python -m benchmarks.bench_transporte [--latencia s] [--handshake s] [--pausa s] [--rajadas 100,500,...]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from telegram import Bot
+from telegram.error import NetworkError
+from telegram.request import HTTPXRequest
+
+from benchmarks.fake_api import FakeBotAPI
+from transporte import CONCORRENCIA, requisicao_envios
+
+RAJADAS = (100, 500, 2000)
+MAX_PADRAO = 500
+
+
+def _perfis():
+    return (
+        # O mesmo que ApplicationBuilder().build() monta para os envios
+        ("padrão PTB", lambda: HTTPXRequest(connection_pool_size=256)),
+        ("HTTP/1.1", lambda: requisicao_envios(http2=False)),
+        ("HTTP/2", lambda: requisicao_envios(http2=True, http1=False)),
+    )
+
+
+async def _rajada(bot, tamanho):
+    """(segundos, CPU, [latência de cada envio que deu certo], perdidos)."""
+    latencias = []
+    perdidos = 0
+
+    async def enviar(chat_id):
+        nonlocal perdidos
+        inicio = time.perf_counter()
+        try:
+            await bot.send_message(chat_id, "Seu orçamento: R$ 25,00")
+        except NetworkError:
+            # TimedOut é um NetworkError
+            perdidos += 1
+        else:
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(enviar(chat_id) for chat_id in range(1, tamanho + 1)))
+    return time.perf_counter() - inicio, time.process_time() - cpu, latencias, perdidos
+
+
+async def _medir(criar, tamanho, latencia, handshake, pausa):
+    api = FakeBotAPI(latencia=latencia, handshake=handshake)
+    await api.start()
+    requisicao = criar()
+    bot = Bot(api.token, base_url=api.base_url, request=requisicao)
+    await bot.initialize()
+    conexoes_antes = api.conexoes
+    primeira, cpu, latencias, perdidos = await _rajada(bot, tamanho)
+    await asyncio.sleep(pausa)
+    segunda, cpu_2, mais, perdidos_2 = await _rajada(bot, tamanho)
+    await bot.shutdown()
+    await api.stop()
+    latencias += mais
+    if hasattr(requisicao, "estatisticas"):
+        # A contagem pelo trace do httpcore bate com a do servidor
+        assert requisicao.estatisticas()["conexoes"] == api.conexoes, (requisicao.estatisticas(), api.conexoes)
+    return {
+        "primeira": primeira,
+        "segunda": segunda,
+        "cpu": cpu + cpu_2,
+        "vazao": 2 * tamanho / (primeira + segunda),
+        "conexoes": api.conexoes - conexoes_antes,
+        "p99": statistics.quantiles(latencias, n=100)[98] if len(latencias) > 1 else float('nan'),
+        "perdidos": perdidos + perdidos_2,
+    }
+
+
+async def main(rajadas, latencia, handshake, pausa):
+    print(f"Bot API falsa: {latencia * 1e3:.0f} ms por chamada, {handshake * 1e3:.0f} ms por conexão nova, "
+          f"{pausa:g} s entre as rajadas\n")
+    print(f"{'perfil':<11} {'rajada':>6} {'1ª (ms)':>8} {'2ª (ms)':>8} {'CPU (ms)':>8} {'envios/s':>9} "
+          f"{'conexões':>8} {'p99 (ms)':>8} {'perdidos':>8}")
+    for tamanho in rajadas:
+        for nome, criar in _perfis():
+            if nome == "padrão PTB" and tamanho > MAX_PADRAO:
+                continue
+            r = await _medir(criar, tamanho, latencia, handshake, pausa)
+            print(f"{nome:<11} {tamanho:>6} {r['primeira'] * 1e3:>8.0f} {r['segunda'] * 1e3:>8.0f} "
+                  f"{r['cpu'] * 1e3:>8.0f} {r['vazao']:>9.0f} {r['conexoes']:>8} {r['p99'] * 1e3:>8.0f} "
+                  f"{r['perdidos']:>8}", flush=True)
+    print(f"\nCPU = as duas rajadas; perdidos = TimedOut esperando uma conexão livre do pool; "
+          f"concorrência do perfil afinado: {CONCORRENCIA}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--handshake", type=float, default=0.1)
+    parser.add_argument("--pausa", type=float, default=6.0)
+    parser.add_argument("--rajadas", default=",".join(map(str, RAJADAS)))
+    args = parser.parse_args()
+    asyncio.run(main([int(n) for n in args.rajadas.split(",")], args.latencia, args.handshake, args.pausa))
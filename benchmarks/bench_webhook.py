@@ -0,0 +1,101 @@
+"""Compara a latência de entrega de updates em polling e em webhook.
+
+Mede, para cada update, o tempo entre o Telegram (aqui ``FakeBotAPI``)
+disponibilizar o update e a resposta do bot chegar de volta à API.
+
+Uso: python -m benchmarks.bench_webhook [quantidade]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from benchmarks.fake_api import FakeBotAPI
+from webhook import ConfigWebhook, ServidorWebhook
+
+SECRET = "bench-secret"
+
+
+def _update_texto(chat_id, texto):
+    return {
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Motorista"},
+            "text": texto,
+        }
+    }
+
+
+async def _eco(update, context):
+    await update.message.reply_text(update.message.text)
+
+
+async def _medir(api, enviar, n):
+    respostas = asyncio.Queue()
+    api.ao_chamar(lambda metodo, _, instante: metodo == "sendMessage" and respostas.put_nowait(instante))
+    latencias = []
+    for i in range(n):
+        inicio = time.monotonic()
+        await enviar(_update_texto(10 + i % 50, str(i)))
+        latencias.append(await respostas.get() - inicio)
+    api._ouvintes.clear()
+    return latencias
+
+
+async def bench_polling(api, n):
+    app = ApplicationBuilder().token(api.token).base_url(api.base_url).build()
+    app.add_handler(MessageHandler(filters.TEXT, _eco))
+    async with app:
+        await app.start()
+        await app.updater.start_polling(poll_interval=0, timeout=10)
+
+        async def enviar(update):
+            api.enfileirar(update)
+
+        latencias = await _medir(api, enviar, n)
+        await app.updater.stop()
+        await app.stop()
+    return latencias
+
+
+async def bench_webhook(api, n):
+    app = ApplicationBuilder().token(api.token).base_url(api.base_url).updater(None).build()
+    app.add_handler(MessageHandler(filters.TEXT, _eco))
+    servidor = ServidorWebhook(app, ConfigWebhook("http://127.0.0.1", SECRET, port=0))
+    async with app, httpx.AsyncClient() as cliente:
+        await app.start()
+        await servidor.start()
+        url = f"http://127.0.0.1:{servidor.porta}/telegram"
+
+        async def enviar(update):
+            update = dict(update, update_id=api.novo_update_id())
+            resposta = await cliente.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            resposta.raise_for_status()
+
+        latencias = await _medir(api, enviar, n)
+        await servidor.stop()
+        await app.stop()
+    return latencias
+
+
+def _resumo(nome, latencias):
+    ms = sorted(x * 1e3 for x in latencias)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{nome:>8}: média {statistics.mean(ms):6.2f} ms  p50 {statistics.median(ms):6.2f} ms  p95 {p95:6.2f} ms")
+
+
+async def main(n):
+    api = FakeBotAPI()
+    await api.start()
+    _resumo("polling", await bench_polling(api, n))
+    _resumo("webhook", await bench_webhook(api, n))
+    await api.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
@@ -0,0 +1,264 @@
+"""Servidor local que imita a Bot API do Telegram para benchmarks offline.
+
+Atende ``POST /bot<token>/<método>`` como o Telegram: ``getMe``,
+``getUpdates`` (long polling de verdade), envios de mensagem/documento/foto e
+os métodos que só retornam ``true``. Os updates de teste entram por
+``enfileirar`` e cada chamada recebida fica registrada em ``chamadas``.
+Com ``limites=(por_chat, global)`` os envios acima de tantos por segundo
+recebem 429 com ``retry_after``, como o Telegram faz. ``handshake`` atrasa a
+primeira resposta de cada conexão nova (o TCP + TLS de uma conexão de verdade
+com o Telegram); ``conexoes`` conta as conexões abertas. Fala HTTP/1.1 e,
+com o pacote ``h2``, HTTP/2 sem TLS para clientes que já chegam nele.
+
+Uso com a Application::
+
+    api = FakeBotAPI()
+    await api.start()
+    app = ApplicationBuilder().token(api.token).base_url(api.base_url).build()
+
+Ou sozinho, para o bot de verdade apontar para ele (``BOT_API_URL``)::
+
+    python -m benchmarks.fake_api --port 8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from email.parser import BytesParser
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "Calculadora", "username": "calculadora_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": True}
+
+_ENVIOS = {"sendMessage", "editMessageText", "sendDocument", "sendPhoto"}
+_STATUS = {200: b"200 OK", 429: b"429 Too Many Requests"}
+_PREFACIO_HTTP2 = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+
+class FakeBotAPI:
+    def __init__(self, token="123:FAKE", latencia=0.0, listen="127.0.0.1", port=0, limites=None, handshake=0.0):
+        self.token = token
+        self.latencia = latencia
+        self.handshake = handshake
+        self.conexoes = 0
+        self.limites = limites
+        self.recusadas = 0
+        self._janelas = {}
+        self.listen = listen
+        self.port = port
+        self.chamadas = []
+        self.inicio = time.monotonic()
+        self._updates = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._ouvintes = []
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.listen}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._atender, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def enfileirar(self, update):
+        """Coloca um update (dict sem update_id) na fila do getUpdates e devolve o update_id."""
+        update = dict(update, update_id=next(self._update_ids))
+        self._updates.put_nowait(update)
+        return update["update_id"]
+
+    def novo_update_id(self):
+        return next(self._update_ids)
+
+    def ao_chamar(self, callback):
+        """Registra ``callback(metodo, parametros, instante)`` chamado a cada requisição recebida."""
+        self._ouvintes.append(callback)
+
+    async def _atender(self, reader, writer):
+        self.conexoes += 1
+        try:
+            if self.handshake:
+                await asyncio.sleep(self.handshake)
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                if linha == _PREFACIO_HTTP2[:len(linha)]:
+                    # HTTP/2 sem TLS (h2c com conhecimento prévio, como o httpx com http1=False)
+                    await self._atender_http2(reader, writer, linha + await reader.readexactly(
+                        len(_PREFACIO_HTTP2) - len(linha)))
+                    break
+                _, caminho, _ = linha.decode('latin-1').split(' ', 2)
+                cabecalhos = {}
+                while True:
+                    linha = await reader.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                corpo = await reader.readexactly(int(cabecalhos.get('content-length', 0)))
+
+                status, resposta = await self._responder(caminho, cabecalhos.get('content-type', ''), corpo)
+                writer.write(
+                    b"HTTP/1.1 " + _STATUS[status] + b"\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(resposta)).encode() + b"\r\n\r\n" + resposta
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: getUpdates pendente quando o benchmark encerra
+            pass
+        finally:
+            writer.close()
+
+    async def _atender_http2(self, reader, writer, dados):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        conexao = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        conexao.initiate_connection()
+        pedidos = {}
+        tarefas = set()
+
+        async def responder(stream_id, cabecalhos, corpo):
+            status, resposta = await self._responder(cabecalhos[':path'], cabecalhos.get('content-type', ''), corpo)
+            conexao.send_headers(stream_id, [(':status', str(status)), ('content-type', 'application/json'),
+                                             ('content-length', str(len(resposta)))])
+            conexao.send_data(stream_id, resposta, end_stream=True)
+            writer.write(conexao.data_to_send())
+
+        try:
+            while dados:
+                for evento in conexao.receive_data(dados):
+                    if isinstance(evento, h2.events.RequestReceived):
+                        pedidos[evento.stream_id] = (dict(evento.headers), bytearray())
+                    elif isinstance(evento, h2.events.DataReceived):
+                        pedidos[evento.stream_id][1].extend(evento.data)
+                        conexao.acknowledge_received_data(evento.flow_controlled_length, evento.stream_id)
+                    elif isinstance(evento, h2.events.StreamEnded):
+                        cabecalhos, corpo = pedidos.pop(evento.stream_id)
+                        # Cada stream responde no seu tempo, como conexões separadas no HTTP/1.1
+                        tarefa = asyncio.ensure_future(responder(evento.stream_id, cabecalhos, bytes(corpo)))
+                        tarefas.add(tarefa)
+                        tarefa.add_done_callback(tarefas.discard)
+                writer.write(conexao.data_to_send())
+                await writer.drain()
+                dados = await reader.read(65536)
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+
+    async def _responder(self, caminho, content_type, corpo):
+        """(status HTTP, corpo JSON) de uma chamada ``caminho`` com o ``corpo`` enviado."""
+        metodo = caminho.rstrip('/').rsplit('/', 1)[-1]
+        parametros = _ler_parametros(content_type, corpo)
+        instante = time.monotonic()
+        self.chamadas.append((metodo, instante))
+        for ouvinte in self._ouvintes:
+            ouvinte(metodo, parametros, instante)
+
+        retry_after = self._excedeu(metodo, parametros, instante)
+        if retry_after:
+            self.recusadas += 1
+            return 429, json.dumps({"ok": False, "error_code": 429,
+                                    "description": f"Too Many Requests: retry after {retry_after}",
+                                    "parameters": {"retry_after": retry_after}}).encode()
+        resultado = await self._resultado(metodo, parametros)
+        return 200, json.dumps({"ok": True, "result": resultado}).encode()
+
+    def _excedeu(self, metodo, parametros, instante):
+        """Segundos de ``retry_after`` se o envio passa do limite, senão 0."""
+        if not self.limites or metodo not in _ENVIOS:
+            return 0
+        for chave, limite in ((parametros.get("chat_id"), self.limites[0]), (None, self.limites[1])):
+            janela = self._janelas.setdefault(chave, deque())
+            while janela and janela[0] <= instante - 1:
+                janela.popleft()
+            if len(janela) >= limite:
+                return 1
+        for chave in (parametros.get("chat_id"), None):
+            self._janelas[chave].append(instante)
+        return 0
+
+    async def _resultado(self, metodo, parametros):
+        if metodo == "getUpdates":
+            return await self._get_updates(float(parametros.get("timeout", 0)))
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if metodo == "getMe":
+            return BOT_USER
+        if metodo in _ENVIOS:
+            chat_id = int(parametros.get("chat_id", 0))
+            mensagem = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": str(parametros.get("text", parametros.get("caption", ""))),
+            }
+            if metodo == "sendPhoto":
+                # Foto reenviada por file_id mantém o id; upload ganha um novo
+                file_id = parametros.get("photo") or f"foto-{mensagem['message_id']}"
+                mensagem["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 450}]
+            return mensagem
+        if metodo == "getFile":
+            return {"file_id": parametros.get("file_id"), "file_unique_id": "u", "file_path": "arquivo"}
+        return True
+
+    async def _get_updates(self, timeout):
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        return updates
+
+
+def _ler_parametros(content_type, corpo):
+    if content_type.startswith('multipart/form-data'):
+        mensagem = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + corpo)
+        brutos = {
+            parte.get_param('name', header='content-disposition'): parte.get_payload(decode=True)
+            for parte in mensagem.get_payload()
+            if not parte.get_filename()
+        }
+        brutos = {k: v.decode() for k, v in brutos.items()}
+    elif content_type.startswith('application/json'):
+        return json.loads(corpo or b'{}')
+    else:
+        brutos = dict(parse_qsl(corpo.decode()))
+
+    parametros = {}
+    for chave, valor in brutos.items():
+        try:
+            parametros[chave] = json.loads(valor)
+        except ValueError:
+            parametros[chave] = valor
+    return parametros
+
+
+async def _servir(port, latencia):
+    api = FakeBotAPI(latencia=latencia, port=port)
+    await api.start()
+    print(f"Bot API falsa em {api.base_url} (TELEGRAM_TOKEN={api.token}, BOT_API_URL={api.base_url})")
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latencia", type=float, default=0.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_servir(args.port, args.latencia))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,52 @@
+"""Fábrica de updates sintéticos (no formato JSON da Bot API) para os benchmarks."""
+import itertools
+import time
+
+_ids = itertools.count(1)
+
+
+def _usuario(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"Motorista {user_id}", "language_code": "pt-br"}
+
+
+def _mensagem(user_id, texto, message_id=None):
+    mensagem = {
+        "message_id": message_id or next(_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _usuario(user_id),
+        "text": texto,
+    }
+    if texto.startswith('/'):
+        comando = texto.split()[0]
+        mensagem["entities"] = [{"type": "bot_command", "offset": 0, "length": len(comando)}]
+    return mensagem
+
+
+def texto(user_id, conteudo):
+    """Mensagem de texto (ou comando, se começar com '/') enviada pelo usuário."""
+    return {"update_id": next(_ids), "message": _mensagem(user_id, conteudo)}
+
+
+def botao(user_id, callback_data):
+    """Clique num botão inline de uma mensagem do bot."""
+    mensagem = _mensagem(user_id, "...")
+    mensagem["from"] = {"id": 1000, "is_bot": True, "first_name": "Calculadora"}
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "from": _usuario(user_id),
+            "chat_instance": str(user_id),
+            "message": mensagem,
+            "data": callback_data,
+        },
+    }
+
+
+def inline(user_id, consulta):
+    """Consulta inline ("@bot 5,6 15")."""
+    return {
+        "update_id": next(_ids),
+        "inline_query": {"id": str(next(_ids)), "from": _usuario(user_id), "query": consulta, "offset": ""},
+    }
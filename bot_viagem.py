@@ -1,9 +1,22 @@
+import time
+
+# Início da partida: o tempo de importação entra no resumo do log
+_INICIO = time.perf_counter()
+
+import asyncio
+import functools
+import html
+import importlib.util
+import io
 import logging
-import os
 import math
+import os
+from collections import OrderedDict
 from dotenv import load_dotenv
+import httpx
 import re
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
+import tempfile
+from telegram import InlineQueryResultArticle, InputFile, InputTextMessageContent, Update
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -12,98 +25,217 @@ from telegram.ext import (
     filters,
     ConversationHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
 )
 
-# Load environment variables
-load_dotenv()
-
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from cartao import ERROS_RENDER, CartoesOrcamento
+from consumo import MAX_KM_POR_LITRO, HistoricoConsumo
+from dinamica import CONDICAO_DINAMICA, TabelaDinamica
+from exportar import FORMATOS, LIMITE_DOCUMENTO, gravar, ler_periodo, no_periodo
+from corridas import LivroCorridas
+from frota import Frota, Motorista, agendar_recarga
+from historico import MAX_CLIENTE, HistoricoOrcamentos, palavras
+from limitador import LimitadorEnvios
+from lugares import GuiaLugares
+from metricas import METRICAS, Cronometro, ServidorMetricas, medir_handler, rejeitar
+from paradas import otimizar
+from processador import ProcessadorPorChat
+from precos import (
+    CATEGORIAS,
+    CONDICOES,
+    LIMITE_REAIS,
+    TARIFA_EXEC,
+    TARIFA_PADRAO,
+    calcular_centavos,
+    calcular_lote,
+    calcular_preco,
+    dividir_centavos,
+    ler_centavos,
+    ler_corrida,
+    ler_lote,
+    valor_aceito,
 )
-logger = logging.getLogger(__name__)
+import registro
+from respostas import (
+    BTN_CANCELAR,
+    BTN_RESUMO,
+    EMOJI_CATEGORIA,
+    EMOJI_CONDICAO,
+    MENU_NOVO_ORCAMENTO,
+    MENU_PRINCIPAL,
+    REMOVER_TECLADO,
+    TECLADO_CANCELAR,
+    TECLADO_CATEGORIA,
+    TECLADO_DIARIO_LIVRO,
+    brl,
+    cartao_motorista,
+    cartao_passageiro,
+    historico_orcamentos,
+    historico_consumo,
+    resultado_consumo,
+    resumo_diario,
+    resumo_livro,
+    resumo_paradas,
+    teclado_aceitar,
+    teclado_condicao,
+    teclado_historico,
+    teclado_lugares,
+)
+from rotas import GrafoRotas, Rota, ler_coordenada
+from sessao import Sessao, agendar_varredura, expirar_conversa
+from transporte import CONCORRENCIA, KEEPALIVE, requisicao_envios, requisicao_updates
 
-# Button Constants
-BTN_NOVO_ORCAMENTO = "🚀 Novo Orçamento"
-BTN_CANCELAR = "❌ Cancelar"
-BTN_CONSUMO = "⛽ Calcular Consumo"
-BTN_RESUMO = "📅 Resumo Diário"
+# persistencia (sqlite3/pickle), webhook e numpy (via precos) só são importados quando usados; frota e
+# historico entram acima, mas o sqlite3 deles só é importado quando o banco é aberto
+PARTIDA = Cronometro(_INICIO)
+PARTIDA.marcar("imports")
 
-# Constants for Calculation - Padrão
-BASE_PRICE_PADRAO = 3.00
-PRICE_PER_KM_PADRAO = 1.25
-PRICE_PER_MIN_PADRAO = 0.20
-MINIMUM_FARE_PADRAO = 10.00
+# Load environment variables
+load_dotenv()
 
-# Constants for Calculation - Executivo
-TAXA_BASE_EXEC = 5.00
-VALOR_KM_EXEC = 1.50
-VALOR_MINUTO_EXEC = 0.25
-TARIFA_MINIMA_EXEC = 15.00
+# Setup logging: os handlers só enfileiram, uma thread escreve (registro.py).
+# LOG_FORMATO=json para uma linha JSON por registro; LOG_AMOSTRA=0.1 guarda os
+# INFO dos updates de 10% dos chats
+REGISTRO = registro.configurar(os.getenv("LOG_FORMATO", "texto"), os.getenv("LOG_NIVEL", "INFO"),
+                               float(os.getenv("LOG_AMOSTRA", "1")))
+logger = logging.getLogger(__name__)
 
 CAR_MODEL = "Toyota Yaris Hatch XL"
 
+# Pasta dos dados locais (banco de conversas etc.)
+DATA_DIR = os.getenv("DATA_DIR", "dados")
+
+# Carro e tarifas de cada motorista (python -m frota importar ...); quem não
+# está no cadastro usa CAR_MODEL e as tarifas de precos.py
+ARQUIVO_FROTA = os.getenv("FROTA", os.path.join(DATA_DIR, "frota.sqlite3"))
+frota = Frota(ARQUIVO_FROTA, Motorista(CAR_MODEL, TARIFA_PADRAO, TARIFA_EXEC))
+
+# Corridas aceitas (botão no painel do motorista), base do resumo diário
+livro = LivroCorridas(os.path.join(DATA_DIR, "corridas"))
+# Painéis cujo "Corrida aceita" já foi registrado (os mais recentes), contra o toque duplo
+_paineis_aceitos = OrderedDict()
+MAX_PAINEIS_ACEITOS = 4096
+
+# Todo orçamento enviado, com o cliente e a rota, para o /historico
+historico = HistoricoOrcamentos(os.getenv("HISTORICO", os.path.join(DATA_DIR, "historico.sqlite3")))
+# O termo do /historico vai no callback dos botões de página (limite de 64 bytes do Telegram)
+MAX_TERMO_HISTORICO = 40
+
+# Malha viária do roteamento offline (python -m rotas preparar ...); sem ela, KM e minutos digitados
+ARQUIVO_ROTAS = os.getenv("GRAFO_ROTAS", os.path.join(DATA_DIR, "rotas.grafo"))
+# Guia de lugares (python -m lugares preparar ...): nomes de bairros viram origem/destino
+ARQUIVO_LUGARES = os.getenv("LUGARES", os.path.join(DATA_DIR, "lugares.idx"))
+SUGESTOES_LUGARES = 5
+# Paradas (além da origem) aceitas no /paradas
+MAX_PARADAS = 20
+
+# user_data de cada usuário é uma sessao.Sessao (campos fixos); a Application precisa deste ContextTypes
+CONTEXTO = ContextTypes(user_data=Sessao)
+# Segundos sem update até a conversa aberta expirar e a sessão ser limpa
+SESSAO_TTL = int(os.getenv("SESSAO_TTL", "1800"))
+
+# Cartão do passageiro em PNG (cartao.CartoesOrcamento), montado no build_application
+cartoes = None
+
 # Conversation States
 # Added CATEGORIA as the first state
-CATEGORIA, DISTANCIA, TEMPO, CONDICAO, CON_LITROS, CON_KM, DIARIA_RIDAS, DIARIA_GANHO, DIARIA_COMB = range(9)
+CATEGORIA, DISTANCIA, TEMPO, CONDICAO, CON_LITROS, CON_KM, DIARIA_RIDAS, DIARIA_GANHO, DIARIA_COMB, LOTE_ENTRADA = range(10)
+
+# Limites do /lote (linhas por lote e tamanho do CSV enviado)
+LOTE_MAX_LINHAS = 5000
+LOTE_MAX_BYTES = 512 * 1024
+
+# Respostas do modo inline guardadas por (distância, minutos)
+INLINE_CACHE_SIZE = 2048
+
+# Filtros montados uma vez e compartilhados por todas as conversas
+FILTRO_CANCELAR = filters.Regex(f"^{re.escape(BTN_CANCELAR)}$")
+FILTRO_RESUMO = filters.Regex(f"^{re.escape(BTN_RESUMO)}$")
+FILTRO_TEXTO = filters.TEXT & ~filters.COMMAND
+
+# Rótulos dos estados nas métricas (funil de cada fluxo)
+NOMES_ESTADOS = {
+    CATEGORIA: "categoria", DISTANCIA: "distancia", TEMPO: "tempo", CONDICAO: "condicao",
+    CON_LITROS: "litros", CON_KM: "km", DIARIA_RIDAS: "corridas", DIARIA_GANHO: "ganho",
+    DIARIA_COMB: "combustivel", LOTE_ENTRADA: "lote", ConversationHandler.END: "fim", None: "fim",
+}
+
 
-def round_to_nearest_50_cents(amount):
-    """Rounds the amount to the nearest 0.50"""
-    return math.ceil(amount * 2) / 2
+@functools.cache
+def malha_rotas():
+    """``GrafoRotas`` de ``ARQUIVO_ROTAS``, carregado uma vez; ``None`` se o arquivo não existir."""
+    if not os.path.exists(ARQUIVO_ROTAS):
+        return None
+    grafo = GrafoRotas.carregar(ARQUIVO_ROTAS)
+    logger.info("Malha de rotas: %s nós (%s)", grafo.n_nos, ARQUIVO_ROTAS)
+    return grafo
 
+
+@functools.cache
+def guia_lugares():
+    """``GuiaLugares`` de ``ARQUIVO_LUGARES`` (mapeado em memória); ``None`` se o arquivo não existir."""
+    if not os.path.exists(ARQUIVO_LUGARES):
+        return None
+    guia = GuiaLugares.abrir(ARQUIVO_LUGARES)
+    logger.info("Guia de lugares: %s lugares (%s)", guia.n_lugares, ARQUIVO_LUGARES)
+    return guia
+
+
+def medido(fluxo, etapa, desvio=None):
+    """Latência e transição do handler nas métricas (``/metrics``)."""
+    return medir_handler(fluxo, etapa, NOMES_ESTADOS, desvio)
+
+
+@medido("geral", "start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Starts the conversation and shows the main menu button."""
     logger.info("User %s started the conversation.", update.effective_user.first_name)
     
-    # Force reset keyboard (just in case)
-    temp_msg = await update.message.reply_text("🔄...", reply_markup=ReplyKeyboardRemove())
-    try:
-        await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=temp_msg.message_id)
-    except:
-        pass
-
-    keyboard = [
-        [InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")],
-        [InlineKeyboardButton("⛽ Calcular Consumo", callback_data="consumo")],
-        [InlineKeyboardButton("📅 Resumo Diário", callback_data="diario")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    # Force reset keyboard, only if a flow may have left the "Cancelar" keyboard open
+    # (saves two Bot API calls on every other /start)
+    if context.user_data.teclado_aberto:
+        temp_msg = await update.message.reply_text("🔄...", reply_markup=REMOVER_TECLADO)
+        try:
+            await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=temp_msg.message_id)
+        except:
+            pass
+        context.user_data.teclado_aberto = False
+
     await update.message.reply_text(
         "👋 <b>Olá, tudo bem?</b>\n\n"
         "Sou o seu <b>Assistente Pessoal de Corridas</b>.\n"
         "Tenho a funcionalidade de otimizar a sua rotina no volante:\n\n"
         "🔹 Calculo orçamentos rápidos e justos (distância, tempo e clima)\n"
         "🔹 Ajudo a monitorar o consumo do seu veículo\n"
-        "🔹 Organizo o seu resumo financeiro diário\n\n"
-        f"🚘 <b>Veículo configurado:</b> {CAR_MODEL}\n\n"
+        "🔹 Organizo o seu resumo financeiro diário\n"
+        "🔹 Guardo cada orçamento: /historico nome do cliente ou do lugar\n\n"
+        f"🚘 <b>Veículo configurado:</b> {frota.motorista(update.effective_user.id).carro}\n\n"
         "👇 <i>Selecione uma das opções abaixo para começarmos:</i>",
-        reply_markup=reply_markup,
+        reply_markup=MENU_PRINCIPAL,
         parse_mode="HTML"
     )
 
+@medido("orcamento", "inicio")
 async def novo_orcamento(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Initiates the budget calculation flow."""
     logger.info("User requested new budget.")
+    context.user_data.teclado_aberto = True
+    context.user_data.origem = None
+    context.user_data.rota = None
     
     query = update.callback_query
     await query.answer()
-    # Ask for category first (Padrão or Executivo) using inline buttons
-    keyboard = [
-        [InlineKeyboardButton('🚘 Padrão', callback_data='categoria_padrao'), InlineKeyboardButton('💼 Executivo', callback_data='categoria_exec')],
-        [InlineKeyboardButton('❌ Cancelar', callback_data='cancelar')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.message.reply_text(
         '🚘 <b>Qual a categoria da corrida?</b>',
         parse_mode="HTML",
-        reply_markup=reply_markup
+        reply_markup=TECLADO_CATEGORIA
     )
     return CATEGORIA
 
 
+@medido("orcamento", "categoria")
 async def receber_categoria(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Recebe a categoria escolhida via callback_query e segue para pedir distância."""
     query = update.callback_query
@@ -118,27 +250,27 @@ async def receber_categoria(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == 'categoria_exec':
         categoria = 'Executivo'
     else:
+        rejeitar("receber_categoria", "opcao")
         await query.message.reply_text('⚠️ Opção inválida. Escolha uma categoria válida.')
         return CATEGORIA
 
-    context.user_data['categoria'] = categoria
+    context.user_data.categoria = categoria
     logger.info("Categoria escolhida: %s", categoria)
 
-    keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
-
+    dica_local = ""
+    if malha_rotas():
+        dica_local = "\nOu envie a 📍 **localização** da origem e depois a do destino."
+        if guia_lugares():
+            dica_local = "\nOu envie a 📍 **localização** (ou o nome do bairro) da origem e depois a do destino."
     await query.message.reply_text(
         "📏 **Qual a Distância?**\n\n"
-        "Digite quantos **KM** tem a corrida (ex: 4.5 ou 12).",
+        "Digite quantos **KM** tem a corrida (ex: 4.5 ou 12)." + dica_local,
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=TECLADO_CANCELAR
     )
     return DISTANCIA
 
+@medido("orcamento", "distancia")
 async def get_distance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the distance input."""
     text = update.message.text
@@ -149,33 +281,99 @@ async def get_distance(update: Update, context: ContextTypes.DEFAULT_TYPE):
         clean_text = text.replace(',', '.')
         distance = float(clean_text)
         
-        if distance < 0:
+        if not valor_aceito(distance):
+             rejeitar("get_distance", "valor")
              await update.message.reply_text("⛔ Valor inválido. Tente novamente.")
              return DISTANCIA
 
-        context.user_data['distance'] = distance
+        context.user_data.distance = distance
+        context.user_data.rota = None
         logger.info("Distance: %.2f km", distance)
 
-        keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-        reply_markup = ReplyKeyboardMarkup(
-            keyboard, 
-            resize_keyboard=True,
-            one_time_keyboard=True
-        )
-
         await update.message.reply_text(
             f"✅ **Distância:** {distance} km\n\n"
             "⏱️ **Qual o Tempo?**\n"
             "Digite quantos **minutos** vai levar.",
             parse_mode="Markdown",
-            reply_markup=reply_markup
+            reply_markup=TECLADO_CANCELAR
         )
         return TEMPO
 
     except ValueError:
+        # Texto que não é número: nome de bairro ou ponto de referência
+        sugestoes = _sugerir_lugares(text)
+        if sugestoes:
+            await update.message.reply_text(
+                "📍 Escolha o lugar (ou digite mais letras do nome):", reply_markup=teclado_lugares(sugestoes)
+            )
+            return DISTANCIA
+        rejeitar("get_distance", "formato")
         await update.message.reply_text("⚠️ Digite apenas números (ex: 5.2).")
         return DISTANCIA
 
+def _sugerir_lugares(texto):
+    """``[(número, nome)]`` do guia para ``texto``; vazio sem guia ou sem malha de rotas."""
+    guia = guia_lugares()
+    if guia is None or malha_rotas() is None:
+        return []
+    return [(lugar, guia.nome(lugar)) for lugar in guia.buscar(texto, SUGESTOES_LUGARES)]
+
+@medido("orcamento", "local")
+async def receber_local(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Origem e destino pela localização: a rota na malha dá a distância e o tempo."""
+    if malha_rotas() is None:
+        rejeitar("receber_local", "indisponivel")
+        await update.message.reply_text("🗺️ Mapa indisponível. Digite quantos KM tem a corrida.")
+        return DISTANCIA
+
+    local = update.message.location
+    return await _marcar_ponto(update.message, context, local.latitude, local.longitude)
+
+@medido("orcamento", "lugar")
+async def escolher_lugar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Lugar tocado nas sugestões do guia: vira a origem ou o destino da rota."""
+    query = update.callback_query
+    await query.answer()
+
+    guia = guia_lugares()
+    try:
+        lugar = int(query.data.split(':', 1)[1])
+        if guia is None or not 0 <= lugar < guia.n_lugares:
+            raise ValueError(lugar)
+    except ValueError:
+        rejeitar("escolher_lugar", "opcao")
+        await query.message.reply_text("⚠️ Lugar inválido. Digite o nome de novo ou os KM.")
+        return DISTANCIA
+
+    return await _marcar_ponto(query.message, context, *guia.coordenadas(lugar), nome=guia.nome(lugar))
+
+async def _marcar_ponto(message, context, lat, lon, nome=None):
+    """Guarda a origem ou, com a origem já marcada, calcula a rota até (lat, lon) e pede a condição."""
+    origem, context.user_data.origem = context.user_data.origem, None
+    if origem is None:
+        context.user_data.origem = (lat, lon)
+        # Nome da rota no /historico quando origem e destino vêm do guia de lugares
+        context.user_data.rota = nome
+        marcado = f"📍 Origem: {nome}." if nome else "📍 Origem marcada!"
+        await message.reply_text(f"{marcado} Agora envie a localização ou o nome do destino.")
+        return DISTANCIA
+
+    # A busca é CPU pura; na thread o loop segue atendendo os outros chats
+    rota = await asyncio.to_thread(malha_rotas().rota, *origem, lat, lon)
+    if rota is None:
+        rejeitar("_marcar_ponto", "fora_do_mapa")
+        await message.reply_text("⚠️ Ponto fora do mapa. Envie a origem de novo ou digite os KM.")
+        return DISTANCIA
+
+    distance, minutes = _km_minutos(rota)
+    context.user_data.distance = distance
+    context.user_data.minutes = minutes
+    context.user_data.rota = f"{context.user_data.rota} → {nome}" if context.user_data.rota and nome else None
+    logger.info("Rota: %.2f km, %.0f min", distance, minutes)
+
+    return await _perguntar_condicao(message, context, f"🗺️ **Rota:** {distance} km, ~{minutes:.0f} min\n\n")
+
+@medido("orcamento", "tempo")
 async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the time input."""
     text = update.message.text
@@ -186,35 +384,42 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
         clean_text = text.replace(',', '.')
         minutes = float(clean_text)
         
-        if minutes < 0:
+        if not valor_aceito(minutes):
+             rejeitar("get_time", "valor")
              await update.message.reply_text("⛔ Valor inválido.")
              return TEMPO
 
-        context.user_data['minutes'] = minutes
+        context.user_data.minutes = minutes
         logger.info("Time: %.2f min", minutes)
-        
-        # Ask for Condition
-        # Ask for Condition
-        keyboard = [
-            [InlineKeyboardButton("☀️ Normal (1.0x)", callback_data="normal")],
-            [InlineKeyboardButton("🌧️ Chuva/Noite (1.2x)", callback_data="chuva")],
-            [InlineKeyboardButton("🚦 Trânsito Pesado (1.4x)", callback_data="transito")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancelar")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await update.message.reply_text(
-            "🌤️ **Como está o trânsito/clima?**\n\n"
-            "Selecione uma opção abaixo para ajustar o preço:",
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
-        return CONDICAO
+        return await _perguntar_condicao(update.message, context)
 
     except ValueError:
+        rejeitar("get_time", "formato")
         await update.message.reply_text("⚠️ Digite apenas números.")
         return TEMPO
 
+async def _perguntar_condicao(message, context, cabecalho=""):
+    """Pergunta a condição; com demanda alta nesta hora, o teclado traz a dinâmica sugerida."""
+    percentual = _dinamica(context).percentual(time.time())
+    dica = f"⚡ Demanda alta agora: dinâmica sugerida de **{percentual / 100:g}x**.\n\n" if percentual > 100 else ""
+    await message.reply_text(
+        cabecalho + dica +
+        "🌤️ **Como está o trânsito/clima?**\n\n"
+        "Selecione uma opção abaixo para ajustar o preço:",
+        parse_mode="Markdown",
+        reply_markup=teclado_condicao(percentual)
+    )
+    return CONDICAO
+
+def _dinamica(context):
+    """``TabelaDinamica`` do bot, no ``bot_data`` (persistida junto com ele)."""
+    tabela = context.bot_data.get('dinamica')
+    if tabela is None:
+        tabela = context.bot_data['dinamica'] = TabelaDinamica()
+    return tabela
+
+@medido("orcamento", "condicao")
 async def calculate_final(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Calculates the final price based on condition."""
     query = update.callback_query
@@ -229,99 +434,324 @@ async def calculate_final(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Let's direct call cancel taking care of update
         return await cancel(update, context)
 
-    # Determine Multiplier
-    multiplier = 1.0
-    condition_name = "Normal"
-    
-    if data == "chuva":
-        multiplier = 1.2
-        condition_name = "Chuva/Noite"
-    elif data == "transito":
-        multiplier = 1.4
-        condition_name = "Trânsito Pesado"
-    elif data == "normal":
-        multiplier = 1.0
-        condition_name = "Normal"
-    else:
+    # Multiplier comes from the pressed button (or the suggested surge, "dinamica")
+    if data not in CONDICOES and data != CONDICAO_DINAMICA:
+        rejeitar("calculate_final", "opcao")
         await query.message.reply_text("⚠️ Opção inválida.")
         return CONDICAO
 
-    distance = context.user_data['distance']
-    minutes = context.user_data['minutes']
+    distance = context.user_data.distance
+    minutes = context.user_data.minutes
+    categoria = context.user_data.categoria or 'Padrão'
+    if distance is None or minutes is None:
+        # Conversa expirada (conversation_timeout ou sessao.varrer) entre a pergunta e o botão
+        rejeitar("calculate_final", "expirado")
+        await query.message.reply_text("⌛ Orçamento expirado. Comece de novo.", reply_markup=MENU_PRINCIPAL)
+        return ConversationHandler.END
 
-    # Select pricing variables based on category
-    categoria = context.user_data.get('categoria', 'Padrão')
-    if categoria == 'Executivo':
-        base_price = TAXA_BASE_EXEC
-        price_per_km = VALOR_KM_EXEC
-        price_per_min = VALOR_MINUTO_EXEC
-        minimum_fare = TARIFA_MINIMA_EXEC
+    motorista = frota.motorista(update.effective_user.id)
+    await _enviar_orcamento(query.message, context, motorista, distance, minutes, categoria, data,
+                            rota=context.user_data.rota)
+    return ConversationHandler.END
+
+
+@medido("orcamento_rapido", "comando")
+async def orcamento_rapido(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/orcamento <km> <min> [chuva|transito] [exec]: orçamento direto, sem passar pela conversa."""
+    try:
+        distance, minutes, categoria, condicao = ler_corrida(context.args)
+    except ValueError:
+        rejeitar("orcamento_rapido", "formato")
+        await update.message.reply_text(
+            "⚠️ Use: `/orcamento km minutos [chuva|transito] [exec]`\n"
+            "Ex: `/orcamento 5,6 15 chuva exec`",
+            parse_mode="Markdown"
+        )
+        return
+
+    logger.info("Orçamento rápido: %.2f km, %.2f min", distance, minutes)
+    motorista = frota.motorista(update.effective_user.id)
+    await _enviar_orcamento(update.message, context, motorista, distance, minutes, categoria, condicao)
+
+
+@medido("orcamento_rapido", "rota")
+async def orcamento_rota(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/rota <lat,lon> <lat,lon> [chuva|transito] [exec]: orçamento pela rota entre dois pontos."""
+    grafo = malha_rotas()
+    if grafo is None:
+        rejeitar("orcamento_rota", "indisponivel")
+        await update.message.reply_text("🗺️ Mapa indisponível. Use `/orcamento km minutos`.", parse_mode="Markdown")
+        return
+
+    try:
+        (lat1, lon1), (lat2, lon2) = (ler_coordenada(ponto) for ponto in context.args[:2])
+        # Valida as opções antes de gastar a busca
+        _, _, categoria, condicao = ler_corrida(["0", "0", *context.args[2:]])
+    except ValueError:
+        rejeitar("orcamento_rota", "formato")
+        await update.message.reply_text(
+            "⚠️ Use: `/rota lat,lon lat,lon [chuva|transito] [exec]`\n"
+            "Ex: `/rota -15.7939,-47.8828 -15.8267,-47.9218 chuva`",
+            parse_mode="Markdown"
+        )
+        return
+
+    rota = await asyncio.to_thread(grafo.rota, lat1, lon1, lat2, lon2)
+    if rota is None:
+        rejeitar("orcamento_rota", "fora_do_mapa")
+        await update.message.reply_text("⚠️ Ponto fora do mapa.")
+        return
+
+    distance, minutes = _km_minutos(rota)
+    logger.info("Orçamento por rota: %.2f km, %.0f min", distance, minutes)
+    motorista = frota.motorista(update.effective_user.id)
+    await _enviar_orcamento(update.message, context, motorista, distance, minutes, categoria, condicao)
+
+
+@medido("orcamento_rapido", "paradas")
+async def orcamento_paradas(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/paradas <origem> <parada> <parada>... [chuva|transito] [exec]: melhor ordem das paradas e o orçamento."""
+    grafo = malha_rotas()
+    if grafo is None:
+        rejeitar("orcamento_paradas", "indisponivel")
+        await update.message.reply_text("🗺️ Mapa indisponível. Use `/orcamento km minutos`.", parse_mode="Markdown")
+        return
+
+    try:
+        # Pontos têm vírgula (lat,lon); o resto são as opções
+        pontos = [ler_coordenada(arg) for arg in context.args if ',' in arg]
+        _, _, categoria, condicao = ler_corrida(["0", "0", *(arg for arg in context.args if ',' not in arg)])
+        if not 2 <= len(pontos) <= MAX_PARADAS + 1:
+            raise ValueError(len(pontos))
+    except ValueError:
+        rejeitar("orcamento_paradas", "formato")
+        await update.message.reply_text(
+            f"⚠️ Use: `/paradas origem parada parada... [chuva|transito] [exec]` (até {MAX_PARADAS} paradas, "
+            "cada ponto como `lat,lon`)\n"
+            "Ex: `/paradas -15.7939,-47.8828 -15.8267,-47.9218 -15.8011,-47.8600`",
+            parse_mode="Markdown"
+        )
+        return
+
+    # A ordem sai da tarifa da categoria pedida; o trajeto é cotado nas duas
+    motorista = frota.motorista(update.effective_user.id)
+    resultado = await asyncio.to_thread(_percurso, grafo, pontos, motorista.tarifa(categoria))
+    if resultado is None:
+        rejeitar("orcamento_paradas", "fora_do_mapa")
+        await update.message.reply_text("⚠️ Algum ponto está fora do mapa.")
+        return
+
+    matriz, percurso = resultado
+    distance, minutes = _km_minutos(Rota(percurso.metros, percurso.segundos))
+    multiplier = CONDICOES[condicao][0]
+    trechos = [(b, matriz.metros[a][b] / 1000) for a, b in zip(percurso.ordem, percurso.ordem[1:])]
+    precos = {cat: calcular_centavos(distance, minutes, motorista.tarifa(cat), multiplier) / 100 for cat in CATEGORIAS}
+    logger.info("Orçamento com %d paradas: %.2f km, %.0f min (%s)", len(trechos), distance, minutes,
+                "ótimo" if percurso.exato else "heurística")
+    await update.message.reply_text(resumo_paradas(trechos, distance, minutes, precos, percurso.exato), parse_mode="HTML")
+    await _enviar_orcamento(update.message, context, motorista, distance, minutes, categoria, condicao)
+
+
+def _percurso(grafo, pontos, tarifa):
+    """Matriz de rotas e ``paradas.Percurso`` mais barato; ``None`` se algum ponto estiver fora do mapa."""
+    matriz = grafo.matriz(pontos)
+    if matriz is None:
+        return None
+    return matriz, otimizar(matriz, tarifa)
+
+
+def _km_minutos(rota):
+    """Distância (km, 1 casa) e tempo (minutos inteiros, ao menos 1) de uma ``Rota``."""
+    return round(rota.metros / 1000, 1), float(max(1, round(rota.segundos / 60)))
+
+
+async def _enviar_orcamento(message, context, motorista, distance, minutes, categoria, condicao, rota=None):
+    """Calcula o preço na tarifa do ``motorista`` (``frota.Motorista``) e responde com o painel e o cartão do passageiro.
+
+    O orçamento vai para o ``historico`` com o id do painel (respondido com o
+    nome do cliente, vira o rótulo) e o nome da ``rota``, se houver.
+    """
+    agora = time.time()
+    dinamica = _dinamica(context)
+    if condicao == CONDICAO_DINAMICA:
+        multiplier, condition_name = dinamica.percentual(agora) / 100, "Dinâmica"
     else:
-        base_price = BASE_PRICE_PADRAO
-        price_per_km = PRICE_PER_KM_PADRAO
-        price_per_min = PRICE_PER_MIN_PADRAO
-        minimum_fare = MINIMUM_FARE_PADRAO
+        multiplier, condition_name = CONDICOES[condicao]
+    # Cada orçamento servido alimenta a demanda desta hora da semana
+    dinamica.registrar(agora)
+
+    # Select pricing variables based on category
+    tarifa = motorista.tarifa(categoria)
+    preco = calcular_centavos(distance, minutes, tarifa, multiplier)
+    final_price = preco / 100
+
+    # Message 1: Driver Panel (Technical) / Message 2: Passenger Message (Clean & Polite)
+    driver_msg = cartao_motorista(final_price, distance, minutes, multiplier, condition_name, motorista.carro, categoria, tarifa.minima)
+    passenger_msg = cartao_passageiro(final_price, distance, minutes, motorista.carro, categoria)
+
+    # Send Driver Message (button registers the ride in the ledger)
+    # No livro, a dinâmica tem o código seguinte ao das condições fixas
+    codigo_condicao = list(CONDICOES).index(condicao) if condicao in CONDICOES else len(CONDICOES)
+    aceitar = f"aceitar:{preco}:{round(distance * 1000)}:{round(minutes * 60)}:{CATEGORIAS.index(categoria)}:{codigo_condicao}"
+    painel = await message.reply_text(driver_msg, parse_mode="HTML", reply_markup=teclado_aceitar(aceitar))
+    historico.registrar(message.chat_id, painel.message_id, preco, round(distance * 1000), round(minutes * 60),
+                        categoria, condicao, rota)
+
+    # Send Passenger Message: cartão em imagem (o texto vai na legenda) ou só o texto
+    if cartoes is not None:
+        try:
+            await cartoes.enviar(message, (preco, distance, minutes, categoria, motorista.carro), caption=passenger_msg,
+                                 parse_mode="HTML", reply_markup=MENU_PRINCIPAL)
+            return final_price
+        except ERROS_RENDER:
+            logger.exception("Falha no cartão em imagem; enviando texto")
+    await message.reply_text(passenger_msg, parse_mode="HTML", reply_markup=MENU_PRINCIPAL)
+    return final_price
+
+
+@medido("orcamento", "aceitar")
+async def aceitar_corrida(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Registra no livro de corridas o orçamento aceito pelo botão do painel."""
+    query = update.callback_query
+    try:
+        centavos, metros, segundos, categoria, condicao = (int(v) for v in query.data.split(':')[1:])
+    except ValueError:
+        rejeitar("aceitar_corrida", "formato")
+        await query.answer("⚠️ Orçamento inválido.")
+        return
+
+    # Dois toques antes de o botão sumir chegam como dois callbacks do mesmo painel
+    painel = query.inline_message_id or (query.message.chat.id, query.message.message_id)
+    if painel in _paineis_aceitos:
+        rejeitar("aceitar_corrida", "repetido")
+        await query.answer("✅ Esta corrida já está no resumo diário.")
+        return
+    _paineis_aceitos[painel] = True
+    if len(_paineis_aceitos) > MAX_PAINEIS_ACEITOS:
+        _paineis_aceitos.popitem(last=False)
 
-    # Calculation: base + km * price + min * price
-    base_calc = base_price + (price_per_km * distance) + (price_per_min * minutes)
+    try:
+        await livro.aceitar(update.effective_user.id, centavos, metros, segundos, categoria, condicao)
+    except Exception:
+        # Não gravou: um novo toque tenta de novo
+        _paineis_aceitos.pop(painel, None)
+        raise
+    logger.info("Corrida registrada: R$ %.2f", centavos / 100)
 
-    # Apply Multiplier
-    total_with_multiplier = base_calc * multiplier
+    await query.answer("✅ Corrida registrada no resumo diário!")
+    await query.edit_message_reply_markup(reply_markup=None)
+
+
+@medido("exportar", "inicio")
+async def exportar_historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/exportar [csv|pdf] [AAAA | AAAA-MM]: histórico do livro de corridas em arquivo."""
+    formato, desde, ate, rotulo = "csv", None, None, "todo o período"
+    try:
+        for arg in context.args:
+            if arg.lower() in FORMATOS:
+                formato = arg.lower()
+            else:
+                desde, ate, rotulo = ler_periodo(arg)
+    except ValueError:
+        rejeitar("exportar", "formato")
+        await update.message.reply_text(
+            "⚠️ Use: `/exportar [csv|pdf] [AAAA ou AAAA-MM]`\nEx: `/exportar pdf 2026-03`", parse_mode="Markdown"
+        )
+        return
+
+    # O arquivo é montado em disco, em pedaços, numa thread; o upload lê dele em pedaços
+    corridas = no_periodo(livro.corridas(update.effective_user.id, desde), desde, ate)
+    with tempfile.TemporaryFile() as arquivo:
+        total = await asyncio.to_thread(gravar, corridas, formato, arquivo, f"Histórico de corridas — {rotulo}")
+        if not total.corridas:
+            await update.message.reply_text(f"📭 Nenhuma corrida registrada em {rotulo}.", reply_markup=MENU_PRINCIPAL)
+            return
+        if arquivo.tell() > LIMITE_DOCUMENTO:
+            rejeitar("exportar", "tamanho")
+            await update.message.reply_text("⛔ Histórico grande demais para um arquivo. Exporte por ano ou mês.")
+            return
+        logger.info("Exportação %s: %d corridas, %d bytes", formato, total.corridas, arquivo.tell())
+        arquivo.seek(0)
+        await update.message.reply_document(
+            document=InputFile(arquivo, filename=f"corridas_{rotulo.replace('/', '-').replace(' ', '_')}.{formato}",
+                               read_file_handle=False),
+            caption=f"📤 <b>Histórico de corridas</b> ({rotulo})\n\n"
+                    f"🚖 Corridas: <b>{total.corridas}</b>\n💰 Total: <b>R$ {brl(total.centavos / 100)}</b>",
+            parse_mode="HTML",
+            reply_markup=MENU_PRINCIPAL,
+            write_timeout=120,
+        )
+
+
+@medido("historico", "busca")
+async def buscar_historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/historico [termo]: orçamentos anteriores com o cliente ou a rota, do mais recente ao mais antigo."""
+    termo = " ".join(palavras(" ".join(context.args)))
+    if len(termo.encode()) > MAX_TERMO_HISTORICO:
+        rejeitar("buscar_historico", "tamanho")
+        await update.message.reply_text("⚠️ Busca longa demais: use uma ou duas palavras do nome do cliente ou do lugar.")
+        return
+
+    pagina = await historico.buscar(update.effective_chat.id, termo)
+    if not pagina.orcamentos:
+        await update.message.reply_text(
+            (f"📭 Nenhum orçamento com “{html.escape(termo)}”." if termo else "📭 Nenhum orçamento ainda.") +
+            "\n\n💡 Para achar pelo cliente, responda ao 🚖 painel do motorista com o nome dele.",
+            parse_mode="HTML", reply_markup=MENU_PRINCIPAL
+        )
+        return
+    await update.message.reply_text(historico_orcamentos(pagina.orcamentos, termo), parse_mode="HTML",
+                                    reply_markup=teclado_historico(termo, pagina))
 
-    # Apply Minimum Fare
-    final_raw = max(total_with_multiplier, minimum_fare)
-    
-    # Round to nearest 0.50
-    final_price = round_to_nearest_50_cents(final_raw)
-    
-    # Formatting
-    price_fmt = f"{final_price:.2f}".replace('.', ',')
-    multiplier_fmt = f"{multiplier}x"
-    
-    # Message 1: Driver Panel (Technical)
-    driver_msg = (
-        f"<b>🚖 PAINEL DO MOTORISTA</b>\n"
-        f"──────────────\n"
-        f"<b>💵 FINAL: R$ {price_fmt}</b>\n"
-        f"📏 Dist: {distance} km\n"
-        f"⏱️ Tempo: {minutes:.0f} min\n"
-        f"🌧️ Fator: {multiplier_fmt} ({condition_name})\n"
-        f"Veículo: {CAR_MODEL} ({categoria})\n"
-        f"──────────────\n"
-        f"<i>(Mínimo: R$ {minimum_fare:.2f})</i>"
-    )
 
-    # Message 2: Passenger Message (Clean & Polite)
-    passenger_msg = (
-        f"Olá! Segue o orçamento da sua viagem:\n\n"
-        f"<b>R$ {price_fmt}</b>\n\n"
-        f"🚗 <b>Veículo:</b> {CAR_MODEL} ({categoria})\n"
-        f"📏 <b>Distância:</b> {distance} km\n"
-        f"⏱️ <b>Tempo Estimado:</b> {minutes:.0f} min\n\n"
-        f"<i>Qualquer dúvida, estou à disposição!</i>"
+@medido("historico", "pagina")
+async def paginar_historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botões "mais antigos"/"mais recentes" do /historico: ``hist:<a|d>:<id da ponta da página>:<termo>``."""
+    query = update.callback_query
+    try:
+        _, sentido, chave, termo = query.data.split(':', 3)
+        chave = int(chave)
+        if sentido not in ("a", "d"):
+            raise ValueError(sentido)
+    except ValueError:
+        rejeitar("paginar_historico", "formato")
+        await query.answer("⚠️ Página inválida.")
+        return
+
+    # Página por chave: só as linhas antes (ou depois) do id da ponta, sem OFFSET
+    pagina = await historico.buscar(update.effective_chat.id, termo,
+                                    antes=chave if sentido == "a" else None, depois=chave if sentido == "d" else None)
+    if not pagina.orcamentos:
+        await query.answer("📭 Não há mais orçamentos.")
+        return
+    await query.answer()
+    await query.edit_message_text(historico_orcamentos(pagina.orcamentos, termo), parse_mode="HTML",
+                                  reply_markup=teclado_historico(termo, pagina))
+
+
+@medido("historico", "cliente")
+async def rotular_orcamento(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Resposta ao painel do motorista: o texto vira o nome do cliente daquele orçamento no /historico."""
+    painel = update.message.reply_to_message
+    # Só respostas às mensagens do bot; num grupo, responder a outra pessoa é conversa
+    if painel.from_user is None or painel.from_user.id != context.bot.id:
+        return
+    cliente = " ".join(update.message.text.split())[:MAX_CLIENTE]
+    if not await historico.rotular(update.effective_chat.id, painel.message_id, cliente):
+        rejeitar("rotular_orcamento", "sem_orcamento")
+        await update.message.reply_text("⚠️ Para dar nome ao cliente, responda ao 🚖 painel do motorista do orçamento.")
+        return
+    await update.message.reply_text(
+        f"🏷️ Orçamento salvo para <b>{html.escape(cliente)}</b>.\nPara achar depois: <code>/historico {html.escape(cliente)}</code>",
+        parse_mode="HTML"
     )
-    
-    # Reset Keyboard (show main options)
-    # Reset Keyboard (show main options)
-    keyboard = [
-        [InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")],
-        [InlineKeyboardButton("⛽ Calcular Consumo", callback_data="consumo")],
-        [InlineKeyboardButton("📅 Resumo Diário", callback_data="diario")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    # Send Driver Message
-    await query.message.reply_text(driver_msg, parse_mode="HTML")
-
-    # Send Passenger Message
-    await query.message.reply_text(passenger_msg, parse_mode="HTML", reply_markup=reply_markup)
-    
-    return ConversationHandler.END
 
 
+@medido("diario", "inicio")
 async def diario_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inicia o fluxo de resumo diário (corridas, ganho, combustível)."""
     logger.info("User started diario flow.")
+    context.user_data.teclado_aberto = True
 
     if update.callback_query:
         query = update.callback_query
@@ -330,22 +760,41 @@ async def diario_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         reply_method = update.message.reply_text
 
-    keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    # Rides accepted today come from the ledger; "Digitar manualmente" overrides them
+    resumo = await livro.consultar(update.effective_user.id)
+    if resumo.dia.corridas:
+        context.user_data.diaria_rides = resumo.dia.corridas
+        context.user_data.diaria_centavos = resumo.dia.centavos
+        await reply_method(
+            "📅 <b>Resumo Diário</b>\n\n" + resumo_livro(resumo) +
+            "\nQuanto você gastou com combustível hoje? (R$, ex: 60.5)",
+            parse_mode="HTML",
+            reply_markup=TECLADO_DIARIO_LIVRO
+        )
+        return DIARIA_COMB
+
+    return await _diario_perguntar_corridas(reply_method)
+
+
+@medido("diario", "manual")
+async def diario_manual(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ignora as corridas do livro e segue o fluxo manual do resumo diário."""
+    query = update.callback_query
+    await query.answer()
+    return await _diario_perguntar_corridas(query.message.reply_text)
+
 
+async def _diario_perguntar_corridas(reply_method):
     await reply_method(
         "📅 **Resumo Diário**\n\n"
         "Quantas corridas você fez hoje? (ex: 12)",
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=TECLADO_CANCELAR
     )
     return DIARIA_RIDAS
 
 
+@medido("diario", "corridas")
 async def diario_get_rides(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == BTN_CANCELAR:
@@ -354,112 +803,83 @@ async def diario_get_rides(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         rides = int(text)
         if rides < 0:
+            rejeitar("diario_get_rides", "valor")
             await update.message.reply_text("⛔ Valor inválido. Informe um número inteiro não-negativo.")
             return DIARIA_RIDAS
 
-        context.user_data['diaria_rides'] = rides
-
-        keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-        reply_markup = ReplyKeyboardMarkup(
-            keyboard,
-            resize_keyboard=True,
-            one_time_keyboard=True
-        )
+        context.user_data.diaria_rides = rides
 
         await update.message.reply_text(
             f"✅ Corridas: {rides}\n\nQuanto você ganhou no total hoje? (R$, ex: 150.50)",
-            reply_markup=reply_markup
+            reply_markup=TECLADO_CANCELAR
         )
         return DIARIA_GANHO
 
     except ValueError:
+        rejeitar("diario_get_rides", "formato")
         await update.message.reply_text("⚠️ Digite apenas um número inteiro (ex: 12).")
         return DIARIA_RIDAS
 
 
+@medido("diario", "ganho")
 async def diario_get_earned(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == BTN_CANCELAR:
         return await cancel(update, context)
 
     try:
-        clean = text.replace(',', '.')
-        earned = float(clean)
-        if earned < 0:
-            await update.message.reply_text("⛔ Valor inválido. Informe um número não-negativo.")
-            return DIARIA_GANHO
-
-        context.user_data['diaria_earned'] = earned
-
-        keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-        reply_markup = ReplyKeyboardMarkup(
-            keyboard,
-            resize_keyboard=True,
-            one_time_keyboard=True
-        )
+        earned = ler_centavos(text)
+
+        # Centavos inteiros: o resumo soma e subtrai sem erro de arredondamento
+        context.user_data.diaria_centavos = earned
 
         await update.message.reply_text(
-            f"✅ Ganho total: R$ {earned:.2f}\n\nQuanto você gastou com combustível hoje? (R$, ex: 60.5)",
-            reply_markup=reply_markup
+            f"✅ Ganho total: R$ {brl(earned / 100)}\n\nQuanto você gastou com combustível hoje? (R$, ex: 60.5)",
+            reply_markup=TECLADO_CANCELAR
         )
         return DIARIA_COMB
 
     except ValueError:
-        await update.message.reply_text("⚠️ Digite apenas números (ex: 150.50).")
+        # Texto, negativo ou acima de LIMITE_REAIS
+        rejeitar("diario_get_earned", "valor")
+        await update.message.reply_text(f"⚠️ Digite um valor em reais, de 0 a {brl(LIMITE_REAIS - 0.01)} (ex: 150.50).")
         return DIARIA_GANHO
 
 
+@medido("diario", "combustivel")
 async def diario_get_fuel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == BTN_CANCELAR:
         return await cancel(update, context)
 
     try:
-        clean = text.replace(',', '.')
-        fuel_spent = float(clean)
-        if fuel_spent < 0:
-            await update.message.reply_text("⛔ Valor inválido. Informe um número não-negativo.")
-            return DIARIA_COMB
+        fuel_spent = ler_centavos(text)
 
-        rides = context.user_data.get('diaria_rides', 0)
-        earned = context.user_data.get('diaria_earned', 0.0)
+        rides = context.user_data.diaria_rides or 0
+        earned = context.user_data.diaria_centavos or 0
 
+        # Tudo em centavos (margem em centésimos de %); vira reais só para exibir
         profit = earned - fuel_spent
-        profit_per_ride = profit / rides if rides > 0 else profit
-        margin_pct = (profit / earned * 100) if earned > 0 else 0.0
-
-        # Format numbers for pt-BR style
-        earned_fmt = f"{earned:.2f}".replace('.', ',')
-        fuel_fmt = f"{fuel_spent:.2f}".replace('.', ',')
-        profit_fmt = f"{profit:.2f}".replace('.', ',')
-        profit_per_fmt = f"{profit_per_ride:.2f}".replace('.', ',')
-        margin_fmt = f"{margin_pct:.2f}".replace('.', ',')
-
-        msg = (
-            f"📊 <b>Resumo Diário</b>\n\n"
-            f"🚖 Corridas: <b>{rides}</b>\n"
-            f"💰 Ganho total: <b>R$ {earned_fmt}</b>\n"
-            f"⛽ Combustível: <b>R$ {fuel_fmt}</b>\n\n"
-            f"🧾 Lucro líquido: <b>R$ {profit_fmt}</b>\n"
-            f"📈 Lucro por corrida: <b>R$ {profit_per_fmt}</b>\n"
-            f"📊 Margem: <b>{margin_fmt}%</b>\n"
-        )
+        profit_per_ride = dividir_centavos(profit, rides) if rides > 0 else profit
+        margin = dividir_centavos(profit * 10000, earned) if earned > 0 else 0
 
-        # Reset keyboard (show main options)
-        keyboard = [[InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        msg = resumo_diario(rides, earned / 100, fuel_spent / 100, profit / 100, profit_per_ride / 100, margin / 100)
 
-        await update.message.reply_text(msg, parse_mode="HTML", reply_markup=reply_markup)
+        await update.message.reply_text(msg, parse_mode="HTML", reply_markup=MENU_NOVO_ORCAMENTO)
         return ConversationHandler.END
 
     except ValueError:
-        await update.message.reply_text("⚠️ Digite apenas números (ex: 60.50).")
+        # Texto, negativo ou acima de LIMITE_REAIS
+        rejeitar("diario_get_fuel", "valor")
+        await update.message.reply_text(f"⚠️ Digite um valor em reais, de 0 a {brl(LIMITE_REAIS - 0.01)} (ex: 60.50).")
         return DIARIA_COMB
 
 
+@medido("consumo", "inicio")
 async def consumo_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Starts the fuel consumption flow (liters -> km)."""
     logger.info("User started consumo flow.")
+    context.user_data.teclado_aberto = True
 
     if update.callback_query:
         query = update.callback_query
@@ -468,22 +888,16 @@ async def consumo_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         reply_method = update.message.reply_text
 
-    keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-    reply_markup = ReplyKeyboardMarkup(
-        keyboard,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
-
     await reply_method(
         "⛽ **Consumo de Combustível**\n\n"
         "Quantos litros foram abastecidos? (ex: 40 ou 40.5)",
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=TECLADO_CANCELAR
     )
     return CON_LITROS
 
 
+@medido("consumo", "litros")
 async def consumo_get_liters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == BTN_CANCELAR:
@@ -492,30 +906,26 @@ async def consumo_get_liters(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         clean_text = text.replace(',', '.')
         liters = float(clean_text)
-        if liters <= 0:
+        if liters <= 0 or not math.isfinite(liters):
+            rejeitar("consumo_get_liters", "valor")
             await update.message.reply_text("⛔ Valor inválido. Informe um número maior que zero.")
             return CON_LITROS
 
-        context.user_data['liters'] = liters
-
-        keyboard = [[KeyboardButton(BTN_CANCELAR)]]
-        reply_markup = ReplyKeyboardMarkup(
-            keyboard,
-            resize_keyboard=True,
-            one_time_keyboard=True
-        )
+        context.user_data.liters = liters
 
         await update.message.reply_text(
             f"✅ Litros: {liters}\n\nQuanto KM foram rodados desde esse abastecimento?",
-            reply_markup=reply_markup
+            reply_markup=TECLADO_CANCELAR
         )
         return CON_KM
 
     except ValueError:
+        rejeitar("consumo_get_liters", "formato")
         await update.message.reply_text("⚠️ Digite apenas números (ex: 40.5).")
         return CON_LITROS
 
 
+@medido("consumo", "km")
 async def consumo_get_km(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == BTN_CANCELAR:
@@ -524,45 +934,184 @@ async def consumo_get_km(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         clean_text = text.replace(',', '.')
         km = float(clean_text)
-        if km <= 0:
+        if km <= 0 or not math.isfinite(km):
+            rejeitar("consumo_get_km", "valor")
             await update.message.reply_text("⛔ Valor inválido. Informe um número maior que zero.")
             return CON_KM
 
-        liters = context.user_data.get('liters')
+        liters = context.user_data.liters
         if not liters:
+            rejeitar("consumo_get_km", "ausente")
             await update.message.reply_text("⚠️ Não encontrei os litros. Reinicie com /consumo.")
             return ConversationHandler.END
 
         km_per_l = km / liters
+        if not km_per_l < MAX_KM_POR_LITRO:
+            # Litros ou km fora da realidade: no histórico, tornaria média e desvio inf/nan
+            rejeitar("consumo_get_km", "valor")
+            await update.message.reply_text(
+                f"⛔ {km:g} km com {liters:g} litros não parece certo. Confira os valores e reinicie com /consumo.",
+                reply_markup=MENU_PRINCIPAL
+            )
+            return ConversationHandler.END
         liters_per_100 = (liters * 100) / km
 
-        kmpl_fmt = f"{km_per_l:.2f}".replace('.', ',')
-        l100_fmt = f"{liters_per_100:.2f}".replace('.', ',')
-
-        msg = (
-            f"📊 Resultado do Consumo:\n\n"
-            f"🚗 Kilômetros rodados: {km} km\n"
-            f"⛽ Litros: {liters}\n\n"
-            f"📈 Consumo: <b>{kmpl_fmt} km/l</b>\n"
-            f"📉 Consumo médio: <b>{l100_fmt} L/100km</b>\n"
-        )
+        # Rolling stats over the last refuels; flags leaks and typos right away
+        historico = context.user_data.consumo_hist
+        if historico is None:
+            historico = context.user_data.consumo_hist = HistoricoConsumo()
+        alerta = historico.registrar(km_per_l)
+        if alerta:
+            logger.info("Consumo fora do padrão (%s): %.2f km/l", alerta, km_per_l)
 
-        # Reset keyboard (show main options)
-        # Reset keyboard (show main options)
-        keyboard = [
-            [InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")],
-            [InlineKeyboardButton("⛽ Calcular Consumo", callback_data="consumo")],
-            [InlineKeyboardButton("📅 Resumo Diário", callback_data="diario")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        msg = resultado_consumo(km, liters, km_per_l, liters_per_100) + historico_consumo(historico, alerta)
 
-        await update.message.reply_text(msg, parse_mode="HTML", reply_markup=reply_markup)
+        await update.message.reply_text(msg, parse_mode="HTML", reply_markup=MENU_PRINCIPAL)
         return ConversationHandler.END
 
     except ValueError:
+        rejeitar("consumo_get_km", "formato")
         await update.message.reply_text("⚠️ Digite apenas números (ex: 150).")
         return CON_KM
 
+@medido("lote", "inicio")
+async def lote_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/lote: orça várias corridas de uma vez (lista colada ou arquivo CSV)."""
+    logger.info("User started lote flow.")
+    context.user_data.teclado_aberto = True
+
+    # Linhas enviadas junto com o comando: "/lote\n5.6 15\n12 30 chuva exec"
+    texto = update.message.text.partition('\n')[2]
+    if texto.strip() and await _responder_lote(update, texto):
+        return ConversationHandler.END
+
+    await update.message.reply_text(
+        "📋 **Orçamento em Lote**\n\n"
+        "Cole a lista de corridas (uma por linha) ou envie um arquivo **CSV**.\n"
+        "Formato: `km minutos [chuva|transito] [exec]`\n\n"
+        "Ex:\n`5.6 15`\n`12,5 30 chuva exec`",
+        parse_mode="Markdown",
+        reply_markup=TECLADO_CANCELAR
+    )
+    return LOTE_ENTRADA
+
+
+@medido("lote", "texto")
+async def lote_receber_texto(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text
+    if text == BTN_CANCELAR:
+        return await cancel(update, context)
+
+    if await _responder_lote(update, text):
+        return ConversationHandler.END
+    return LOTE_ENTRADA
+
+
+@medido("lote", "csv")
+async def lote_receber_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    if document.file_size and document.file_size > LOTE_MAX_BYTES:
+        rejeitar("lote_receber_csv", "tamanho")
+        await update.message.reply_text(f"⛔ Arquivo muito grande (máx. {LOTE_MAX_BYTES // 1024} KB).")
+        return LOTE_ENTRADA
+
+    arquivo = await document.get_file()
+    conteudo = await arquivo.download_as_bytearray()
+    texto = bytes(conteudo).decode('utf-8-sig', errors='replace')
+
+    if await _responder_lote(update, texto):
+        return ConversationHandler.END
+    return LOTE_ENTRADA
+
+
+async def _responder_lote(update: Update, texto: str) -> bool:
+    """Calcula o lote e responde com o resumo e um CSV com os preços. Retorna False se nada foi calculado."""
+    distancias, minutos, categorias, condicoes, erros = ler_lote(texto)
+
+    if not distancias:
+        rejeitar("lote", "formato")
+        await update.message.reply_text("⚠️ Nenhuma corrida válida encontrada. Use: km minutos [chuva|transito] [exec].")
+        return False
+    if len(distancias) > LOTE_MAX_LINHAS:
+        rejeitar("lote", "tamanho")
+        await update.message.reply_text(f"⛔ Lote muito grande (máx. {LOTE_MAX_LINHAS} corridas).")
+        return False
+
+    motorista = frota.motorista(update.effective_user.id)
+    precos_lote = calcular_lote(distancias, minutos, categorias, condicoes, (motorista.padrao, motorista.executivo))
+    total = int(precos_lote.sum()) / 100
+    logger.info("Lote: %d corridas, %d linhas ignoradas", len(distancias), len(erros))
+
+    csv_buffer = io.StringIO()
+    csv_buffer.write("distancia_km;minutos;categoria;condicao;preco\n")
+    for distance, minutes, categoria, condicao, preco in zip(distancias, minutos, categorias, condicoes, precos_lote.tolist()):
+        csv_buffer.write(
+            f"{distance};{minutes:.0f};{categoria};{CONDICOES[condicao][1]};{preco / 100:.2f}\n".replace('.', ',')
+        )
+
+    msg = (
+        f"📋 <b>Orçamento em Lote</b>\n\n"
+        f"🚖 Corridas: <b>{len(distancias)}</b>\n"
+        f"💰 Total: <b>R$ {brl(total)}</b>\n"
+        f"📈 Média por corrida: <b>R$ {brl(total / len(distancias))}</b>\n"
+    )
+    if erros:
+        ignoradas = ", ".join(str(n) for n in erros[:10]) + ("..." if len(erros) > 10 else "")
+        msg += f"\n⚠️ Linhas ignoradas: {ignoradas}\n"
+
+    await update.message.reply_document(
+        document=io.BytesIO(csv_buffer.getvalue().encode('utf-8-sig')),
+        filename="orcamentos_lote.csv",
+        caption=msg,
+        parse_mode="HTML",
+        reply_markup=MENU_PRINCIPAL
+    )
+    return True
+
+@medido("inline", "consulta")
+async def inline_orcamento(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Modo inline: "@bot 5,6 15" devolve o orçamento de todas as categorias e condições."""
+    query = update.inline_query
+    partes = query.query.split()
+
+    try:
+        distance = float(partes[0].replace(',', '.'))
+        minutes = float(partes[1].replace(',', '.'))
+    except (ValueError, IndexError):
+        rejeitar("inline_orcamento", "formato")
+        await query.answer([], cache_time=5)
+        return
+    if len(partes) != 2 or not (valor_aceito(distance) and valor_aceito(minutes)):
+        rejeitar("inline_orcamento", "valor")
+        await query.answer([], cache_time=5)
+        return
+
+    # is_personal: cada motorista vê os preços da própria tarifa
+    await query.answer(_matriz_inline(distance, minutes, frota.motorista(query.from_user.id)),
+                       cache_time=300, is_personal=True)
+
+
+@functools.lru_cache(maxsize=INLINE_CACHE_SIZE)
+def _matriz_inline(distance, minutes, motorista):
+    """Resultados inline (categoria x condição) para uma distância e um tempo, na tarifa do ``motorista``."""
+    resultados = []
+    for categoria in CATEGORIAS:
+        tarifa = motorista.tarifa(categoria)
+        for chave, (multiplier, condition_name) in CONDICOES.items():
+            final_price = calcular_preco(distance, minutes, tarifa, multiplier)
+            resultados.append(InlineQueryResultArticle(
+                id=str(len(resultados)),
+                title=f"{EMOJI_CATEGORIA[categoria]} {categoria} · {EMOJI_CONDICAO[chave]} {condition_name}: R$ {brl(final_price)}",
+                description=f"{distance} km · {minutes:.0f} min · {multiplier}x",
+                input_message_content=InputTextMessageContent(
+                    cartao_passageiro(final_price, distance, minutes, motorista.carro, categoria),
+                    parse_mode="HTML"
+                )
+            ))
+    return tuple(resultados)
+
+
+@medido("geral", "cancelar", desvio="cancelado")
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancels and ends the conversation."""
     logger.info("User canceled conversation.")
@@ -572,99 +1121,279 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         reply_method = update.message.reply_text
 
-    keyboard = [
-        [InlineKeyboardButton("🚀 Novo Orçamento", callback_data="novo_orcamento")],
-        [InlineKeyboardButton("⛽ Calcular Consumo", callback_data="consumo")],
-        [InlineKeyboardButton("📅 Resumo Diário", callback_data="diario")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await reply_method("🚫 **Operação Cancelada.**", parse_mode="Markdown", reply_markup=reply_markup)
+    await reply_method("🚫 **Operação Cancelada.**", parse_mode="Markdown", reply_markup=MENU_PRINCIPAL)
     return ConversationHandler.END
 
-if __name__ == '__main__':
-    # Start the bot
+def adicionar_handlers(application):
+    """Registra os comandos e as conversas do bot na Application."""
+    # Conversas só são persistentes se a Application tiver persistência
+    persistente = application.persistence is not None
+    # Conversas paradas há SESSAO_TTL expiram (precisa do job_queue) e os valores do fluxo são apagados
+    expiracao = SESSAO_TTL if application.job_queue is not None else None
+    ao_expirar = [TypeHandler(Update, expirar_conversa)]
+
+    conv_handler = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(novo_orcamento, pattern="^novo_orcamento$")
+        ],
+        states={
+            CATEGORIA: [
+                CallbackQueryHandler(receber_categoria, pattern='^categoria_'),
+                CallbackQueryHandler(cancel, pattern='^cancelar$'),
+                CallbackQueryHandler(diario_start, pattern='^diario$')
+            ],
+            DISTANCIA: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_RESUMO, diario_start),
+                MessageHandler(filters.LOCATION, receber_local),
+                CallbackQueryHandler(escolher_lugar, pattern="^lugar:"),
+                MessageHandler(FILTRO_TEXTO, get_distance)
+            ],
+            TEMPO: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_RESUMO, diario_start),
+                MessageHandler(FILTRO_TEXTO, get_time)
+            ],
+            CONDICAO: [
+                CallbackQueryHandler(calculate_final, pattern="^(?!aceitar:|hist:)")
+            ],
+            ConversationHandler.TIMEOUT: ao_expirar
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        conversation_timeout=expiracao,
+        name="orcamento",
+        persistent=persistente
+    )
+
+    # Conversation handler for consumo (km/l)
+    # Conversation handler for diario (resumo diário)
+    conv_diario = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(diario_start, pattern="^diario$"),
+            CommandHandler("diario", diario_start)
+        ],
+        states={
+            DIARIA_RIDAS: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_TEXTO, diario_get_rides)
+            ],
+            DIARIA_GANHO: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_TEXTO, diario_get_earned)
+            ],
+            DIARIA_COMB: [
+                CallbackQueryHandler(diario_manual, pattern="^diario_manual$"),
+                CallbackQueryHandler(cancel, pattern="^cancelar$"),
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_TEXTO, diario_get_fuel)
+            ],
+            ConversationHandler.TIMEOUT: ao_expirar
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        conversation_timeout=expiracao,
+        name="diario",
+        persistent=persistente
+    )
+
+    conv_consumo = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(consumo_start, pattern="^consumo$"),
+            CommandHandler("consumo", consumo_start)
+        ],
+        states={
+            CON_LITROS: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_RESUMO, diario_start),
+                MessageHandler(FILTRO_TEXTO, consumo_get_liters)
+            ],
+            CON_KM: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(FILTRO_RESUMO, diario_start),
+                MessageHandler(FILTRO_TEXTO, consumo_get_km)
+            ],
+            ConversationHandler.TIMEOUT: ao_expirar
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        conversation_timeout=expiracao,
+        name="consumo",
+        persistent=persistente
+    )
+
+    conv_lote = ConversationHandler(
+        entry_points=[CommandHandler("lote", lote_start)],
+        states={
+            LOTE_ENTRADA: [
+                MessageHandler(FILTRO_CANCELAR, cancel),
+                MessageHandler(filters.Document.ALL, lote_receber_csv),
+                MessageHandler(FILTRO_TEXTO, lote_receber_texto)
+            ],
+            ConversationHandler.TIMEOUT: ao_expirar
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        conversation_timeout=expiracao,
+        name="lote",
+        persistent=persistente
+    )
+
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("orcamento", orcamento_rapido))
+    application.add_handler(CommandHandler("rota", orcamento_rota))
+    application.add_handler(CommandHandler("paradas", orcamento_paradas))
+    application.add_handler(CommandHandler("exportar", exportar_historico))
+    application.add_handler(CommandHandler("historico", buscar_historico))
+    application.add_handler(conv_handler)
+    application.add_handler(conv_diario)
+    application.add_handler(conv_consumo)
+    application.add_handler(conv_lote)
+    application.add_handler(InlineQueryHandler(inline_orcamento))
+    application.add_handler(CallbackQueryHandler(aceitar_corrida, pattern="^aceitar:"))
+    application.add_handler(CallbackQueryHandler(paginar_historico, pattern="^hist:"))
+    # Depois das conversas: texto em resposta ao painel, fora de um fluxo, é o nome do cliente
+    application.add_handler(MessageHandler(filters.REPLY & FILTRO_TEXTO, rotular_orcamento))
+
+    # Sessões paradas há SESSAO_TTL têm o fluxo limpo, e as vazias são descartadas (job_queue)
+    agendar_varredura(application, SESSAO_TTL)
+
+
+def build_application(token, env=os.environ, webhook=False):
+    """Monta a Application do bot: limitador, métricas, trabalhadores, persistência e handlers."""
+    global cartoes
+    # Envios passam pelo limitador (limites do Telegram, duplicados, 429)
+    limitador = LimitadorEnvios()
+    # Chamadas à Bot API medidas para o /metrics, envios e getUpdates em pools
+    # separados. Os dois clientes dividem um contexto TLS: carregar os
+    # certificados custa ~40 ms cada vez
+    tls = httpx.create_ssl_context()
+    envios = requisicao_envios(
+        int(env.get("API_CONCORRENCIA", CONCORRENCIA)), float(env.get("API_KEEPALIVE", KEEPALIVE)),
+        # API_HTTP2=auto (padrão) usa HTTP/2 se o pacote h2 estiver instalado
+        {"0": False, "1": True}.get(env.get("API_HTTP2", "auto")), tls,
+    )
+    builder = (
+        ApplicationBuilder().token(token).rate_limiter(limitador).context_types(CONTEXTO)
+        .request(envios)
+        .get_updates_request(requisicao_updates(tls))
+    )
+    # Bot API alternativa (servidor local do Telegram ou benchmarks.fake_api)
+    if env.get("BOT_API_URL"):
+        builder = builder.base_url(env["BOT_API_URL"])
+    # Chats diferentes em paralelo, cada chat em ordem (TRABALHADORES=1 volta ao sequencial)
+    trabalhadores = int(env.get("TRABALHADORES", "64"))
+    processador = None
+    if trabalhadores > 1:
+        processador = ProcessadorPorChat(trabalhadores)
+        builder = builder.concurrent_updates(processador)
+    # Conversas e user_data sobrevivem a restarts (PERSISTENCIA=0 desliga)
+    if env.get("PERSISTENCIA", "1") != "0":
+        from persistencia import PersistenciaSQLite
+        builder = builder.persistence(PersistenciaSQLite(os.path.join(DATA_DIR, "bot.sqlite3")))
+    if webhook:
+        # Sem Updater: os updates chegam pelo nosso servidor HTTP
+        builder = builder.updater(None)
+
+    # GET /metrics (Prometheus) na interface local; METRICAS_PORTA=0 desliga
+    servidores = []
+    metricas_porta = int(env.get("METRICAS_PORTA", "9464"))
+    if metricas_porta:
+        servidores.append(ServidorMetricas(env.get("METRICAS_LISTEN", "127.0.0.1"), metricas_porta))
+        METRICAS.coletar("bot_limitador", limitador.estatisticas)
+        METRICAS.coletar("bot_api_envios", envios.estatisticas)
+        METRICAS.coletar("bot_log", REGISTRO.estatisticas)
+        if processador:
+            METRICAS.coletar("bot_processador", processador.estatisticas)
+        METRICAS.coletar("bot_partida_segundos", PARTIDA.segundos)
+
+    # Cartão do passageiro em PNG, desenhado em outros processos (CARTAO_IMAGEM=0 volta ao texto)
+    cartoes = None
+    if env.get("CARTAO_IMAGEM", "1") != "0":
+        if importlib.util.find_spec("PIL") is None:
+            logger.warning("Pillow não instalado: cartão do passageiro só em texto.")
+        else:
+            processos = int(env.get("CARTAO_PROCESSOS", min(2, os.cpu_count() or 1)))
+            cartoes = CartoesOrcamento(processos, fonte=env.get("CARTAO_FONTE"), carros=(CAR_MODEL,))
+            if servidores:
+                METRICAS.coletar("bot_cartoes", cartoes.estatisticas)
+
+    async def _iniciar(app):
+        # Chamado depois do initialize (getMe e carga da persistência)
+        PARTIDA.marcar("initialize")
+        # Cadastro da frota lido antes do primeiro update; depois, só as mudanças (agendar_recarga)
+        if await asyncio.to_thread(frota.recarregar):
+            logger.info("Frota: %d motoristas (%s)", len(frota), ARQUIVO_FROTA)
+        PARTIDA.marcar("frota")
+        # Malha carregada na partida, não na primeira localização
+        if malha_rotas() is not None and servidores:
+            METRICAS.coletar("bot_rotas", malha_rotas().estatisticas)
+        guia_lugares()
+        PARTIDA.marcar("rotas")
+        if cartoes is not None:
+            cartoes.iniciar()
+            PARTIDA.marcar("cartoes")
+        for servidor in servidores:
+            await servidor.start()
+        PARTIDA.marcar("servidores")
+        logger.info("Partida: %s", PARTIDA.resumo())
+
+    async def _parar(app):
+        for servidor in servidores:
+            await servidor.stop()
+        if cartoes is not None:
+            cartoes.fechar()
+        frota.fechar()
+        await historico.fechar()
+        await livro.fechar()
+
+    application = builder.post_init(_iniciar).post_shutdown(_parar).build()
+    agendar_recarga(application, frota, int(env.get("FROTA_INTERVALO", "30")))
+    METRICAS.coletar("bot_fila", lambda: {"updates": application.update_queue.qsize()})
+    METRICAS.coletar("bot_frota", frota.estatisticas)
+    METRICAS.coletar("bot_historico", historico.estatisticas)
+    METRICAS.coletar("bot_dinamica", lambda: application.bot_data['dinamica'].estatisticas(time.time())
+                     if 'dinamica' in application.bot_data else {})
+    PARTIDA.marcar("builder")
+
+    adicionar_handlers(application)
+    PARTIDA.marcar("handlers")
+    return application
+
+
+def main():
     token = os.getenv("TELEGRAM_TOKEN")
     if not token or "NOVO_TOKEN_AQUI" in token:
         logger.error("TELEGRAM_TOKEN env var is missing or invalid.")
         print("❌ ERRO CRÍTICO: Token não configurado no arquivo .env!")
+        return
+
+    # BOT_MODE=polling (padrão) ou webhook
+    mode = os.getenv("BOT_MODE", "polling").strip().lower()
+    webhook_config = None
+    if mode == "webhook":
+        from webhook import ConfigWebhook
+        try:
+            webhook_config = ConfigWebhook.from_env(os.environ)
+        except ValueError as e:
+            logger.error("Configuração de webhook inválida: %s", e)
+            print(f"❌ ERRO CRÍTICO: {e}")
+            raise SystemExit(1)
+    elif mode != "polling":
+        logger.error("BOT_MODE inválido: %s", mode)
+        print("❌ ERRO CRÍTICO: BOT_MODE deve ser 'polling' ou 'webhook'.")
+        raise SystemExit(1)
+    PARTIDA.marcar("config")
+
+    print(f"🚀 Bot rodando localmente ({mode})...")
+    application = build_application(token, os.environ, webhook=webhook_config is not None)
+
+    if webhook_config:
+        from webhook import rodar_webhook
+        try:
+            asyncio.run(rodar_webhook(application, webhook_config))
+        except KeyboardInterrupt:
+            pass
     else:
-        print("🚀 Bot rodando localmente...")
-        application = ApplicationBuilder().token(token).build()
-
-        conv_handler = ConversationHandler(
-            entry_points=[
-                CallbackQueryHandler(novo_orcamento, pattern="^novo_orcamento$")
-            ],
-            states={
-                CATEGORIA: [
-                    CallbackQueryHandler(receber_categoria, pattern='^categoria_'),
-                    CallbackQueryHandler(cancel, pattern='^cancelar$'),
-                    CallbackQueryHandler(diario_start, pattern='^diario$')
-                ],
-                DISTANCIA: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_RESUMO)}$"), diario_start),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, get_distance)
-                ],
-                TEMPO: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_RESUMO)}$"), diario_start),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, get_time)
-                ],
-                CONDICAO: [
-                    CallbackQueryHandler(calculate_final)
-                ]
-            },
-            fallbacks=[CommandHandler("cancel", cancel)]
-        )
-        
-        # Conversation handler for consumo (km/l)
-        # Conversation handler for diario (resumo diário)
-        conv_diario = ConversationHandler(
-            entry_points=[
-                CallbackQueryHandler(diario_start, pattern="^diario$"),
-                CommandHandler("diario", diario_start)
-            ],
-            states={
-                DIARIA_RIDAS: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, diario_get_rides)
-                ],
-                DIARIA_GANHO: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, diario_get_earned)
-                ],
-                DIARIA_COMB: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, diario_get_fuel)
-                ]
-            },
-            fallbacks=[CommandHandler("cancel", cancel)]
-        )
+        # run_polling remove um webhook anterior antes de começar
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
-        conv_consumo = ConversationHandler(
-            entry_points=[
-                CallbackQueryHandler(consumo_start, pattern="^consumo$"),
-                CommandHandler("consumo", consumo_start)
-            ],
-            states={
-                CON_LITROS: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_RESUMO)}$"), diario_start),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, consumo_get_liters)
-                ],
-                CON_KM: [
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_CANCELAR)}$"), cancel),
-                    MessageHandler(filters.Regex(f"^{re.escape(BTN_RESUMO)}$"), diario_start),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, consumo_get_km)
-                ]
-            },
-            fallbacks=[CommandHandler("cancel", cancel)]
-        )
 
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(conv_handler)
-        application.add_handler(conv_diario)
-        application.add_handler(conv_consumo)
-        
-        application.run_polling()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Cartão do orçamento em PNG, para o passageiro compartilhar.
+
+O desenho roda num ``ProcessPoolExecutor``: o loop do bot só espera o PNG
+pronto. Os processos saem do ``forkserver`` (ou ``spawn``), não de um fork do
+bot, que copiaria as threads do loop, do banco e do log no meio de um lock; se
+um deles morrer, o pool é refeito. Cada processo monta na partida (``_iniciar``) o fundo de cada
+categoria já rasterizado, com degradê, painel e rótulos, e guarda a máscara de
+cada caractere por tamanho de fonte. Um cartão novo é uma cópia do fundo,
+alguns ``paste`` de glifos (preço, distância, tempo e o carro do motorista) e a
+compressão.
+
+``CartoesOrcamento`` guarda os PNG recentes por (centavos, distância,
+minutos, categoria, carro) e, depois do primeiro envio, o ``file_id`` que o
+Telegram devolveu: o mesmo cartão é reenviado sem upload.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+LARGURA, ALTURA = 800, 450
+COR_TOPO, COR_BASE = (18, 32, 71), (43, 92, 171)
+COR_PAINEL, COR_TEXTO, COR_ROTULO, COR_PRECO = (255, 255, 255), (33, 37, 41), (108, 117, 125), (25, 135, 84)
+TAMANHO_PRECO, TAMANHO_VALOR, TAMANHO_ROTULO = 96, 40, 24
+# Fonte padrão (procurada nas pastas de fontes do sistema); sem ela, a embutida do Pillow
+FONTE_PADRAO = "DejaVuSans.ttf"
+# Caracteres dos valores, com máscara pronta desde a partida do processo
+_CARACTERES = "0123456789,.R$ kmin"
+
+# Início dos processos do pool: fork copiaria as threads do bot com os locks como estiverem
+_INICIO = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Erros que fazem o cartão cair para a mensagem de texto
+ERROS_RENDER = (BrokenExecutor, OSError, ValueError)
+
+
+# --- processo de renderização -------------------------------------------------
+
+_fontes = {}
+_fundos = {}
+_glifos = {}
+_config = {}
+
+
+def _iniciar(fonte=None, categorias=('Padrão', 'Executivo'), carros=()):
+    """Initializer do pool: fundos das categorias e glifos dos valores e de ``carros`` prontos antes do primeiro cartão."""
+    _config.clear()
+    _config.update(fonte=fonte)
+    _fontes.clear()
+    _fundos.clear()
+    _glifos.clear()
+    for categoria in categorias:
+        _fundo(categoria)
+    for tamanho in (TAMANHO_PRECO, TAMANHO_VALOR):
+        for caractere in _CARACTERES:
+            _glifo(tamanho, caractere)
+    for carro in carros:
+        for caractere in _rotulo(carro):
+            _glifo(TAMANHO_ROTULO, caractere)
+
+
+def _fonte(tamanho):
+    fonte = _fontes.get(tamanho)
+    if fonte is None:
+        from PIL import ImageFont
+        try:
+            fonte = ImageFont.truetype(_config.get("fonte") or FONTE_PADRAO, tamanho)
+        except OSError:
+            if not _config.get("sem_acentos"):
+                logger.warning("Fonte %s indisponível; usando a embutida do Pillow.", _config.get("fonte") or FONTE_PADRAO)
+            # A fonte embutida não tem acentos: os rótulos saem sem eles
+            _config["sem_acentos"] = True
+            fonte = ImageFont.load_default(tamanho)
+        _fontes[tamanho] = fonte
+    return fonte
+
+
+def _rotulo(texto):
+    if _config.get("sem_acentos"):
+        return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return texto
+
+
+def _fundo(categoria):
+    fundo = _fundos.get(categoria)
+    if fundo is None:
+        from PIL import Image, ImageDraw, ImageOps
+        degrade = Image.linear_gradient('L').resize((LARGURA, ALTURA))
+        fundo = ImageOps.colorize(degrade, COR_TOPO, COR_BASE)
+        desenho = ImageDraw.Draw(fundo)
+        _fonte(TAMANHO_ROTULO)
+        desenho.text((40, 28), _rotulo("ORÇAMENTO DA VIAGEM"), font=_fonte(TAMANHO_ROTULO), fill=COR_PAINEL)
+        desenho.rounded_rectangle((30, 72, LARGURA - 30, ALTURA - 30), radius=24, fill=COR_PAINEL)
+        for x, rotulo in ((60, "Distância"), (290, "Tempo estimado"), (530, "Categoria")):
+            desenho.text((x, 250), _rotulo(rotulo), font=_fonte(TAMANHO_ROTULO), fill=COR_ROTULO)
+        desenho.text((530, 282), _rotulo(categoria), font=_fonte(TAMANHO_VALOR), fill=COR_TEXTO)
+        desenho.text((60, 360), _rotulo("Veículo:"), font=_fonte(TAMANHO_ROTULO), fill=COR_ROTULO)
+        _fundos[categoria] = fundo
+    return fundo
+
+
+def _glifo(tamanho, caractere):
+    """(máscara, deslocamento x, deslocamento y, avanço) de um caractere."""
+    glifo = _glifos.get((tamanho, caractere))
+    if glifo is None:
+        from PIL import Image, ImageDraw
+        fonte = _fonte(tamanho)
+        esquerda, topo, direita, baixo = fonte.getbbox(caractere)
+        mascara = Image.new('L', (max(1, direita - esquerda), max(1, baixo - topo)))
+        ImageDraw.Draw(mascara).text((-esquerda, -topo), caractere, font=fonte, fill=255)
+        glifo = _glifos[(tamanho, caractere)] = (mascara, esquerda, topo, fonte.getlength(caractere))
+    return glifo
+
+
+def _escrever(imagem, texto, x, y, tamanho, cor):
+    for caractere in texto:
+        mascara, dx, dy, avanco = _glifo(tamanho, caractere)
+        imagem.paste(cor, (round(x) + dx, y + dy), mascara)
+        x += avanco
+
+
+def renderizar(centavos, distancia, minutos, categoria, carro):
+    """PNG do cartão. Roda no processo do pool (ou direto, em testes e benchmarks)."""
+    imagem = _fundo(categoria).copy()
+    _escrever(imagem, f"R$ {centavos // 100},{centavos % 100:02d}", 60, 100, TAMANHO_PRECO, COR_PRECO)
+    _escrever(imagem, f"{distancia:g} km".replace('.', ','), 60, 282, TAMANHO_VALOR, COR_TEXTO)
+    _escrever(imagem, f"{minutos:.0f} min", 290, 282, TAMANHO_VALOR, COR_TEXTO)
+    # O carro muda de motorista para motorista: sai dos glifos, como os valores, e não do fundo
+    _escrever(imagem, _rotulo(carro), 60 + _fonte(TAMANHO_ROTULO).getlength(_rotulo("Veículo: ")), 360,
+              TAMANHO_ROTULO, COR_ROTULO)
+    saida = io.BytesIO()
+    # compress_level baixo: o cartão é quase todo cor chapada, e comprimir mais custa tempo
+    imagem.save(saida, "PNG", compress_level=1)
+    return saida.getvalue()
+
+
+# --- processo do bot ------------------------------------------------------------
+
+class CartoesOrcamento:
+    """Pool de renderização com cache de PNG e de ``file_id``."""
+
+    def __init__(self, processos=2, fonte=None, max_png=256, max_file_ids=4096, carros=()):
+        # Carros com os glifos prontos desde a partida; os demais são rasterizados no primeiro cartão
+        self.carros = tuple(carros)
+        self.processos = processos
+        self.fonte = fonte
+        self.max_png = max_png
+        self.max_file_ids = max_file_ids
+        self._pool = None
+        self._png = OrderedDict()
+        self._file_ids = OrderedDict()
+        self._pendentes = {}
+        self.renderizados = 0
+        self.acertos_png = 0
+        self.acertos_file_id = 0
+
+    def iniciar(self):
+        """Cria o pool e já sobe os processos (fundos e glifos prontos antes do primeiro orçamento)."""
+        self._pool = ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context(_INICIO),
+                                         initializer=_iniciar,
+                                         initargs=(self.fonte, ('Padrão', 'Executivo'), self.carros))
+        for _ in range(self.processos):
+            self._pool.submit(int)
+
+    def fechar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def png(self, chave):
+        """PNG de ``chave`` = (centavos, distância, minutos, categoria, carro), do cache ou do pool."""
+        png = self._png.get(chave)
+        if png is not None:
+            self._png.move_to_end(chave)
+            self.acertos_png += 1
+            return png
+        # O mesmo cartão pedido duas vezes ao mesmo tempo é desenhado uma vez só
+        futuro = self._pendentes.get(chave)
+        if futuro is None:
+            futuro = self._pendentes[chave] = asyncio.ensure_future(self._renderizar(chave))
+        return await asyncio.shield(futuro)
+
+    async def _renderizar(self, chave):
+        try:
+            if self._pool is None:
+                self.iniciar()
+            pool = self._pool
+            try:
+                png = await asyncio.get_running_loop().run_in_executor(pool, renderizar, *chave)
+            except BrokenExecutor:
+                # Um processo morreu (OOM, kill): este cartão cai para o texto e o pool
+                # é refeito uma vez só, mesmo com vários cartões falhando juntos
+                if self._pool is pool:
+                    logger.warning("Pool de cartões quebrado; subindo outro.")
+                    self.fechar()
+                    self.iniciar()
+                raise
+        finally:
+            del self._pendentes[chave]
+        self.renderizados += 1
+        _guardar(self._png, chave, png, self.max_png)
+        return png
+
+    async def enviar(self, message, chave, **kwargs):
+        """Responde ``message`` com o cartão (``kwargs`` vão para o ``reply_photo``), reaproveitando o ``file_id``."""
+        file_id = self._file_ids.get(chave)
+        if file_id is not None:
+            try:
+                enviada = await message.reply_photo(file_id, **kwargs)
+                self._file_ids.move_to_end(chave)
+                self.acertos_file_id += 1
+                return enviada
+            except BadRequest:
+                # file_id recusado (ex: token trocado): esquece e sobe o arquivo de novo
+                self._file_ids.pop(chave, None)
+        enviada = await message.reply_photo(await self.png(chave), filename="orcamento.png", **kwargs)
+        if enviada.photo:
+            _guardar(self._file_ids, chave, enviada.photo[-1].file_id, self.max_file_ids)
+        return enviada
+
+    def estatisticas(self):
+        return {"renderizados": self.renderizados, "acertos_png": self.acertos_png,
+                "acertos_file_id": self.acertos_file_id, "png_em_cache": len(self._png),
+                "file_ids": len(self._file_ids)}
+
+
+def _guardar(cache, chave, valor, maximo):
+    cache[chave] = valor
+    cache.move_to_end(chave)
+    if len(cache) > maximo:
+        cache.popitem(last=False)
@@ -0,0 +1,110 @@
+"""Histórico de consumo de combustível por motorista.
+
+Guarda os últimos ``CAPACIDADE`` abastecimentos (km/l) num buffer circular de
+tamanho fixo e mantém média, desvio, EWMA, mínimo e máximo da janela
+atualizados a cada registro, sem percorrer o histórico. A memória por
+motorista é limitada, então o objeto pode ficar no ``user_data`` de uma frota
+inteira.
+"""
+import operator
+from array import array
+from collections import deque
+
+CAPACIDADE = 32
+# Peso do abastecimento mais recente na média móvel exponencial
+ALFA_EWMA = 0.3
+# Abastecimentos necessários antes de apontar anomalias
+MIN_AMOSTRAS = 4
+# Anomalia: fora de LIMITE_Z desvios e a mais de LIMITE_RELATIVO da média
+LIMITE_Z = 2.5
+LIMITE_RELATIVO = 0.2
+
+# Acima disso (km/l) é erro de digitação: nenhum carro chega perto, e valores
+# enormes estourariam a soma dos quadrados para inf
+MAX_KM_POR_LITRO = 1000
+
+ANOMALIA_BAIXA = "baixo"
+ANOMALIA_ALTA = "alto"
+
+
+class HistoricoConsumo:
+    __slots__ = ('valores', 'inseridos', 'soma', 'soma_quadrados', 'ewma', '_minimos', '_maximos')
+
+    def __init__(self, capacidade=CAPACIDADE):
+        self.valores = array('d', bytes(8 * capacidade))
+        self.inseridos = 0
+        self.soma = 0.0
+        self.soma_quadrados = 0.0
+        self.ewma = 0.0
+        # Deques monotônicas de (posição, valor): mínimo/máximo da janela em O(1) amortizado
+        self._minimos = deque()
+        self._maximos = deque()
+
+    @property
+    def capacidade(self):
+        return len(self.valores)
+
+    @property
+    def n(self):
+        return min(self.inseridos, self.capacidade)
+
+    @property
+    def media(self):
+        return self.soma / self.n if self.n else 0.0
+
+    @property
+    def desvio(self):
+        if self.n < 2:
+            return 0.0
+        variancia = self.soma_quadrados / self.n - self.media ** 2
+        return max(variancia, 0.0) ** 0.5
+
+    @property
+    def minimo(self):
+        return self._minimos[0][1] if self._minimos else 0.0
+
+    @property
+    def maximo(self):
+        return self._maximos[0][1] if self._maximos else 0.0
+
+    def anomalia(self, km_por_litro):
+        """``ANOMALIA_BAIXA``/``ANOMALIA_ALTA`` se o valor foge do histórico, senão ``None``."""
+        if self.n < MIN_AMOSTRAS:
+            return None
+        diferenca = km_por_litro - self.media
+        if abs(diferenca) <= max(LIMITE_Z * self.desvio, LIMITE_RELATIVO * self.media):
+            return None
+        return ANOMALIA_BAIXA if diferenca < 0 else ANOMALIA_ALTA
+
+    def registrar(self, km_por_litro):
+        """Acrescenta um abastecimento e devolve a anomalia em relação ao histórico anterior."""
+        alerta = self.anomalia(km_por_litro)
+
+        capacidade = self.capacidade
+        posicao = self.inseridos
+        indice = posicao % capacidade
+        if posicao >= capacidade:
+            antigo = self.valores[indice]
+            self.soma -= antigo
+            self.soma_quadrados -= antigo * antigo
+        self.valores[indice] = km_por_litro
+
+        if indice == 0 and posicao:
+            # Uma volta completa: recalcula as somas para não acumular erro de arredondamento
+            self.soma = sum(self.valores)
+            self.soma_quadrados = sum(v * v for v in self.valores)
+        else:
+            self.soma += km_por_litro
+            self.soma_quadrados += km_por_litro * km_por_litro
+
+        self.ewma = km_por_litro if posicao == 0 else self.ewma + ALFA_EWMA * (km_por_litro - self.ewma)
+
+        for fila, descarta in ((self._minimos, operator.ge), (self._maximos, operator.le)):
+            while fila and descarta(fila[-1][1], km_por_litro):
+                fila.pop()
+            fila.append((posicao, km_por_litro))
+            if fila[0][0] <= posicao - capacidade:
+                fila.popleft()
+
+        self.inseridos = posicao + 1
+        return alerta
@@ -0,0 +1,192 @@
+"""Livro de corridas: registro append-only das corridas aceitas.
+
+Cada motorista tem um arquivo ``<user_id>.bin`` com registros binários de
+tamanho fixo (data, preço em centavos, metros, segundos, categoria e
+condição) e um arquivo ``<user_id>.agg`` com os totais do dia, da semana e do
+mês corrente. Os totais são atualizados a cada corrida gravada, então o resumo
+é uma leitura O(1), sem reler o histórico, que pode ter anos de corridas.
+
+No bot, o livro é usado pela thread própria dele (``aceitar`` e
+``consultar``, como em ``historico.py``): o handler não espera o disco, e
+gravação e leitura dos totais não se cruzam.
+"""
+import asyncio
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import NamedTuple
+
+# ts (s), preço (centavos), distância (m), tempo (s), categoria, condição
+REGISTRO = struct.Struct('<qiIIBB2x')
+# (chave, corridas, centavos) para dia, semana e mês + tamanho do livro nessa hora
+_TOTAIS = struct.Struct('<10q')
+# Tamanho do bloco lido de trás para frente ao reconstruir os totais
+_BLOCO = REGISTRO.size * 4096
+
+
+class Corrida(NamedTuple):
+    ts: int
+    centavos: int
+    metros: int
+    segundos: int
+    categoria: int
+    condicao: int
+
+
+class Total(NamedTuple):
+    corridas: int
+    centavos: int
+
+
+class Resumo(NamedTuple):
+    dia: Total
+    semana: Total
+    mes: Total
+
+
+def chaves_periodo(ts):
+    """Chaves (dia, semana ISO, mês) do instante ``ts`` no fuso local."""
+    d = datetime.fromtimestamp(ts).date()
+    ano, semana, _ = d.isocalendar()
+    return d.year * 10000 + d.month * 100 + d.day, ano * 100 + semana, d.year * 100 + d.month
+
+
+class LivroCorridas:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        # user_id -> [dia, n, c, semana, n, c, mes, n, c, bytes do livro]
+        self._totais = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="livro")
+
+    def _caminho(self, user_id, extensao):
+        return os.path.join(self.pasta, f"{user_id}.{extensao}")
+
+    def registrar(self, user_id, centavos, metros, segundos, categoria=0, condicao=0, ts=None):
+        """Acrescenta uma corrida ao livro do motorista e atualiza os totais."""
+        ts = int(time.time() if ts is None else ts)
+        totais = self._carregar_totais(user_id)
+
+        os.makedirs(self.pasta, exist_ok=True)
+        with open(self._caminho(user_id, "bin"), "ab") as arquivo:
+            # Descarta um registro pela metade deixado por uma queda
+            tamanho = arquivo.tell()
+            if tamanho % REGISTRO.size:
+                arquivo.truncate(tamanho - tamanho % REGISTRO.size)
+            arquivo.write(REGISTRO.pack(ts, centavos, metros, segundos, categoria, condicao))
+            totais[9] = arquivo.tell()
+
+        for i, chave in enumerate(chaves_periodo(ts)):
+            if totais[i * 3] != chave:
+                totais[i * 3:i * 3 + 3] = [chave, 0, 0]
+            totais[i * 3 + 1] += 1
+            totais[i * 3 + 2] += centavos
+        self._gravar_totais(user_id, totais)
+
+    def resumo(self, user_id, ts=None):
+        """Totais do dia, da semana e do mês de ``ts`` (agora, por padrão)."""
+        totais = self._carregar_totais(user_id)
+        chaves = chaves_periodo(time.time() if ts is None else ts)
+        return Resumo(*(
+            Total(totais[i * 3 + 1], totais[i * 3 + 2]) if totais[i * 3] == chave else Total(0, 0)
+            for i, chave in enumerate(chaves)
+        ))
+
+    def corridas(self, user_id, desde=None):
+        """Itera as corridas do motorista em ordem de gravação (opcionalmente a partir de ``desde``)."""
+        try:
+            arquivo = open(self._caminho(user_id, "bin"), "rb")
+        except FileNotFoundError:
+            return
+        with arquivo:
+            while True:
+                bloco = arquivo.read(_BLOCO)
+                if not bloco:
+                    return
+                for registro in REGISTRO.iter_unpack(bloco[:len(bloco) - len(bloco) % REGISTRO.size]):
+                    if desde is None or registro[0] >= desde:
+                        yield Corrida(*registro)
+
+    # --- loop -------------------------------------------------------------
+
+    async def _no_livro(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+
+    async def aceitar(self, user_id, centavos, metros, segundos, categoria=0, condicao=0):
+        """``registrar`` na thread do livro."""
+        await self._no_livro(self.registrar, user_id, centavos, metros, segundos, categoria, condicao)
+
+    async def consultar(self, user_id):
+        """``resumo`` de agora na thread do livro (a primeira consulta pode reler o fim do arquivo)."""
+        return await self._no_livro(self.resumo, user_id)
+
+    async def fechar(self):
+        """Espera as gravações pendentes."""
+        await self._no_livro(int)
+
+    # --- totais -----------------------------------------------------------
+
+    def _carregar_totais(self, user_id):
+        totais = self._totais.get(user_id)
+        if totais is not None:
+            return totais
+        try:
+            with open(self._caminho(user_id, "agg"), "rb") as arquivo:
+                totais = list(_TOTAIS.unpack(arquivo.read(_TOTAIS.size)))
+        except (FileNotFoundError, struct.error):
+            totais = None
+        # Totais gravados antes de uma queda no meio de registrar(): refaz
+        if totais is None or totais[9] != self._tamanho(user_id):
+            totais = self._reconstruir_totais(user_id)
+        self._totais[user_id] = totais
+        return totais
+
+    def _tamanho(self, user_id):
+        try:
+            return os.path.getsize(self._caminho(user_id, "bin"))
+        except FileNotFoundError:
+            return 0
+
+    def _gravar_totais(self, user_id, totais):
+        caminho = self._caminho(user_id, "agg")
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(_TOTAIS.pack(*totais))
+        os.replace(temporario, caminho)
+
+    def _reconstruir_totais(self, user_id):
+        """Relê só o fim do livro (mês e semana correntes) para refazer os totais."""
+        dia, semana, mes = chaves_periodo(time.time())
+        hoje = date(dia // 10000, dia // 100 % 100, dia % 100)
+        inicio_mes = time.mktime(hoje.replace(day=1).timetuple())
+        inicio_semana = time.mktime(date.fromordinal(hoje.toordinal() - hoje.weekday()).timetuple())
+        limite = min(inicio_mes, inicio_semana)
+
+        totais = [dia, 0, 0, semana, 0, 0, mes, 0, 0, self._tamanho(user_id)]
+        for corrida in self._de_tras_para_frente(user_id):
+            if corrida.ts < limite:
+                break
+            for i, chave in enumerate(chaves_periodo(corrida.ts)):
+                if chave == totais[i * 3]:
+                    totais[i * 3 + 1] += 1
+                    totais[i * 3 + 2] += corrida.centavos
+        if totais[9]:
+            self._gravar_totais(user_id, totais)
+        return totais
+
+    def _de_tras_para_frente(self, user_id):
+        try:
+            arquivo = open(self._caminho(user_id, "bin"), "rb")
+        except FileNotFoundError:
+            return
+        with arquivo:
+            fim = arquivo.seek(0, os.SEEK_END)
+            fim -= fim % REGISTRO.size
+            while fim > 0:
+                inicio = max(0, fim - _BLOCO)
+                arquivo.seek(inicio)
+                bloco = arquivo.read(fim - inicio)
+                for registro in reversed(list(REGISTRO.iter_unpack(bloco))):
+                    yield Corrida(*registro)
+                fim = inicio
@@ -0,0 +1,92 @@
+"""Tarifa dinâmica pela hora da semana.
+
+``TabelaDinamica`` conta os orçamentos de cada uma das 168 horas da semana
+(segunda 0h = 0) e guarda, já calculado, o multiplicador de cada hora em
+porcentagem inteira (o formato de ``precos.preco_centavos``). A consulta é uma
+leitura no array; registrar um orçamento soma um na hora dele e refaz só o
+multiplicador dessa hora. Na primeira consulta ou registro de cada hora, o
+volume de todas as horas é envelhecido até a semana corrente (meia-vida de
+``MEIA_VIDA_SEMANAS``) e a tabela inteira é refeita, então a tabela acompanha
+a demanda recente, mesmo a das horas em que ninguém pediu orçamento.
+
+O objeto é pequeno e fica no ``bot_data`` (vai junto com a persistência).
+"""
+from array import array
+from datetime import datetime
+
+# callback_data do botão da dinâmica sugerida (ao lado das condições fixas)
+CONDICAO_DINAMICA = "dinamica"
+SLOTS = 168
+MEIA_VIDA_SEMANAS = 2
+# Orçamentos registrados antes de sugerir qualquer dinâmica
+MIN_ORCAMENTOS = 200
+# Quanto a porcentagem sobe para cada 100% de demanda acima da média
+SENSIBILIDADE = 0.25
+PISO, TETO, PASSO = 100, 150, 5
+
+_DECAIMENTO = 0.5 ** (1 / MEIA_VIDA_SEMANAS)
+
+
+def hora_da_semana(ts):
+    """(semana, hora da semana 0..167) de ``ts`` no fuso local; a semana é contada desde a época."""
+    d = datetime.fromtimestamp(ts)
+    return d.toordinal() // 7, d.weekday() * 24 + d.hour
+
+
+class TabelaDinamica:
+    __slots__ = ('volumes', 'semanas', 'percentuais', 'total', 'registrados', 'hora_atual')
+
+    def __init__(self):
+        self.volumes = array('d', bytes(8 * SLOTS))
+        # Semana até a qual o volume de cada hora já foi envelhecido
+        self.semanas = array('q', bytes(8 * SLOTS))
+        self.percentuais = array('H', [PISO]) * SLOTS
+        self.total = 0.0
+        self.registrados = 0
+        # semana * SLOTS + hora da última virada (a hora sozinha se repetiria uma semana depois)
+        self.hora_atual = -1
+
+    def percentual(self, ts):
+        """Multiplicador sugerido para o instante ``ts``, em porcentagem (100 = sem dinâmica)."""
+        semana, hora = hora_da_semana(ts)
+        if semana * SLOTS + hora != self.hora_atual:
+            self._virar_hora(semana, hora)
+        return self.percentuais[hora]
+
+    def registrar(self, ts):
+        """Conta um orçamento servido em ``ts``."""
+        semana, hora = hora_da_semana(ts)
+        if semana * SLOTS + hora != self.hora_atual:
+            self._virar_hora(semana, hora)
+        self.volumes[hora] += 1
+        self.total += 1
+        self.registrados += 1
+        self.percentuais[hora] = self._percentual_da_hora(hora)
+
+    def _virar_hora(self, semana, hora):
+        # Envelhece todas as horas até ``semana`` (as paradas também) e refaz a tabela
+        self.hora_atual = semana * SLOTS + hora
+        total = 0.0
+        for h in range(SLOTS):
+            atraso = semana - self.semanas[h]
+            if atraso > 0:
+                self.volumes[h] *= _DECAIMENTO ** atraso
+                self.semanas[h] = semana
+            total += self.volumes[h]
+        self.total = total
+        self._recalcular()
+
+    def _recalcular(self):
+        for hora in range(SLOTS):
+            self.percentuais[hora] = self._percentual_da_hora(hora)
+
+    def _percentual_da_hora(self, hora):
+        if self.registrados < MIN_ORCAMENTOS or self.total <= 0:
+            return PISO
+        demanda = self.volumes[hora] * SLOTS / self.total
+        extra = round(SENSIBILIDADE * (demanda - 1) * 100 / PASSO) * PASSO
+        return min(TETO, max(PISO, PISO + extra))
+
+    def estatisticas(self, ts):
+        return {"percentual": self.percentual(ts), "orcamentos": self.registrados,
+                "maximo": max(self.percentuais)}
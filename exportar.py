@@ -0,0 +1,216 @@
+"""Exportação do livro de corridas em CSV ou PDF, em fluxo.
+
+As corridas saem de ``LivroCorridas.corridas`` (lidas do disco em blocos) e
+passam por uma cadeia de geradores até virar pedaços de ``TAMANHO_PEDACO``
+bytes do arquivo final, gravados num arquivo temporário. O envio
+(``sendDocument``) lê desse arquivo em pedaços também, então a memória não
+cresce com o histórico: nada guarda a lista de corridas nem o arquivo
+inteiro. No PDF, só a posição de cada objeto (duas por página) fica guardada
+até a tabela ``xref`` do final.
+
+O PDF usa a Helvetica embutida nos leitores (sem fonte no arquivo) com a
+codificação WinAnsi, que cobre os acentos do português.
+"""
+import csv
+import time
+import zlib
+from array import array
+from datetime import datetime
+
+from corridas import Total
+from precos import CATEGORIAS, CONDICOES
+
+FORMATOS = ("csv", "pdf")
+TAMANHO_PEDACO = 64 * 1024
+# Limite de upload de documentos da Bot API
+LIMITE_DOCUMENTO = 50 * 1024 * 1024
+
+# No livro, a dinâmica tem o código seguinte ao das condições fixas
+NOMES_CONDICOES = tuple(nome for _, nome in CONDICOES.values()) + ("Dinâmica",)
+CABECALHO = ("data", "hora", "distancia_km", "minutos", "categoria", "condicao", "valor")
+
+# Página A4 em pontos; colunas do PDF (x de cada campo de CABECALHO)
+_LARGURA, _ALTURA, _MARGEM = 595, 842, 40
+_COLUNAS = (40, 105, 150, 225, 285, 365, 485)
+_AVANCOS = tuple(x - anterior for anterior, x in zip((0,) + _COLUNAS, _COLUNAS))
+_ENTRELINHA, _CORPO = 13, 9
+_LINHAS_POR_PAGINA = (_ALTURA - 2 * _MARGEM - 60) // _ENTRELINHA
+
+
+def ler_periodo(texto):
+    """``(desde, ate, rótulo)`` em timestamps locais de "2026", "2026-03" ou "03/2026". ``ValueError`` se inválido."""
+    texto = texto.strip()
+    for formato in ("%Y-%m", "%m/%Y", "%Y"):
+        try:
+            inicio = datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+        if formato == "%Y":
+            fim, rotulo = inicio.replace(year=inicio.year + 1), f"{inicio.year}"
+        else:
+            fim = inicio.replace(year=inicio.year + inicio.month // 12, month=inicio.month % 12 + 1)
+            rotulo = f"{inicio.month:02d}/{inicio.year}"
+        return time.mktime(inicio.timetuple()), time.mktime(fim.timetuple()), rotulo
+    raise ValueError(f"Período inválido: {texto!r} (use AAAA, AAAA-MM ou MM/AAAA)")
+
+
+def no_periodo(corridas, desde=None, ate=None):
+    """Filtra ``corridas`` por ``desde <= ts < ate`` (o ``desde`` também pode ir direto para ``LivroCorridas.corridas``)."""
+    for corrida in corridas:
+        if (desde is None or corrida.ts >= desde) and (ate is None or corrida.ts < ate):
+            yield corrida
+
+
+def campos(corrida):
+    """Valores de uma corrida na ordem de ``CABECALHO``, formatados em pt-BR."""
+    quando = time.localtime(corrida.ts)
+    categoria = CATEGORIAS[corrida.categoria] if corrida.categoria < len(CATEGORIAS) else str(corrida.categoria)
+    condicao = NOMES_CONDICOES[corrida.condicao] if corrida.condicao < len(NOMES_CONDICOES) else str(corrida.condicao)
+    return (
+        f"{quando.tm_mday:02d}/{quando.tm_mon:02d}/{quando.tm_year}", f"{quando.tm_hour:02d}:{quando.tm_min:02d}",
+        f"{corrida.metros / 1000:.1f}".replace('.', ','), f"{corrida.segundos / 60:.0f}",
+        categoria, condicao, _reais(corrida.centavos),
+    )
+
+
+def _reais(centavos):
+    return f"{centavos // 100},{centavos % 100:02d}"
+
+
+def _contar(corridas, total):
+    for corrida in corridas:
+        total[0] += 1
+        total[1] += corrida.centavos
+        yield corrida
+
+
+def _em_pedacos(partes, tamanho=TAMANHO_PEDACO):
+    """Junta os ``bytes`` de ``partes`` em pedaços de pelo menos ``tamanho`` (o último pode ser menor)."""
+    buffer, acumulado = [], 0
+    for parte in partes:
+        buffer.append(parte)
+        acumulado += len(parte)
+        if acumulado >= tamanho:
+            yield b"".join(buffer)
+            buffer, acumulado = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+# --- CSV ----------------------------------------------------------------------
+
+class _Linha:
+    """Destino do ``csv.writer``: guarda só a última linha escrita."""
+
+    __slots__ = ('texto',)
+
+    def write(self, texto):
+        self.texto = texto
+
+
+def _csv(corridas):
+    linha = _Linha()
+    escritor = csv.writer(linha, delimiter=';', lineterminator='\n')
+    # BOM: o Excel em pt-BR abre o arquivo com os acentos certos
+    escritor.writerow(CABECALHO)
+    yield linha.texto.encode('utf-8-sig')
+    for corrida in corridas:
+        escritor.writerow(campos(corrida))
+        yield linha.texto.encode()
+
+
+# --- PDF ----------------------------------------------------------------------
+
+def _texto_pdf(texto):
+    if '(' in texto or ')' in texto or '\\' in texto:
+        texto = texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b"(" + texto.encode('cp1252', 'replace') + b")"
+
+
+def _celulas(linha, y, fonte=b"/F1"):
+    """Uma linha da tabela: um bloco de texto, andando de coluna em coluna com ``Td``."""
+    partes = [b"BT %s %d Tf 0 %d Td" % (fonte, _CORPO, y)]
+    for dx, valor in zip(_AVANCOS, linha):
+        partes.append(b" %d 0 Td %s Tj" % (dx, _texto_pdf(valor)))
+    partes.append(b" ET\n")
+    return b"".join(partes)
+
+
+def _pdf(corridas, titulo, total):
+    """Bytes do PDF: uma página a cada ``_LINHAS_POR_PAGINA`` corridas, e o total no fim."""
+    posicao = 0
+    # Objetos 1 (catálogo), 2 (árvore de páginas) e 3-4 (fontes) têm número
+    # fixo; cada página é o par (conteúdo 5 + 2i, página 6 + 2i)
+    posicoes = array('Q', bytes(8 * 5))
+    paginas = 0
+
+    def objeto(numero, corpo):
+        nonlocal posicao
+        if numero == len(posicoes):
+            posicoes.append(posicao)
+        else:
+            posicoes[numero] = posicao
+        dados = b"%d 0 obj\n" % numero + corpo + b"\nendobj\n"
+        posicao += len(dados)
+        return dados
+
+    def pagina(linhas, ultima):
+        nonlocal paginas
+        numero = 5 + 2 * paginas
+        paginas += 1
+        y = _ALTURA - _MARGEM
+        conteudo = [b"BT /F2 14 Tf %d %d Td %s Tj ET\n" % (_MARGEM, y, _texto_pdf(titulo)),
+                    b"BT /F1 8 Tf %d %d Td %s Tj ET\n" % (_LARGURA - _MARGEM - 50, y, _texto_pdf(f"Página {paginas}"))]
+        y -= 30
+        conteudo.append(_celulas(CABECALHO, y, b"/F2"))
+        for linha in linhas:
+            y -= _ENTRELINHA
+            conteudo.append(_celulas(linha, y))
+        if ultima:
+            y -= 2 * _ENTRELINHA
+            conteudo.append(_celulas(("Total", "", "", "", f"{total[0]} corridas", "", _reais(total[1])), y, b"/F2"))
+        fluxo = zlib.compress(b"".join(conteudo))
+        return (
+            objeto(numero, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(fluxo) + fluxo + b"\nendstream")
+            + objeto(numero + 1, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                                 b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (_LARGURA, _ALTURA, numero))
+        )
+
+    cabecalho = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    posicao = len(cabecalho)
+    yield cabecalho
+    yield objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    for numero, nome in ((3, b"Helvetica"), (4, b"Helvetica-Bold")):
+        yield objeto(numero, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % nome)
+
+    linhas = []
+    for corrida in corridas:
+        if len(linhas) == _LINHAS_POR_PAGINA:
+            yield pagina(linhas, False)
+            linhas = []
+        linhas.append(campos(corrida))
+    # A última página precisa de espaço para o total
+    if len(linhas) > _LINHAS_POR_PAGINA - 2:
+        yield pagina(linhas, False)
+        linhas = []
+    yield pagina(linhas, True)
+
+    kids = b" ".join(b"%d 0 R" % (6 + 2 * i) for i in range(paginas))
+    yield objeto(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, paginas))
+    inicio_xref = posicao
+    yield b"xref\n0 %d\n0000000000 65535 f \n" % len(posicoes)
+    for numero in range(1, len(posicoes)):
+        yield b"%010d 00000 n \n" % posicoes[numero]
+    yield b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(posicoes), inicio_xref)
+
+
+def gravar(corridas, formato, arquivo, titulo="Histórico de corridas"):
+    """Grava ``corridas`` em ``arquivo`` (binário) no ``formato`` ("csv" ou "pdf"); devolve o ``Total`` exportado."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato!r}")
+    total = [0, 0]
+    corridas = _contar(corridas, total)
+    partes = _csv(corridas) if formato == "csv" else _pdf(corridas, titulo, total)
+    for pedaco in _em_pedacos(partes):
+        arquivo.write(pedaco)
+    return Total(*total)
@@ -0,0 +1,283 @@
+"""Frota: carro e tarifas de cada motorista, para um bot atender muitos motoristas.
+
+O cadastro fica num SQLite (``dados/frota.sqlite3``), preenchido por
+``python -m frota importar`` a partir de uma planilha ou direto por SQL. O bot
+lê o banco para um dict em memória por user_id: cada orçamento resolve o
+motorista com um acesso ao dict. Motorista sem cadastro (ou campo vazio) usa
+o carro e as tarifas globais.
+
+A recarga é incremental: gatilhos no banco numeram cada mudança (coluna
+``versao``; as remoções vão para ``removidos``) e ``Frota.mudancas`` só lê as
+linhas com versão maior que a última aplicada. ``PRAGMA data_version`` evita
+até essa consulta quando ninguém gravou no banco desde a última olhada.
+
+Uso: python -m frota importar motoristas.csv dados/frota.sqlite3 [--substituir]
+     python -m frota remover dados/frota.sqlite3 user_id [user_id ...]
+"""
+import asyncio
+import csv
+import logging
+import math
+import os
+import sys
+from typing import NamedTuple
+
+from precos import Tarifa
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_RECARGA = 30
+
+# Colunas de tarifa na ordem de Tarifa(base, km, minuto, minima), em reais
+_PADRAO = ('base_padrao', 'km_padrao', 'minuto_padrao', 'minima_padrao')
+_EXEC = ('base_exec', 'km_exec', 'minuto_exec', 'minima_exec')
+COLUNAS = ('carro',) + _PADRAO + _EXEC
+
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS motoristas (
+    user_id INTEGER PRIMARY KEY,
+    carro TEXT,
+    {", ".join(f"{coluna} REAL" for coluna in _PADRAO + _EXEC)},
+    versao INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS motoristas_versao ON motoristas (versao);
+CREATE TABLE IF NOT EXISTS removidos (user_id INTEGER PRIMARY KEY, versao INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS contador (id INTEGER PRIMARY KEY CHECK (id = 0), versao INTEGER NOT NULL);
+INSERT OR IGNORE INTO contador VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS motorista_inserido AFTER INSERT ON motoristas BEGIN
+    UPDATE contador SET versao = versao + 1;
+    UPDATE motoristas SET versao = (SELECT versao FROM contador) WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER IF NOT EXISTS motorista_alterado AFTER UPDATE ON motoristas WHEN NEW.versao = OLD.versao BEGIN
+    UPDATE contador SET versao = versao + 1;
+    UPDATE motoristas SET versao = (SELECT versao FROM contador) WHERE user_id = NEW.user_id;
+END;
+CREATE TRIGGER IF NOT EXISTS motorista_removido AFTER DELETE ON motoristas BEGIN
+    UPDATE contador SET versao = versao + 1;
+    INSERT OR REPLACE INTO removidos VALUES (OLD.user_id, (SELECT versao FROM contador));
+END;
+"""
+
+
+class Motorista(NamedTuple):
+    carro: str
+    padrao: Tarifa
+    executivo: Tarifa
+
+    def tarifa(self, categoria):
+        """Tarifa da categoria (Padrão quando desconhecida), como ``precos.tarifa_da_categoria``."""
+        return self.executivo if categoria == 'Executivo' else self.padrao
+
+
+class Frota:
+    """Índice em memória user_id -> ``Motorista``, recarregado aos poucos do SQLite em ``caminho``.
+
+    ``padrao`` é o ``Motorista`` de quem não está no cadastro e completa os
+    campos vazios. O arquivo pode ainda não existir: a recarga passa a lê-lo
+    quando ele aparecer.
+    """
+
+    def __init__(self, caminho, padrao):
+        self.caminho = caminho
+        self.padrao = padrao
+        self.versao = 0
+        self.recargas = 0
+        self._motoristas = {}
+        # Tarifas iguais (o caso comum numa frota) viram o mesmo objeto
+        self._tarifas = {}
+        self._conn = None
+        self._data_version = None
+
+    def __len__(self):
+        return len(self._motoristas)
+
+    def motorista(self, user_id):
+        return self._motoristas.get(user_id, self.padrao)
+
+    def mudancas(self):
+        """``(versao, {user_id: Motorista ou None para remover})`` desde a última recarga, ou ``None`` se nada mudou.
+
+        Só faz I/O: roda numa thread, e ``aplicar`` troca as entradas no loop.
+        Erros do banco vão para o log (a frota fica como estava).
+        """
+        if self._conn is None and not os.path.exists(self.caminho):
+            return None
+        # Só aqui: sem cadastro, a partida do bot não paga o import
+        import sqlite3
+
+        try:
+            return self._ler_mudancas(sqlite3)
+        except sqlite3.Error as e:
+            logger.error("Falha ao ler a frota (%s): %s", self.caminho, e)
+            self.fechar()
+            return None
+
+    def _ler_mudancas(self, sqlite3):
+        if self._conn is None:
+            # Somente leitura: o bot nunca grava no cadastro
+            self._conn = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False)
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return None
+        versao = self._conn.execute("SELECT versao FROM contador").fetchone()[0]
+        mudancas = {}
+        # Uma linha que existe é mais nova que a remoção do mesmo user_id: remoções primeiro
+        for (user_id,) in self._conn.execute("SELECT user_id FROM removidos WHERE versao > ? AND versao <= ?",
+                                             (self.versao, versao)):
+            mudancas[user_id] = None
+        for user_id, *campos in self._conn.execute(
+                f"SELECT user_id, {', '.join(COLUNAS)} FROM motoristas WHERE versao > ? AND versao <= ?",
+                (self.versao, versao)):
+            mudancas[user_id] = self._montar(*campos)
+        self._data_version = data_version
+        return versao, mudancas
+
+    def aplicar(self, versao, mudancas):
+        for user_id, motorista in mudancas.items():
+            if motorista is None:
+                self._motoristas.pop(user_id, None)
+            else:
+                self._motoristas[user_id] = motorista
+        self.versao = versao
+        self.recargas += 1
+
+    def recarregar(self):
+        """``mudancas`` + ``aplicar`` de uma vez; devolve quantos motoristas mudaram."""
+        resultado = self.mudancas()
+        if resultado is None:
+            return 0
+        self.aplicar(*resultado)
+        return len(resultado[1])
+
+    def fechar(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._data_version = None
+
+    def estatisticas(self):
+        return {"motoristas": len(self._motoristas), "versao": self.versao, "recargas": self.recargas,
+                "tarifas_distintas": len(self._tarifas)}
+
+    async def _job(self, context):
+        resultado = await asyncio.to_thread(self.mudancas)
+        if resultado is not None:
+            self.aplicar(*resultado)
+            if resultado[1]:
+                logger.info("Frota: %d motoristas atualizados (versão %d, %d no cadastro)",
+                            len(resultado[1]), self.versao, len(self))
+
+    def _montar(self, carro, *valores):
+        padrao = self._tarifa(valores[:4], self.padrao.padrao)
+        executivo = self._tarifa(valores[4:], self.padrao.executivo)
+        return Motorista(carro or self.padrao.carro, padrao, executivo)
+
+    def _tarifa(self, valores, base):
+        tarifa = Tarifa(*(base[i] if valor is None else valor for i, valor in enumerate(valores)))
+        return self._tarifas.setdefault(tarifa, tarifa)
+
+
+def agendar_recarga(application, frota, intervalo=INTERVALO_RECARGA):
+    """Agenda no ``job_queue`` a recarga incremental da ``frota``."""
+    if application.job_queue is None:
+        logger.warning("Sem job_queue (instale python-telegram-bot[job-queue]): a frota só é lida na partida.")
+        return
+    application.job_queue.run_repeating(frota._job, intervalo, first=intervalo, name="recarregar_frota")
+
+
+# --- cadastro -------------------------------------------------------------------
+
+def abrir(caminho):
+    """Conexão de escrita com o cadastro, criando o esquema se preciso."""
+    import sqlite3
+
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conn = sqlite3.connect(caminho)
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+def ler_csv(caminho):
+    """Linhas ``(user_id, carro, base_padrao, ..., minima_exec)`` de um CSV com cabeçalho (``;``, vírgula decimal).
+
+    Só ``user_id`` é obrigatório; colunas ausentes ou células vazias ficam
+    ``None`` (valor global). Tarifas precisam ser números finitos e não
+    negativos. Retorna ``(linhas, erros)``, onde ``erros`` lista os números
+    das linhas ignoradas (cada uma vai para o log).
+    """
+    linhas, erros = [], []
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        for numero, linha in enumerate(csv.DictReader(arquivo, delimiter=';'), start=2):
+            try:
+                valores = [int(linha["user_id"])]
+                valores.append((linha.get("carro") or "").strip() or None)
+                for coluna in _PADRAO + _EXEC:
+                    texto = (linha.get(coluna) or "").strip()
+                    valor = float(texto.replace(',', '.')) if texto else None
+                    if valor is not None and not (math.isfinite(valor) and valor >= 0):
+                        raise ValueError(coluna)
+                    valores.append(valor)
+            except (KeyError, TypeError, ValueError):
+                logger.warning("%s, linha %d: valor inválido, linha ignorada", caminho, numero)
+                erros.append(numero)
+                continue
+            linhas.append(tuple(valores))
+    return linhas, erros
+
+
+def importar(linhas, caminho, substituir=False):
+    """Grava ``linhas`` (de ``ler_csv``) no cadastro; só as linhas que mudaram ganham versão nova.
+
+    Com ``substituir``, remove quem não está em ``linhas``. Devolve a versão final.
+    """
+    conn = abrir(caminho)
+    with conn:
+        colunas = ", ".join(COLUNAS)
+        conn.executemany(
+            f"INSERT INTO motoristas (user_id, {colunas}) VALUES (?, {', '.join('?' * len(COLUNAS))}) "
+            f"ON CONFLICT (user_id) DO UPDATE SET ({colunas}) = ({', '.join(f'excluded.{c}' for c in COLUNAS)}) "
+            f"WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in COLUNAS)}",
+            linhas,
+        )
+        if substituir:
+            conn.execute("CREATE TEMP TABLE importados (user_id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO importados VALUES (?)", ((linha[0],) for linha in linhas))
+            conn.execute("DELETE FROM motoristas WHERE user_id NOT IN (SELECT user_id FROM importados)")
+    versao = conn.execute("SELECT versao FROM contador").fetchone()[0]
+    conn.close()
+    return versao
+
+
+def remover(caminho, user_ids):
+    conn = abrir(caminho)
+    with conn:
+        conn.executemany("DELETE FROM motoristas WHERE user_id = ?", ((user_id,) for user_id in user_ids))
+    conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cadastro de carros e tarifas dos motoristas da frota.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("importar", help="grava (ou atualiza) os motoristas de um CSV")
+    p.add_argument("csv")
+    p.add_argument("banco")
+    p.add_argument("--substituir", action="store_true", help="remove do cadastro quem não está no CSV")
+    p = sub.add_parser("remover")
+    p.add_argument("banco")
+    p.add_argument("user_ids", type=int, nargs="+")
+    args = parser.parse_args()
+    if args.comando == "importar":
+        linhas, erros = ler_csv(args.csv)
+        if erros and args.substituir:
+            # Quem está numa linha ignorada seria removido do cadastro
+            sys.exit(f"{len(erros)} linhas inválidas em {args.csv} (linhas {', '.join(map(str, erros))}); "
+                     "corrija antes de usar --substituir")
+        versao = importar(linhas, args.banco, args.substituir)
+        print(f"{len(linhas)} motoristas -> {args.banco} (versão {versao}), {len(erros)} linhas ignoradas",
+              file=sys.stderr)
+    else:
+        remover(args.banco, args.user_ids)
@@ -0,0 +1,216 @@
+"""Histórico de orçamentos: "quanto cobrei dessa cliente da última vez?".
+
+Cada orçamento enviado vira uma linha num SQLite (``dados/historico.sqlite3``)
+com o preço, a distância, o tempo, a categoria, a condição e dois rótulos
+opcionais: a rota (os nomes do guia de lugares, quando a origem e o destino
+foram escolhidos pelo nome) e o cliente (o motorista responde ao painel do
+orçamento com o nome). Uma tabela FTS5 indexa os dois rótulos e o chat, então
+a busca por ``"maria"`` só percorre os orçamentos desse chat com essa palavra,
+e não os de todos os motoristas.
+
+As páginas saem da mais recente para a mais antiga, por chave: a próxima
+página é ``id < último id da anterior``, que o índice acha direto. Com
+``OFFSET`` o banco releria e descartaria todas as linhas das páginas de antes,
+e a página 1.000 custaria mil vezes a primeira.
+
+O banco fica numa thread própria (como ``persistencia.py``): ``registrar`` só
+agenda a gravação, e o handler não espera o disco.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+POR_PAGINA = 5
+# Tamanho máximo do nome do cliente
+MAX_CLIENTE = 60
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS orcamentos (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    centavos INTEGER NOT NULL,
+    metros INTEGER NOT NULL,
+    segundos INTEGER NOT NULL,
+    categoria TEXT NOT NULL,
+    condicao TEXT NOT NULL,
+    mensagem INTEGER,
+    cliente TEXT,
+    rota TEXT
+);
+-- (chat_id, id): o rowid vem junto em todo índice
+CREATE INDEX IF NOT EXISTS orcamentos_chat ON orcamentos (chat_id);
+CREATE INDEX IF NOT EXISTS orcamentos_mensagem ON orcamentos (chat_id, mensagem);
+CREATE VIRTUAL TABLE IF NOT EXISTS orcamentos_busca USING fts5(
+    chat_id, cliente, rota,
+    content='orcamentos', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS orcamento_inserido AFTER INSERT ON orcamentos BEGIN
+    INSERT INTO orcamentos_busca (rowid, chat_id, cliente, rota) VALUES (NEW.id, NEW.chat_id, NEW.cliente, NEW.rota);
+END;
+CREATE TRIGGER IF NOT EXISTS orcamento_removido AFTER DELETE ON orcamentos BEGIN
+    INSERT INTO orcamentos_busca (orcamentos_busca, rowid, chat_id, cliente, rota)
+    VALUES ('delete', OLD.id, OLD.chat_id, OLD.cliente, OLD.rota);
+END;
+CREATE TRIGGER IF NOT EXISTS orcamento_rotulado AFTER UPDATE OF cliente, rota ON orcamentos BEGIN
+    INSERT INTO orcamentos_busca (orcamentos_busca, rowid, chat_id, cliente, rota)
+    VALUES ('delete', OLD.id, OLD.chat_id, OLD.cliente, OLD.rota);
+    INSERT INTO orcamentos_busca (rowid, chat_id, cliente, rota) VALUES (NEW.id, NEW.chat_id, NEW.cliente, NEW.rota);
+END;
+"""
+
+_COLUNAS = "o.id, o.ts, o.centavos, o.metros, o.segundos, o.categoria, o.condicao, o.cliente, o.rota"
+
+
+class Orcamento(NamedTuple):
+    id: int
+    ts: int
+    centavos: int
+    metros: int
+    segundos: int
+    categoria: str
+    condicao: str
+    cliente: Optional[str]
+    rota: Optional[str]
+
+
+class Pagina(NamedTuple):
+    orcamentos: list
+    mais_antigos: bool
+    mais_recentes: bool
+
+
+def palavras(termo):
+    """Palavras de busca de ``termo``, em minúsculas (acentos e pontuação ficam com o FTS5)."""
+    return re.findall(r"\w+", termo.lower())
+
+
+def consulta_fts(chat_id, termo):
+    """Expressão ``MATCH`` do FTS5: os orçamentos do chat com todas as palavras de ``termo`` (como prefixo)."""
+    prefixos = " AND ".join(f'"{palavra}"*' for palavra in palavras(termo))
+    return f'chat_id : "{int(chat_id)}" AND {{cliente rota}} : ({prefixos})'
+
+
+class HistoricoOrcamentos:
+    """Orçamentos enviados, gravados e buscados numa thread própria sobre o SQLite em ``caminho``."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="historico")
+        self._conn = None
+        self.registrados = 0
+        self.buscas = 0
+
+    # --- thread do banco -------------------------------------------------
+
+    def _conectar(self):
+        if self._conn is None:
+            # Só aqui: a partida do bot não paga o import
+            import sqlite3
+
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            self._conn = sqlite3.connect(self.caminho)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_ESQUEMA)
+        return self._conn
+
+    def _gravar(self, linha):
+        conn = self._conectar()
+        with conn:
+            conn.execute(
+                "INSERT INTO orcamentos (chat_id, ts, centavos, metros, segundos, categoria, condicao, mensagem, rota) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", linha)
+
+    def _rotular(self, chat_id, mensagem, cliente):
+        conn = self._conectar()
+        with conn:
+            return conn.execute("UPDATE orcamentos SET cliente = ? WHERE chat_id = ? AND mensagem = ?",
+                                (cliente, chat_id, mensagem)).rowcount > 0
+
+    def _buscar(self, chat_id, termo, antes, depois, limite):
+        conn = self._conectar()
+        recentes_primeiro = depois is None
+        if palavras(termo):
+            # Filtro e ordem pelo índice FTS5; o chat_id de novo na tabela porque o
+            # tokenizador descarta o "-": no índice, o chat -123 e o 123 são o mesmo
+            sql = (f"SELECT {_COLUNAS} FROM orcamentos_busca b JOIN orcamentos o ON o.id = b.rowid "
+                   f"WHERE orcamentos_busca MATCH ? AND o.chat_id = ?")
+            parametros = [consulta_fts(chat_id, termo), chat_id]
+            chave = "b.rowid"
+        else:
+            sql = f"SELECT {_COLUNAS} FROM orcamentos o WHERE o.chat_id = ?"
+            parametros = [chat_id]
+            chave = "o.id"
+        if antes is not None:
+            sql += f" AND {chave} < ?"
+            parametros.append(antes)
+        elif depois is not None:
+            sql += f" AND {chave} > ?"
+            parametros.append(depois)
+        sql += f" ORDER BY {chave} {'DESC' if recentes_primeiro else 'ASC'} LIMIT ?"
+        # Uma linha a mais diz se há outra página
+        parametros.append(limite + 1)
+        linhas = [Orcamento(*linha) for linha in conn.execute(sql, parametros)]
+        sobra = len(linhas) > limite
+        linhas = linhas[:limite]
+        if recentes_primeiro:
+            return Pagina(linhas, sobra, antes is not None)
+        return Pagina(linhas[::-1], True, sobra)
+
+    def _fechar(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _no_banco(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+
+    # --- loop -------------------------------------------------------------
+
+    def registrar(self, chat_id, mensagem, centavos, metros, segundos, categoria, condicao, rota=None, ts=None):
+        """Agenda a gravação de um orçamento (``mensagem`` = id do painel do motorista); devolve o future.
+
+        As gravações seguem a ordem das chamadas: um ``rotular`` logo depois já
+        acha o orçamento.
+        """
+        linha = (chat_id, int(time.time() if ts is None else ts), centavos, metros, segundos, categoria, condicao,
+                 mensagem, rota)
+        self.registrados += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._gravar, linha)
+        future.add_done_callback(_registrar_erro)
+        return future
+
+    async def rotular(self, chat_id, mensagem, cliente):
+        """Dá o nome do ``cliente`` ao orçamento do painel ``mensagem``; ``False`` se não houver um."""
+        return await self._no_banco(self._rotular, chat_id, mensagem, cliente[:MAX_CLIENTE])
+
+    async def buscar(self, chat_id, termo="", antes=None, depois=None, limite=POR_PAGINA):
+        """``Pagina`` de orçamentos do chat com ``termo`` no cliente ou na rota (sem termo, todos).
+
+        Sem ``antes``/``depois``, os mais recentes; ``antes=id`` é a página
+        seguinte (mais antigos que ``id``) e ``depois=id`` a anterior.
+        """
+        self.buscas += 1
+        return await self._no_banco(self._buscar, chat_id, termo, antes, depois, limite)
+
+    async def fechar(self):
+        """Espera as gravações pendentes e fecha o banco (reaberto se voltar a ser usado)."""
+        await self._no_banco(self._fechar)
+
+    def estatisticas(self):
+        return {"registrados": self.registrados, "buscas": self.buscas}
+
+
+def _registrar_erro(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Falha ao gravar o histórico de orçamentos: %s", future.exception())
@@ -0,0 +1,196 @@
+"""Fila de envio com limite de taxa para a Bot API.
+
+``LimitadorEnvios`` é o rate limiter da Application: segura os envios de
+mensagem num token bucket global (30/s) e num por chat (1/s em conversas
+privadas, 20/min em grupos), junta chamadas idênticas que ainda estão em
+andamento (ex: botão tocado duas vezes) numa só e, se o Telegram responder
+429, espera o ``retry_after`` e tenta de novo. Um arquivo enviado direto do
+disco (``InputFile`` com ``read_file_handle=False``) já foi lido até o fim na
+primeira tentativa: é rebobinado antes da seguinte, e o que não dá para
+rebobinar não é reenviado.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram import InputFile
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Métodos que contam nos limites de mensagens do Telegram
+_PREFIXOS_LIMITADOS = ("send", "edit", "copy", "forward")
+# Métodos seguros para juntar quando chegam repetidos ao mesmo tempo
+_COALESCIVEIS = {"sendMessage", "editMessageText", "editMessageReplyMarkup", "answerCallbackQuery", "deleteMessage"}
+
+
+class BaldeTokens:
+    """Token bucket com reserva: quem chega primeiro espera menos."""
+
+    __slots__ = ('taxa', 'capacidade', 'tokens', 'atualizado')
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic()
+
+    def reservar(self, agora):
+        """Consome um token e devolve quantos segundos esperar até ele existir."""
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.taxa
+
+    def pausar(self, segundos):
+        """Empurra os próximos envios por ``segundos`` (após um 429)."""
+        self.tokens = min(self.tokens, 0) - segundos * self.taxa
+
+    def cheio(self, agora):
+        return self.tokens + (agora - self.atualizado) * self.taxa >= self.capacidade
+
+
+class LimitadorEnvios(BaseRateLimiter):
+    """Rate limiter com token buckets, coalescência de chamadas e retry em 429.
+
+    ``rate_limit_args`` pode ser ``{"max_tentativas": n}`` numa chamada
+    específica da Bot API.
+    """
+
+    def __init__(self, global_por_segundo=30, chat_por_segundo=1.0, grupo_por_minuto=20,
+                 rajada_chat=3, max_tentativas=3, max_chats=10000):
+        self.global_por_segundo = global_por_segundo
+        self.chat_por_segundo = chat_por_segundo
+        self.grupo_por_minuto = grupo_por_minuto
+        self.rajada_chat = rajada_chat
+        self.max_tentativas = max_tentativas
+        self.max_chats = max_chats
+        # Sem rajada no global: 30 de uma vez + 30/s estouraria a janela de 1 s do Telegram
+        self._global = BaldeTokens(global_por_segundo, 1)
+        self._chats = {}
+        self._em_andamento = {}
+        self.enviados = 0
+        self.coalescidos = 0
+        self.repeticoes_429 = 0
+        self.espera_total = 0.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._chats.clear()
+        self._em_andamento.clear()
+
+    def estatisticas(self):
+        return {
+            "enviados": self.enviados,
+            "coalescidos": self.coalescidos,
+            "repeticoes_429": self.repeticoes_429,
+            "espera_total_s": round(self.espera_total, 3),
+            "chats_ativos": len(self._chats),
+        }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chave = _chave(endpoint, data) if endpoint in _COALESCIVEIS else None
+        if chave is not None:
+            pendente = self._em_andamento.get(chave)
+            if pendente is not None:
+                self.coalescidos += 1
+                return await asyncio.shield(pendente)
+            pendente = asyncio.ensure_future(self._enviar(callback, args, kwargs, endpoint, data, rate_limit_args))
+            self._em_andamento[chave] = pendente
+            pendente.add_done_callback(lambda _: self._em_andamento.pop(chave, None))
+            return await asyncio.shield(pendente)
+        return await self._enviar(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+    async def _enviar(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_tentativas = (rate_limit_args or {}).get("max_tentativas", self.max_tentativas)
+        chat_id = data.get("chat_id")
+        limitado = endpoint.startswith(_PREFIXOS_LIMITADOS)
+        # (arquivo, posição inicial) dos arquivos abertos no envio; posição None = não rebobinável
+        arquivos = [(arquivo, _posicao(arquivo)) for arquivo in _arquivos_abertos(data)]
+
+        for tentativa in range(max_tentativas + 1):
+            if limitado:
+                await self._aguardar_vez(chat_id)
+            try:
+                resultado = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if tentativa >= max_tentativas:
+                    raise
+                if any(posicao is None for _, posicao in arquivos):
+                    logger.warning("429 em %s (chat %s) com arquivo que não volta ao início: sem nova tentativa",
+                                   endpoint, chat_id)
+                    raise
+                espera = e.retry_after
+                if isinstance(espera, timedelta):
+                    espera = espera.total_seconds()
+                # Backoff: o retry_after do Telegram mais uma folga que cresce a cada tentativa
+                espera += 0.1 * 2 ** tentativa
+                self.repeticoes_429 += 1
+                logger.warning("429 em %s (chat %s): nova tentativa em %.1fs", endpoint, chat_id, espera)
+                if chat_id is not None:
+                    self._balde_chat(chat_id).pausar(espera)
+                else:
+                    self._global.pausar(espera)
+                await asyncio.sleep(espera)
+                # A tentativa anterior leu os arquivos até o fim
+                for arquivo, posicao in arquivos:
+                    arquivo.seek(posicao)
+                continue
+            self.enviados += 1
+            return resultado
+
+    async def _aguardar_vez(self, chat_id):
+        if chat_id is not None:
+            espera = self._balde_chat(chat_id).reservar(time.monotonic())
+            if espera:
+                self.espera_total += espera
+                await asyncio.sleep(espera)
+        espera = self._global.reservar(time.monotonic())
+        if espera:
+            self.espera_total += espera
+            await asyncio.sleep(espera)
+
+    def _balde_chat(self, chat_id):
+        balde = self._chats.get(chat_id)
+        if balde is None:
+            if len(self._chats) >= self.max_chats:
+                self._limpar_chats()
+            if isinstance(chat_id, int) and chat_id < 0:
+                balde = BaldeTokens(self.grupo_por_minuto / 60, self.grupo_por_minuto)
+            else:
+                balde = BaldeTokens(self.chat_por_segundo, self.rajada_chat)
+            self._chats[chat_id] = balde
+        return balde
+
+    def _limpar_chats(self):
+        # Balde cheio = chat parado: pode ser recriado do zero sem mudar nada
+        agora = time.monotonic()
+        for chat_id in [c for c, balde in self._chats.items() if balde.cheio(agora)]:
+            del self._chats[chat_id]
+
+
+def _chave(endpoint, data):
+    try:
+        return endpoint, tuple(sorted((nome, repr(valor)) for nome, valor in data.items()))
+    except TypeError:
+        return None
+
+
+def _arquivos_abertos(data):
+    """Arquivos abertos (não ``bytes``) dos ``InputFile`` de ``data``, inclusive dentro de ``InputMedia``."""
+    for valor in data.values():
+        for item in valor if isinstance(valor, (list, tuple)) else (valor,):
+            item = getattr(item, "media", item)
+            if isinstance(item, InputFile) and not isinstance(item.input_file_content, bytes):
+                yield item.input_file_content
+
+
+def _posicao(arquivo):
+    try:
+        return arquivo.tell() if arquivo.seekable() else None
+    except (AttributeError, OSError, ValueError):
+        return None
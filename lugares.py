@@ -0,0 +1,208 @@
+"""Guia local de lugares: nome de bairro ou ponto de referência -> coordenadas.
+
+``preparar`` lê um CSV (``nome;lat;lon[;peso]``) ou um extrato ``.osm`` e grava
+um índice binário com uma chave por início de palavra de cada nome,
+normalizada sem acentos e em minúsculas ("Parque São Lourenço" vira
+``parque sao lourenco``, ``sao lourenco`` e ``lourenco``), em ordem. ``GuiaLugares``
+abre o índice com ``mmap`` (a partida não lê o arquivo todo) e busca o
+prefixo digitado com ``bisect`` direto sobre as chaves mapeadas.
+
+Os lugares são numerados do mais importante (maior peso) para o menos, então
+as sugestões saem ordenadas pelo número.
+
+Uso: python -m lugares preparar lugares.csv dados/lugares.idx
+"""
+import bisect
+import csv
+import mmap
+import struct
+import sys
+import unicodedata
+from array import array
+
+MAGICO = b'LUGAR1'
+_CABECALHO = struct.Struct('<6s2xIIII')
+MIN_PREFIXO = 2
+# Acima disso os números dos lugares do intervalo são filtrados com NumPy
+MAX_INTERVALO_PYTHON = 512
+
+# Peso dos lugares do OSM por tag (os demais nomeados valem 1)
+PESOS_OSM = {
+    ("place", "city"): 100, ("place", "town"): 80, ("place", "suburb"): 60, ("place", "quarter"): 50,
+    ("place", "neighbourhood"): 40, ("aeroway", "aerodrome"): 70, ("amenity", "bus_station"): 50,
+    ("railway", "station"): 45, ("amenity", "hospital"): 35, ("shop", "mall"): 35,
+    ("amenity", "university"): 30, ("tourism", "attraction"): 25, ("leisure", "park"): 20,
+}
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só letras, números e espaços simples: "São  Paulo!" -> "sao paulo"."""
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return " ".join("".join(c if c.isalnum() else " " for c in sem_acento.casefold()).split())
+
+
+class _Chaves:
+    """Sequência das chaves mapeadas (bytes), para o ``bisect``."""
+
+    __slots__ = ('_inicios', '_dados', '_base')
+
+    def __init__(self, inicios, dados, base):
+        self._inicios = inicios
+        self._dados = dados
+        self._base = base
+
+    def __len__(self):
+        return len(self._inicios) - 1
+
+    def __getitem__(self, i):
+        # Fatia do mmap: copia só os bytes desta chave
+        return self._dados[self._base + self._inicios[i]:self._base + self._inicios[i + 1]]
+
+
+class GuiaLugares:
+    def __init__(self, dados):
+        self._dados = dados
+        magico, n_lugares, n_chaves, tam_nomes, tam_chaves = _CABECALHO.unpack_from(dados)
+        if magico != MAGICO:
+            raise ValueError("Arquivo não é um índice de lugares.")
+        visao = memoryview(dados)
+        posicao = _CABECALHO.size
+
+        def fatia(tipo, quantidade, tamanho_item):
+            # Arrays viram memoryview tipada (sem cópia); textos, a posição no arquivo
+            nonlocal posicao
+            inicio, fim = posicao, posicao + quantidade * tamanho_item
+            posicao = _alinhar(fim)
+            return inicio if tipo is None else visao[inicio:fim].cast(tipo)
+
+        self.n_lugares = n_lugares
+        self._coordenadas = fatia('d', 2 * n_lugares, 8)
+        self._inicio_nomes = fatia('I', n_lugares + 1, 4)
+        self._base_nomes = fatia(None, tam_nomes, 1)
+        self._lugar_da_chave = fatia('I', n_chaves, 4)
+        self._chaves = _Chaves(fatia('I', n_chaves + 1, 4), dados, fatia(None, tam_chaves, 1))
+
+    @classmethod
+    def abrir(cls, caminho):
+        with open(caminho, "rb") as arquivo:
+            return cls(mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def nome(self, lugar):
+        return self._dados[self._base_nomes + self._inicio_nomes[lugar]:self._base_nomes + self._inicio_nomes[lugar + 1]].decode()
+
+    def coordenadas(self, lugar):
+        return self._coordenadas[2 * lugar], self._coordenadas[2 * lugar + 1]
+
+    def buscar(self, texto, limite=5):
+        """Até ``limite`` lugares (números) cujo nome tem uma palavra começando por ``texto``, dos mais importantes."""
+        prefixo = normalizar(texto).encode()
+        if len(prefixo) < MIN_PREFIXO:
+            return []
+        chaves = self._chaves
+        # Chaves são ASCII: todas as que começam pelo prefixo ficam antes de prefixo + 0xff
+        inicio = bisect.bisect_left(chaves, prefixo)
+        fim = bisect.bisect_left(chaves, prefixo + b'\xff', inicio)
+        if fim - inicio <= MAX_INTERVALO_PYTHON:
+            return sorted(set(self._lugar_da_chave[inicio:fim]))[:limite]
+
+        # Prefixos comuns ("jardim") casam com milhares de chaves: os menores
+        # números saem de um partition, sem ordenar o intervalo todo
+        import numpy as np
+        numeros = np.asarray(self._lugar_da_chave[inicio:fim])
+        candidatos = min(len(numeros), 8 * limite)
+        menores = np.unique(np.partition(numeros, candidatos - 1)[:candidatos])
+        if len(menores) < limite:
+            menores = np.unique(numeros)
+        return menores[:limite].tolist()
+
+
+def _alinhar(posicao):
+    return (posicao + 7) & ~7
+
+
+# --- pré-processamento --------------------------------------------------------
+
+def ler_csv(caminho):
+    """``(nome, lat, lon, peso)`` de um CSV ``nome;lat;lon[;peso]`` (``;`` ou ``,``), com ou sem cabeçalho."""
+    lugares = []
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        dialeto = csv.Sniffer().sniff(arquivo.read(4096), delimiters=";,\t")
+        arquivo.seek(0)
+        for linha in csv.reader(arquivo, dialeto):
+            try:
+                nome, lat, lon = linha[0].strip(), float(linha[1]), float(linha[2])
+                peso = float(linha[3]) if len(linha) > 3 and linha[3].strip() else 0.0
+            except (ValueError, IndexError):
+                continue
+            if nome:
+                lugares.append((nome, lat, lon, peso))
+    return lugares
+
+
+def ler_osm(caminho):
+    """``(nome, lat, lon, peso)`` dos nós com nome de um ``.osm`` XML (bairros, estações, shoppings...)."""
+    import xml.etree.ElementTree as ET
+
+    lugares = []
+    for _, elemento in ET.iterparse(caminho, events=("end",)):
+        if elemento.tag == "node":
+            tags = {tag.get("k"): tag.get("v") for tag in elemento.iter("tag")}
+            nome = tags.get("name")
+            if nome:
+                peso = max((p for (k, v), p in PESOS_OSM.items() if tags.get(k) == v), default=1)
+                if peso > 1 or any(k in tags for k in ("place", "amenity", "shop", "tourism", "leisure")):
+                    lugares.append((nome, float(elemento.get("lat")), float(elemento.get("lon")), peso))
+        if elemento.tag in ("node", "way", "relation"):
+            elemento.clear()
+    return lugares
+
+
+def gravar_indice(lugares, caminho):
+    """Grava o índice de ``lugares`` (``(nome, lat, lon, peso)``); nomes repetidos ficam com o de maior peso."""
+    unicos = {}
+    for nome, lat, lon, peso in lugares:
+        chave = normalizar(nome)
+        if chave and (chave not in unicos or peso > unicos[chave][3]):
+            unicos[chave] = (nome, lat, lon, peso)
+    ordenados = sorted(unicos.values(), key=lambda lugar: (-lugar[3], normalizar(lugar[0])))
+
+    coordenadas, inicio_nomes, nomes = array('d'), array('I', [0]), bytearray()
+    chaves = []
+    for numero, (nome, lat, lon, _) in enumerate(ordenados):
+        coordenadas.extend((lat, lon))
+        nomes += nome.encode()
+        inicio_nomes.append(len(nomes))
+        palavras = normalizar(nome).split()
+        chaves.extend((" ".join(palavras[i:]).encode(), numero) for i in range(len(palavras)))
+    chaves.sort()
+
+    inicio_chaves, texto_chaves = array('I', [0]), bytearray()
+    for chave, _ in chaves:
+        texto_chaves += chave
+        inicio_chaves.append(len(texto_chaves))
+    lugar_da_chave = array('I', (numero for _, numero in chaves))
+
+    with open(caminho, "wb") as arquivo:
+        arquivo.write(_CABECALHO.pack(MAGICO, len(ordenados), len(chaves), len(nomes), len(texto_chaves)))
+        for parte in (coordenadas, inicio_nomes, nomes, lugar_da_chave, inicio_chaves, texto_chaves):
+            arquivo.write(parte if isinstance(parte, bytearray) else parte.tobytes())
+            arquivo.write(b'\0' * (_alinhar(arquivo.tell()) - arquivo.tell()))
+    return len(ordenados), len(chaves)
+
+
+def preparar(entrada, caminho_indice):
+    lugares = ler_osm(entrada) if entrada.endswith(".osm") else ler_csv(entrada)
+    return gravar_indice(lugares, caminho_indice)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Monta o índice do guia de lugares a partir de um CSV ou .osm.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("preparar")
+    p.add_argument("entrada")
+    p.add_argument("indice")
+    args = parser.parse_args()
+    n_lugares, n_chaves = preparar(args.entrada, args.indice)
+    print(f"{n_lugares} lugares, {n_chaves} chaves -> {args.indice}", file=sys.stderr)
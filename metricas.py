@@ -0,0 +1,289 @@
+"""Métricas do bot no formato texto do Prometheus.
+
+Histogramas de latência por handler e etapa da conversa, transições entre
+estados (o funil de cada fluxo), entradas rejeitadas e tempo de cada chamada
+à Bot API. Registrar uma amostra custa um ``bisect`` e algumas somas num
+dict, então tudo fica ligado em produção; ``ServidorMetricas`` serve o texto
+em ``GET /metrics`` só na interface local.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import time
+
+from telegram.request import HTTPXRequest
+
+import registro
+
+logger = logging.getLogger(__name__)
+
+# Limites (s) dos baldes dos histogramas, de 1 ms a 10 s
+BALDES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_AJUDA = {
+    "bot_handler_segundos": ("histogram", "Duração de cada handler, por fluxo e etapa da conversa."),
+    "bot_transicoes_total": ("counter", "Saídas de cada etapa por estado de destino (funil)."),
+    "bot_entradas_rejeitadas_total": ("counter", "Entradas recusadas pelos handlers, por motivo."),
+    "bot_api_segundos": ("histogram", "Duração das chamadas à Bot API, por método."),
+    "bot_api_respostas_total": ("counter", "Respostas da Bot API por método e código HTTP."),
+}
+
+
+class Histograma:
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self):
+        self.contagens = [0] * (len(BALDES) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(BALDES, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Metricas:
+    """Registro de contadores, histogramas e coletores (gauges lidos na hora da exportação)."""
+
+    def __init__(self):
+        # (nome, ((rótulo, valor), ...)) -> número / Histograma
+        self._contadores = {}
+        self._histogramas = {}
+        self._coletores = []
+
+    def contar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(rotulos.items()))
+        self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, segundos, **rotulos):
+        chave = (nome, tuple(rotulos.items()))
+        histograma = self._histogramas.get(chave)
+        if histograma is None:
+            histograma = self._histogramas[chave] = Histograma()
+        histograma.observar(segundos)
+
+    def coletar(self, prefixo, funcao):
+        """Exporta cada valor numérico de ``funcao()`` (um dict) como gauge ``<prefixo>_<chave>``."""
+        self._coletores.append((prefixo, funcao))
+
+    def texto(self):
+        """Todas as métricas no formato de exposição do Prometheus (texto 0.0.4)."""
+        linhas = []
+        vistos = set()
+
+        def cabecalho(nome):
+            if nome not in vistos:
+                vistos.add(nome)
+                tipo, ajuda = _AJUDA.get(nome, ("untyped", nome))
+                linhas.append(f"# HELP {nome} {ajuda}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+
+        for (nome, rotulos), valor in sorted(self._contadores.items(), key=_pelo_nome):
+            cabecalho(nome)
+            linhas.append(f"{nome}{_rotulos(rotulos)} {valor}")
+
+        for (nome, rotulos), histograma in sorted(self._histogramas.items(), key=_pelo_nome):
+            cabecalho(nome)
+            acumulado = 0
+            for limite, contagem in zip(BALDES, histograma.contagens):
+                acumulado += contagem
+                linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', repr(limite)),))} {acumulado}")
+            linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', '+Inf'),))} {histograma.total}")
+            linhas.append(f"{nome}_sum{_rotulos(rotulos)} {histograma.soma!r}")
+            linhas.append(f"{nome}_count{_rotulos(rotulos)} {histograma.total}")
+
+        for prefixo, funcao in self._coletores:
+            for chave, valor in funcao().items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    nome = f"{prefixo}_{chave}"
+                    linhas.append(f"# TYPE {nome} gauge")
+                    linhas.append(f"{nome} {valor}")
+
+        return "\n".join(linhas) + "\n"
+
+
+def _pelo_nome(item):
+    # O Prometheus exige as séries de uma métrica juntas; a ordem entre elas é livre
+    return item[0][0]
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+METRICAS = Metricas()
+
+# Marca que um handler chamado dentro de outro (ex: cancel) desviou o fluxo
+_desvio = contextvars.ContextVar("desvio", default=None)
+
+
+def medir_handler(fluxo, etapa, nomes_estados, desvio=None):
+    """Decorador de handler: latência, transição (``etapa`` -> estado devolvido) e desvios.
+
+    ``nomes_estados`` traduz o estado devolvido em rótulo. Um handler marcado
+    com ``desvio`` (ex: ``cancel``) faz o handler que o chamou registrar esse
+    destino no lugar do estado devolvido.
+    """
+    def decorar(funcao):
+        nome = funcao.__name__
+
+        @functools.wraps(funcao)
+        async def medido(update, context):
+            token = _desvio.set(None)
+            # Os registros de dentro do handler levam o chat e a etapa (registro.py)
+            contexto = registro.entrar(update, nome, fluxo, etapa)
+            inicio = time.perf_counter()
+            try:
+                try:
+                    resultado = await funcao(update, context)
+                finally:
+                    segundos = time.perf_counter() - inicio
+                    METRICAS.observar("bot_handler_segundos", segundos, handler=nome, fluxo=fluxo, etapa=etapa)
+                    desviado = _desvio.get()
+                    _desvio.reset(token)
+                destino = desviado or nomes_estados.get(resultado, str(resultado))
+                METRICAS.contar("bot_transicoes_total", fluxo=fluxo, etapa=etapa, destino=destino)
+                logger.info("%s (%s/%s) -> %s em %.1f ms", nome, fluxo, etapa, destino, segundos * 1e3,
+                            extra={"destino": destino, "latencia_ms": round(segundos * 1e3, 3)})
+            finally:
+                registro.sair(contexto)
+            if desvio:
+                _desvio.set(desvio)
+            return resultado
+
+        return medido
+
+    return decorar
+
+
+def rejeitar(handler, motivo):
+    """Conta uma entrada recusada (``formato``, ``negativo``, ``opcao``...)."""
+    METRICAS.contar("bot_entradas_rejeitadas_total", handler=handler, motivo=motivo)
+
+
+class Cronometro:
+    """Tempo de cada etapa de uma sequência (ex: a partida do bot), medido entre marcas."""
+
+    def __init__(self, inicio=None):
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self._ultima = self.inicio
+        self.etapas = {}
+
+    def marcar(self, etapa):
+        agora = time.perf_counter()
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + agora - self._ultima
+        self._ultima = agora
+
+    @property
+    def total(self):
+        return self._ultima - self.inicio
+
+    def resumo(self):
+        return ", ".join(f"{etapa} {segundos * 1e3:.0f} ms" for etapa, segundos in self.etapas.items()) + \
+            f" (total {self.total * 1e3:.0f} ms)"
+
+    def segundos(self):
+        return {**self.etapas, "total": self.total}
+
+
+class RequisicaoMedida(HTTPXRequest):
+    """``HTTPXRequest`` que mede a duração e o código de resposta de cada chamada à Bot API.
+
+    Também conta as conexões abertas (pelo ``trace`` do httpcore): com
+    ``requisicoes`` dá o reaproveitamento do pool, e ``pico`` é o máximo de
+    chamadas em andamento ao mesmo tempo.
+    """
+
+    def __init__(self, *args, httpx_kwargs=None, **kwargs):
+        self.requisicoes = 0
+        self.conexoes = 0
+        self.http2 = 0
+        self.em_andamento = 0
+        self.pico = 0
+        # Gancho no cliente, não no do_request: o PTB recria o cliente a cada initialize
+        httpx_kwargs = {**(httpx_kwargs or {}), "event_hooks": {"request": [self._rastrear]}}
+        super().__init__(*args, httpx_kwargs=httpx_kwargs, **kwargs)
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        metodo = url.rsplit('/', 1)[-1]
+        inicio = time.perf_counter()
+        codigo = "erro"
+        self.requisicoes += 1
+        self.em_andamento += 1
+        self.pico = max(self.pico, self.em_andamento)
+        try:
+            codigo, corpo = await super().do_request(url, method, request_data, *args, **kwargs)
+            return codigo, corpo
+        finally:
+            self.em_andamento -= 1
+            METRICAS.observar("bot_api_segundos", time.perf_counter() - inicio, metodo=metodo)
+            METRICAS.contar("bot_api_respostas_total", metodo=metodo, codigo=codigo)
+
+    async def _rastrear(self, request):
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, evento, info):
+        if evento == "connection.connect_tcp.complete":
+            self.conexoes += 1
+        elif evento == "http2.send_request_headers.started":
+            self.http2 += 1
+
+    def estatisticas(self):
+        return {"requisicoes": self.requisicoes, "conexoes": self.conexoes, "http2": self.http2,
+                "reaproveitamento": 1 - self.conexoes / self.requisicoes if self.requisicoes else 0.0,
+                "em_andamento": self.em_andamento, "pico": self.pico}
+
+
+class ServidorMetricas:
+    """``GET /metrics`` em texto do Prometheus (uma requisição por conexão)."""
+
+    def __init__(self, listen="127.0.0.1", port=9464, metricas=METRICAS):
+        self.listen = listen
+        self.port = int(port)
+        self.metricas = metricas
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._atender, self.listen, self.port)
+        logger.info("Métricas em http://%s:%s/metrics", self.listen, self.porta)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def porta(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _atender(self, reader, writer):
+        try:
+            linha = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            metodo, caminho, _ = linha.decode('latin-1').split(' ', 2)
+            if metodo == 'GET' and caminho.split('?', 1)[0] == '/metrics':
+                status, corpo = "200 OK", self.metricas.texto().encode()
+            else:
+                status, corpo = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(corpo)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + corpo
+            )
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
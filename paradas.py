@@ -0,0 +1,166 @@
+"""Orçamento com várias paradas: a ordem de visita mais barata.
+
+A origem é o ponto 0; as paradas (desembarques) podem ser visitadas em
+qualquer ordem e o percurso termina na última. O custo de cada trecho é a
+parte variável da tarifa em inteiros (``km`` x metros + ``minuto`` x
+milésimos de minuto, como em ``precos.preco_centavos``): a base, o
+multiplicador, o mínimo e o arredondamento não mudam com a ordem, então a
+ordem de menor custo é a de menor preço.
+
+Até ``MAX_EXATO`` paradas a ordem é a ótima, pela programação dinâmica de
+Held-Karp (O(2ⁿ·n²)); acima disso sai do vizinho mais próximo melhorado por
+2-opt e realocação de paradas, que levam em conta ruas de mão única (o custo
+de ida e volta de um trecho pode ser diferente).
+"""
+from typing import NamedTuple
+
+from precos import tarifa_em_centavos
+
+# Paradas (sem contar a origem) resolvidas pelo Held-Karp; ver benchmarks/bench_paradas.py
+MAX_EXATO = 12
+
+
+class Percurso(NamedTuple):
+    ordem: tuple  # índices dos pontos na ordem de visita, começando pela origem (0)
+    metros: float
+    segundos: float
+    exato: bool  # ordem ótima (Held-Karp) ou da heurística
+
+
+def custos(matriz, tarifa):
+    """Custo inteiro de cada trecho ``[i][j]`` da ``rotas.Matriz`` na ``tarifa``."""
+    t = tarifa_em_centavos(tarifa)
+    return [[t.km * round(m) + t.minuto * round(s * 1000 / 60) for m, s in zip(linha_m, linha_s)]
+            for linha_m, linha_s in zip(matriz.metros, matriz.segundos)]
+
+
+def custo_total(custo, ordem):
+    return sum(custo[a][b] for a, b in zip(ordem, ordem[1:]))
+
+
+def otimizar(matriz, tarifa, max_exato=MAX_EXATO):
+    """``Percurso`` de menor preço na ``tarifa`` pelos pontos da ``matriz`` (o 0 é a origem)."""
+    custo = custos(matriz, tarifa)
+    exato = len(custo) - 1 <= max_exato
+    ordem = held_karp(custo) if exato else heuristica(custo)
+    metros = sum(matriz.metros[a][b] for a, b in zip(ordem, ordem[1:]))
+    segundos = sum(matriz.segundos[a][b] for a, b in zip(ordem, ordem[1:]))
+    return Percurso(ordem, metros, segundos, exato)
+
+
+def held_karp(custo):
+    """Ordem ótima: menor custo de sair de 0 e visitar todos os outros pontos, terminando em qualquer um."""
+    n = len(custo) - 1
+    if n <= 1:
+        return tuple(range(n + 1))
+    # melhor[mascara * n + j]: menor custo visitando as paradas da máscara e terminando na j
+    # (parada j = ponto j + 1); vindo[...]: a parada anterior, -1 para a origem
+    infinito = float('inf')
+    melhor = [infinito] * (n << n)
+    vindo = [-1] * (n << n)
+    for j in range(n):
+        melhor[(1 << j) * n + j] = custo[0][j + 1]
+    paradas = range(n)
+    # As máscaras crescem: cada subconjunto fica pronto antes dos que o contêm
+    for mascara in range(1, 1 << n):
+        base = mascara * n
+        fora = [k for k in paradas if not mascara >> k & 1]
+        for j in paradas:
+            valor = melhor[base + j]
+            if valor == infinito:
+                continue
+            linha = custo[j + 1]
+            for k in fora:
+                indice = (mascara | 1 << k) * n + k
+                novo = valor + linha[k + 1]
+                if novo < melhor[indice]:
+                    melhor[indice] = novo
+                    vindo[indice] = j
+
+    mascara = (1 << n) - 1
+    j = min(paradas, key=lambda fim: melhor[mascara * n + fim])
+    ordem = []
+    while j >= 0:
+        ordem.append(j + 1)
+        j, mascara = vindo[mascara * n + j], mascara ^ (1 << j)
+    return (0, *reversed(ordem))
+
+
+def heuristica(custo):
+    """Ordem boa, sem garantia de ótima: vizinho mais próximo, depois 2-opt e realocação até não melhorar."""
+    ordem = vizinho_mais_proximo(custo)
+    while _dois_opt(custo, ordem) | _realocar(custo, ordem):
+        pass
+    return tuple(ordem)
+
+
+def vizinho_mais_proximo(custo):
+    ordem = [0]
+    faltam = set(range(1, len(custo)))
+    while faltam:
+        linha = custo[ordem[-1]]
+        proximo = min(faltam, key=linha.__getitem__)
+        faltam.remove(proximo)
+        ordem.append(proximo)
+    return ordem
+
+
+def _dois_opt(custo, ordem):
+    """Inverte trechos ``ordem[i:j+1]`` enquanto baixar o custo; devolve se mudou algo."""
+    n = len(ordem)
+    mudou = False
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        # ida[k]/volta[k]: custo de ordem[0..k] percorrida no sentido da ordem e no contrário
+        ida, volta = [0] * n, [0] * n
+        for k in range(1, n):
+            ida[k] = ida[k - 1] + custo[ordem[k - 1]][ordem[k]]
+            volta[k] = volta[k - 1] + custo[ordem[k]][ordem[k - 1]]
+        for i in range(1, n - 1):
+            antes = ordem[i - 1]
+            for j in range(i + 1, n):
+                depois = ordem[j + 1] if j + 1 < n else None
+                atual = custo[antes][ordem[i]] + ida[j] - ida[i]
+                invertido = custo[antes][ordem[j]] + volta[j] - volta[i]
+                if depois is not None:
+                    atual += custo[ordem[j]][depois]
+                    invertido += custo[ordem[i]][depois]
+                if invertido < atual:
+                    ordem[i:j + 1] = ordem[i:j + 1][::-1]
+                    melhorou = mudou = True
+                    break
+            if melhorou:
+                break
+    return mudou
+
+
+def _realocar(custo, ordem):
+    """Tira uma parada do lugar e a põe entre outras duas enquanto baixar o custo; devolve se mudou algo."""
+    n = len(ordem)
+    mudou = False
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for i in range(1, n):
+            anterior, parada = ordem[i - 1], ordem[i]
+            seguinte = ordem[i + 1] if i + 1 < n else None
+            # Quanto se economiza tirando a parada (e ligando anterior -> seguinte)
+            ganho = custo[anterior][parada]
+            if seguinte is not None:
+                ganho += custo[parada][seguinte] - custo[anterior][seguinte]
+            resto = ordem[:i] + ordem[i + 1:]
+            for k in range(len(resto)):
+                if k == i - 1:
+                    continue
+                a = resto[k]
+                b = resto[k + 1] if k + 1 < len(resto) else None
+                acrescimo = custo[a][parada] + (custo[parada][b] - custo[a][b] if b is not None else 0)
+                if acrescimo < ganho:
+                    resto.insert(k + 1, parada)
+                    ordem[:] = resto
+                    melhorou = mudou = True
+                    break
+            if melhorou:
+                break
+    return mudou
@@ -0,0 +1,222 @@
+"""Persistência em SQLite (modo WAL) para conversas, user_data e bot_data.
+
+As gravações ficam num buffer em memória e vão para o banco em lotes, numa
+thread dedicada: nenhum update espera pelo fsync. O ``user_data`` de cada
+usuário só é lido do banco na primeira vez em que ele aparece depois do
+restart (``refresh_user_data``), então o bot sobe rápido mesmo com muitos
+usuários gravados.
+"""
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY CHECK (id = 0), dados BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversas (
+    nome TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    PRIMARY KEY (nome, chave)
+);
+"""
+
+
+class PersistenciaSQLite(BasePersistence):
+    """``BasePersistence`` com write-behind em SQLite.
+
+    ``lote`` é o número de gravações pendentes que dispara um flush antes do
+    fim do ciclo de ``update_interval``. ``callback_data`` não é persistido.
+    """
+
+    def __init__(self, caminho, update_interval=5, lote=500, store_data=None):
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.caminho = caminho
+        self.lote = lote
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = None
+        # (tabela, chave) -> bytes/str, ou None para apagar
+        self._pendentes = {}
+        self._flush_agendado = False
+        self._ultimo_flush = None
+        self._carregados = {"user_data": set(), "chat_data": set()}
+        self._leituras = {}
+
+    # --- thread do banco -------------------------------------------------
+
+    def _conectar(self):
+        if self._conn is None:
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            self._conn = sqlite3.connect(self.caminho)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_ESQUEMA)
+        return self._conn
+
+    def _ler(self, sql, parametros=()):
+        return self._conectar().execute(sql, parametros).fetchall()
+
+    def _gravar(self, pendentes):
+        conn = self._conectar()
+        with conn:
+            for (tabela, chave), valor in pendentes.items():
+                if tabela == "conversas":
+                    nome, chave_json = chave
+                    if valor is None:
+                        conn.execute("DELETE FROM conversas WHERE nome = ? AND chave = ?", (nome, chave_json))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO conversas (nome, chave, estado) VALUES (?, ?, ?)",
+                            (nome, chave_json, valor),
+                        )
+                elif valor is None:
+                    conn.execute(f"DELETE FROM {tabela} WHERE id = ?", (chave,))
+                else:
+                    conn.execute(f"INSERT OR REPLACE INTO {tabela} (id, dados) VALUES (?, ?)", (chave, valor))
+
+    async def _no_banco(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcao, *args)
+
+    # --- buffer ----------------------------------------------------------
+
+    def _enfileirar(self, tabela, chave, valor):
+        self._pendentes[(tabela, chave)] = valor
+        if len(self._pendentes) >= self.lote:
+            self._disparar_flush()
+        elif not self._flush_agendado:
+            # update_persistence chama todos os update_* de uma vez (gather);
+            # o call_soon roda depois deles e grava o ciclo inteiro num lote só
+            self._flush_agendado = True
+            asyncio.get_running_loop().call_soon(self._disparar_flush)
+
+    def _disparar_flush(self):
+        self._flush_agendado = False
+        if not self._pendentes:
+            return
+        pendentes, self._pendentes = self._pendentes, {}
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._gravar, pendentes)
+        future.add_done_callback(_registrar_erro)
+        self._ultimo_flush = future
+
+    # --- leitura ----------------------------------------------------------
+
+    async def get_user_data(self):
+        # Carregado sob demanda em refresh_user_data
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        linhas = await self._no_banco(self._ler, "SELECT dados FROM bot_data WHERE id = 0")
+        return pickle.loads(linhas[0][0]) if linhas else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        linhas = await self._no_banco(self._ler, "SELECT chave, estado FROM conversas WHERE nome = ?", (name,))
+        conversas = {tuple(json.loads(chave)): json.loads(estado) for chave, estado in linhas}
+        # Conversas ainda no buffer são mais novas que as do banco
+        for (tabela, chave), valor in self._pendentes.items():
+            if tabela == "conversas" and chave[0] == name:
+                if valor is None:
+                    conversas.pop(tuple(json.loads(chave[1])), None)
+                else:
+                    conversas[tuple(json.loads(chave[1]))] = json.loads(valor)
+        return conversas
+
+    async def _carregar(self, tabela, chave, destino):
+        carregados = self._carregados[tabela]
+        if chave in carregados:
+            return
+        if (tabela, chave) in self._pendentes:
+            carregados.add(chave)
+            return
+        # Dois updates simultâneos do mesmo usuário esperam a mesma leitura
+        leitura = self._leituras.get((tabela, chave))
+        if leitura is None:
+            leitura = asyncio.ensure_future(self._ler_dados(tabela, chave, destino))
+            self._leituras[(tabela, chave)] = leitura
+        await leitura
+
+    async def _ler_dados(self, tabela, chave, destino):
+        try:
+            linhas = await self._no_banco(self._ler, f"SELECT dados FROM {tabela} WHERE id = ?", (chave,))
+            if linhas:
+                # dict (chat_data) ou sessao.Sessao, que também aceita o dict das versões antigas
+                destino.update(pickle.loads(linhas[0][0]))
+        finally:
+            self._carregados[tabela].add(chave)
+            del self._leituras[(tabela, chave)]
+
+    async def refresh_user_data(self, user_id, user_data):
+        await self._carregar("user_data", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        await self._carregar("chat_data", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- escrita ----------------------------------------------------------
+
+    async def update_user_data(self, user_id, data):
+        self._carregados["user_data"].add(user_id)
+        self._enfileirar("user_data", user_id, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+    async def update_chat_data(self, chat_id, data):
+        self._carregados["chat_data"].add(chat_id)
+        self._enfileirar("chat_data", chat_id, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+    async def update_bot_data(self, data):
+        self._enfileirar("bot_data", 0, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        chave = (name, json.dumps(list(key)))
+        self._enfileirar("conversas", chave, None if new_state is None else json.dumps(new_state))
+
+    async def drop_user_data(self, user_id):
+        self._carregados["user_data"].add(user_id)
+        self._enfileirar("user_data", user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._carregados["chat_data"].add(chat_id)
+        self._enfileirar("chat_data", chat_id, None)
+
+    async def flush(self):
+        """Grava tudo que estiver pendente e fecha o banco (chamado no shutdown).
+
+        O banco é reaberto sozinho se a persistência voltar a ser usada.
+        """
+        self._disparar_flush()
+        if self._ultimo_flush is not None:
+            await self._ultimo_flush
+        await self._no_banco(self._fechar)
+
+    def _fechar(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _registrar_erro(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Falha ao gravar a persistência: %s", future.exception())
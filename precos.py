@@ -0,0 +1,257 @@
+"""Motor de precificação das corridas.
+
+Concentra as tarifas e o cálculo do preço final. ``calcular_centavos`` atende
+uma corrida por vez (usado em ``calculate_final``) e ``calcular_lote`` calcula
+listas inteiras de corridas de uma só vez com NumPy (usado em ``/lote``). O
+NumPy só é importado no primeiro lote, para não pesar na partida do bot.
+
+O cálculo é todo em inteiros: tarifas em centavos, distância em metros, tempo
+em milésimos de minuto e multiplicador em porcentagem. Assim o arredondamento
+para cima em R$ 0,50 é exato; em float, um 13,00 que sai 13,0000000001
+subiria para 13,50.
+"""
+import functools
+import math
+import re
+from decimal import ROUND_HALF_UP, Decimal, DecimalException
+from typing import NamedTuple
+
+
+class Tarifa(NamedTuple):
+    base: float
+    km: float
+    minuto: float
+    minima: float
+
+
+class TarifaCentavos(NamedTuple):
+    base: int
+    km: int
+    minuto: int
+    minima: int
+
+
+# Constants for Calculation - Padrão
+BASE_PRICE_PADRAO = 3.00
+PRICE_PER_KM_PADRAO = 1.25
+PRICE_PER_MIN_PADRAO = 0.20
+MINIMUM_FARE_PADRAO = 10.00
+
+# Constants for Calculation - Executivo
+TAXA_BASE_EXEC = 5.00
+VALOR_KM_EXEC = 1.50
+VALOR_MINUTO_EXEC = 0.25
+TARIFA_MINIMA_EXEC = 15.00
+
+TARIFA_PADRAO = Tarifa(BASE_PRICE_PADRAO, PRICE_PER_KM_PADRAO, PRICE_PER_MIN_PADRAO, MINIMUM_FARE_PADRAO)
+TARIFA_EXEC = Tarifa(TAXA_BASE_EXEC, VALOR_KM_EXEC, VALOR_MINUTO_EXEC, TARIFA_MINIMA_EXEC)
+
+CATEGORIAS = ('Padrão', 'Executivo')
+
+# callback_data -> (multiplicador, nome exibido)
+CONDICOES = {
+    "normal": (1.0, "Normal"),
+    "chuva": (1.2, "Chuva/Noite"),
+    "transito": (1.4, "Trânsito Pesado"),
+}
+
+
+# Limite (exclusivo) de km e de minutos de uma corrida: acima disso é erro de digitação, e
+# metros x tarifa x porcentagem ainda cabem com folga no int64 do lote
+LIMITE_CORRIDA = 10000
+# Limite (exclusivo) de um valor em reais digitado (ganho, combustível)
+LIMITE_REAIS = 1_000_000
+
+# Escala do valor bruto: centavos x 1000 (metros, milésimos de minuto) x 100 (porcentagem)
+_ESCALA = 1000 * 100
+_PASSO = 50 * _ESCALA
+
+
+@functools.cache
+def _tabelas():
+    """numpy e as tabelas do lote: chaves e porcentagens das condições."""
+    import numpy as np
+    return (
+        np,
+        np.array(list(CONDICOES)),
+        np.array([porcentagem(m) for m, _ in CONDICOES.values()], dtype=np.int64),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _tabela_tarifas(padrao, executivo):
+    """Tarifas em centavos do lote (linha i = CATEGORIAS[i]); uma por par de tarifas de motorista."""
+    np = _tabelas()[0]
+    return np.array([tarifa_em_centavos(padrao), tarifa_em_centavos(executivo)], dtype=np.int64)
+
+
+# Sinônimos aceitos nas linhas do /lote
+_ALIAS_CATEGORIA = {
+    'padrao': 'Padrão', 'padrão': 'Padrão',
+    'exec': 'Executivo', 'executivo': 'Executivo',
+}
+_ALIAS_CONDICAO = {
+    'normal': 'normal',
+    'chuva': 'chuva', 'noite': 'chuva',
+    'transito': 'transito', 'trânsito': 'transito',
+}
+
+
+def centavos(reais):
+    """Valor em reais (com até duas casas) em centavos inteiros: 1.25 -> 125."""
+    return round(reais * 100)
+
+
+def porcentagem(multiplicador):
+    """Multiplicador em porcentagem inteira: 1.2 -> 120."""
+    return round(multiplicador * 100)
+
+
+@functools.cache
+def tarifa_em_centavos(tarifa):
+    return TarifaCentavos(*(centavos(valor) for valor in tarifa))
+
+
+def valor_aceito(valor):
+    """km ou minutos dentro do que uma corrida pode ter: finito, não negativo e abaixo de ``LIMITE_CORRIDA``."""
+    return math.isfinite(valor) and 0 <= valor < LIMITE_CORRIDA
+
+
+def tarifa_da_categoria(categoria):
+    """Retorna a tarifa da categoria (Padrão quando desconhecida)."""
+    return TARIFA_EXEC if categoria == 'Executivo' else TARIFA_PADRAO
+
+
+def preco_centavos(metros, milesimos_minuto, tarifa, percentual):
+    """Preço final em centavos: base + km + minutos, multiplicador, mínimo e arredondamento para cima em 50 centavos."""
+    t = tarifa_em_centavos(tarifa)
+    bruto = (t.base * 1000 + t.km * metros + t.minuto * milesimos_minuto) * percentual
+    bruto = max(bruto, t.minima * _ESCALA)
+    return -(-bruto // _PASSO) * 50
+
+
+def calcular_centavos(distance, minutes, tarifa, multiplier):
+    """``preco_centavos`` de km, minutos e multiplicador como digitados (até 3 casas em km e minutos)."""
+    return preco_centavos(round(distance * 1000), round(minutes * 1000), tarifa, porcentagem(multiplier))
+
+
+def calcular_preco(distance, minutes, tarifa, multiplier):
+    """Preço final em reais (``calcular_centavos`` / 100)."""
+    return calcular_centavos(distance, minutes, tarifa, multiplier) / 100
+
+
+def dividir_centavos(valor, divisor):
+    """Divisão inteira arredondada (metade para cima): rateios e médias sem sair dos inteiros."""
+    quociente, resto = divmod(valor, divisor)
+    return quociente + (2 * resto >= divisor)
+
+
+def ler_centavos(texto):
+    """Valor digitado em reais ("150,50", "60.5") em centavos exatos.
+
+    ``ValueError`` se inválido, negativo ou a partir de ``LIMITE_REAIS``.
+    """
+    try:
+        valor = Decimal(texto.strip().replace(',', '.'))
+        # Comparado antes de multiplicar: "1e999999999" * 100 estouraria o contexto do Decimal
+        if not (valor.is_finite() and 0 <= valor < LIMITE_REAIS):
+            raise ValueError(f"Valor inválido: {texto}")
+        return int((valor * 100).to_integral_value(ROUND_HALF_UP))
+    except DecimalException:
+        raise ValueError(f"Valor inválido: {texto}") from None
+
+
+def calcular_lote(distancias, minutos, categorias, condicoes, tarifas=(TARIFA_PADRAO, TARIFA_EXEC)):
+    """Calcula o preço de várias corridas de uma vez.
+
+    Recebe sequências do mesmo tamanho (categorias em ``CATEGORIAS`` e
+    condições em ``CONDICOES``) e devolve um ``np.ndarray`` (int64) com os
+    preços em centavos, idênticos aos de ``calcular_centavos`` corrida a corrida.
+    ``tarifas`` são as tarifas (Padrão, Executivo) do motorista. Km e minutos
+    fora de ``valor_aceito`` levantam ``ValueError`` (no int64 estourariam
+    sem aviso).
+    """
+    np, condicoes_chaves, condicoes_pct = _tabelas()
+    tabela = _tabela_tarifas(*tarifas)
+    d = np.asarray(distancias, dtype=np.float64)
+    m = np.asarray(minutos, dtype=np.float64)
+    cat = np.asarray(categorias)
+    cond = np.asarray(condicoes)
+    if not (d.shape == m.shape == cat.shape == cond.shape):
+        raise ValueError("As listas do lote precisam ter o mesmo tamanho.")
+    # NaN falha nas duas comparações
+    if not (((d >= 0) & (d < LIMITE_CORRIDA)).all() and ((m >= 0) & (m < LIMITE_CORRIDA)).all()):
+        raise ValueError("Km ou minutos fora do limite no lote.")
+
+    cond_idx = np.full(cond.shape, -1, dtype=np.intp)
+    for i, chave in enumerate(condicoes_chaves):
+        cond_idx[cond == chave] = i
+    if (cond_idx < 0).any():
+        raise ValueError("Condição inválida no lote.")
+
+    tarifas = tabela[(cat == 'Executivo').astype(np.intp)]
+    metros = np.rint(d * 1000).astype(np.int64)
+    milesimos = np.rint(m * 1000).astype(np.int64)
+    bruto = (tarifas[:, 0] * 1000 + tarifas[:, 1] * metros + tarifas[:, 2] * milesimos) * condicoes_pct[cond_idx]
+    bruto = np.maximum(bruto, tarifas[:, 3] * _ESCALA)
+    return -(-bruto // _PASSO) * 50
+
+
+def _dividir_linha(linha):
+    # "5,6;15;chuva" / "5.6 15 exec" / "5.6,15,normal,padrao"
+    if ';' in linha or '\t' in linha or ' ' in linha.strip():
+        return [p for p in re.split(r'[;\t ]+', linha.strip()) if p]
+    return [p.strip() for p in linha.split(',') if p.strip()]
+
+
+def ler_corrida(partes):
+    """Interpreta ``[km, minutos, (condição), (categoria)]`` já separados.
+
+    Retorna ``(distancia, minutos, categoria, condicao)`` ou levanta
+    ``ValueError`` se algum campo for inválido (km e minutos fora de
+    ``valor_aceito`` também).
+    """
+    if len(partes) < 2:
+        raise ValueError("Informe ao menos km e minutos.")
+    distancia = float(partes[0].replace(',', '.'))
+    tempo = float(partes[1].replace(',', '.'))
+    if not (valor_aceito(distancia) and valor_aceito(tempo)):
+        raise ValueError("Valores negativos, grandes demais ou inválidos.")
+
+    categoria, condicao = 'Padrão', 'normal'
+    for extra in partes[2:]:
+        chave = extra.lower()
+        if chave in _ALIAS_CATEGORIA:
+            categoria = _ALIAS_CATEGORIA[chave]
+        elif chave in _ALIAS_CONDICAO:
+            condicao = _ALIAS_CONDICAO[chave]
+        else:
+            raise ValueError(f"Opção desconhecida: {extra}")
+    return distancia, tempo, categoria, condicao
+
+
+def ler_lote(texto):
+    """Interpreta uma lista colada ou um CSV de corridas.
+
+    Cada linha tem ``km minutos [condição] [categoria]`` (em qualquer ordem
+    depois dos números). Retorna ``(distancias, minutos, categorias,
+    condicoes, erros)``, onde ``erros`` lista os números das linhas ignoradas.
+    Uma primeira linha não numérica é tratada como cabeçalho.
+    """
+    distancias, minutos, categorias, condicoes, erros = [], [], [], [], []
+    for numero, linha in enumerate(texto.splitlines(), start=1):
+        if not linha.strip():
+            continue
+        try:
+            distancia, tempo, categoria, condicao = ler_corrida(_dividir_linha(linha))
+        except ValueError:
+            # Primeira linha sem números: cabeçalho do CSV (com números fora do limite, erro)
+            if numero != 1 or re.match(r'\s*[-+]?\d', linha):
+                erros.append(numero)
+            continue
+
+        distancias.append(distancia)
+        minutos.append(tempo)
+        categorias.append(categoria)
+        condicoes.append(condicao)
+    return distancias, minutos, categorias, condicoes, erros
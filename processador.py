@@ -0,0 +1,106 @@
+"""Processamento concorrente de updates, em ordem dentro de cada chat.
+
+Por padrão a Application trata um update de cada vez: uma chamada lenta à Bot
+API num chat atrasa todos os outros motoristas. ``ProcessadorPorChat`` roda
+updates de chats diferentes ao mesmo tempo num número limitado de
+trabalhadores, mas os de um mesmo chat continuam um depois do outro, na ordem
+de chegada, para os estados do ``ConversationHandler`` não se embaralharem.
+"""
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class _FilaChat:
+    __slots__ = ('trava', 'pendentes')
+
+    def __init__(self):
+        # asyncio.Lock libera quem espera em ordem de chegada (FIFO)
+        self.trava = asyncio.Lock()
+        self.pendentes = 0
+
+
+def _chave_chat(update):
+    """Chat do update (ou usuário, em consultas inline); ``None`` se não tiver nenhum."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class ProcessadorPorChat(BaseUpdateProcessor):
+    """Update processor com ``trabalhadores`` updates rodando ao mesmo tempo e ordem por chat.
+
+    ``max_pendentes`` limita os updates admitidos (rodando ou esperando a vez
+    do chat/trabalhador); os demais aguardam na fila da Application.
+    """
+
+    __slots__ = ('trabalhadores', 'processados', 'ocupados', 'maior_fila_chat',
+                 '_vagas', '_filas', '_tempo_ocupado', '_inicio')
+
+    def __init__(self, trabalhadores=64, max_pendentes=4096):
+        if trabalhadores < 1:
+            raise ValueError("trabalhadores deve ser maior que zero")
+        super().__init__(max(max_pendentes, trabalhadores))
+        self.trabalhadores = trabalhadores
+        self.processados = 0
+        self.ocupados = 0
+        self.maior_fila_chat = 0
+        self._vagas = asyncio.Semaphore(trabalhadores)
+        self._filas = {}
+        self._tempo_ocupado = 0.0
+        self._inicio = time.monotonic()
+
+    async def initialize(self):
+        self._inicio = time.monotonic()
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update, coroutine):
+        chave = _chave_chat(update)
+        if chave is None:
+            await self._executar(coroutine)
+            return
+
+        fila = self._filas.get(chave)
+        if fila is None:
+            fila = self._filas[chave] = _FilaChat()
+        fila.pendentes += 1
+        self.maior_fila_chat = max(self.maior_fila_chat, fila.pendentes)
+        try:
+            async with fila.trava:
+                await self._executar(coroutine)
+        finally:
+            fila.pendentes -= 1
+            if not fila.pendentes:
+                del self._filas[chave]
+
+    async def _executar(self, coroutine):
+        async with self._vagas:
+            self.ocupados += 1
+            inicio = time.monotonic()
+            try:
+                await coroutine
+            finally:
+                self._tempo_ocupado += time.monotonic() - inicio
+                self.ocupados -= 1
+                self.processados += 1
+
+    def estatisticas(self):
+        """Profundidade das filas e uso dos trabalhadores desde ``initialize``."""
+        decorrido = time.monotonic() - self._inicio
+        return {
+            "processados": self.processados,
+            "rodando": self.ocupados,
+            "aguardando": self.current_concurrent_updates - self.ocupados,
+            "chats_ativos": len(self._filas),
+            "maior_fila_chat": self.maior_fila_chat,
+            "trabalhadores": self.trabalhadores,
+            "utilizacao": round(self._tempo_ocupado / (decorrido * self.trabalhadores), 3) if decorrido else 0.0,
+        }
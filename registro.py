@@ -0,0 +1,167 @@
+"""Registro (logging) fora do loop: os handlers só enfileiram, uma thread escreve.
+
+Com ``logging.basicConfig`` cada ``logger.info`` de um passo da conversa
+escreve no stderr ali mesmo: num disco ou pipe lento o loop para, e todos os
+updates em andamento esperam a escrita. Aqui o logger raiz só tem um
+``FilaRegistro``, que monta o registro e o põe numa fila limitada, e um
+``QueueListener`` numa thread formata e escreve. Com a fila cheia o registro
+é descartado (e contado) em vez de travar o bot.
+
+Os registros emitidos durante um handler (``metricas.medir_handler``) levam o
+chat, o usuário, o handler, o fluxo e a etapa da conversa, e ao fim de cada
+handler sai um registro com o estado de destino e a latência. Com
+``formato="json"`` cada registro é uma linha JSON com esses campos.
+
+``amostra`` (de 0 a 1) guarda só essa fração dos registros INFO dos updates
+(os passos da conversa e as chamadas do httpx, o grosso do volume), escolhida
+por chat: uma conversa amostrada aparece inteira. Avisos, erros, a partida e
+os jobs sempre saem.
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+TAMANHO_FILA = 10_000
+# Campos do contexto do handler e do registro de fim de handler, na ordem do JSON
+CAMPOS = ('chat_id', 'user_id', 'handler', 'fluxo', 'etapa', 'destino', 'latencia_ms')
+
+_contexto = contextvars.ContextVar("contexto_registro", default=None)
+_atual = None
+
+
+def entrar(update, handler, fluxo, etapa):
+    """Marca os registros seguintes (nesta task) com o chat, o usuário e a etapa; devolve o token de ``sair``."""
+    chat = update.effective_chat if update is not None else None
+    usuario = update.effective_user if update is not None else None
+    return _contexto.set({
+        "chat_id": chat.id if chat else None,
+        "user_id": usuario.id if usuario else None,
+        "handler": handler,
+        "fluxo": fluxo,
+        "etapa": etapa,
+    })
+
+
+def sair(token):
+    _contexto.reset(token)
+
+
+class FilaRegistro(logging.handlers.QueueHandler):
+    """``QueueHandler`` com fila limitada, contexto do handler e amostragem dos INFO dos updates."""
+
+    def __init__(self, fila, amostra=1.0):
+        super().__init__(fila)
+        self.amostra = amostra
+        self._limite = int(amostra * 2 ** 32)
+        self._excecoes = logging.Formatter()
+        self.enfileirados = 0
+        self.amostrados_fora = 0
+        self.perdidos = 0
+
+    def filter(self, record):
+        if not super().filter(record):
+            return False
+        contexto = _contexto.get()
+        if contexto is not None:
+            record.__dict__.update(contexto)
+        if self.amostra < 1 and record.levelno <= logging.INFO and not self._amostrado(record, contexto):
+            self.amostrados_fora += 1
+            return False
+        return True
+
+    def _amostrado(self, record, contexto):
+        if contexto is None:
+            # Fora dos updates: a partida e os jobs saem; o getUpdates do httpx é amostrado
+            return not record.name.startswith("httpx") or random.random() < self.amostra
+        chave = contexto["chat_id"] if contexto["chat_id"] is not None else contexto["user_id"]
+        if chave is None:
+            return random.random() < self.amostra
+        # Hash multiplicativo: o mesmo chat fica sempre dentro ou sempre fora
+        return chave * 2654435761 % 2 ** 32 < self._limite
+
+    def prepare(self, record):
+        # No loop só o barato: a mensagem com os args; a formatação fica com a thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._excecoes.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.perdidos += 1
+        else:
+            self.enfileirados += 1
+
+
+class FormatoJSON(logging.Formatter):
+    """Uma linha JSON por registro: hora, nível, logger, mensagem e os ``CAMPOS`` presentes."""
+
+    def format(self, record):
+        dados = {
+            "ts": datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for campo in CAMPOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                dados[campo] = valor
+        if record.exc_text:
+            dados["exc"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class Registro:
+    """A fila e a thread de escrita montadas por ``configurar``."""
+
+    def __init__(self, fila_handler, listener):
+        self.fila_handler = fila_handler
+        self._listener = listener
+
+    def parar(self):
+        """Escreve o que ainda está na fila e encerra a thread."""
+        if self._listener._thread is not None:
+            self._listener.stop()
+
+    def estatisticas(self):
+        fila = self.fila_handler
+        return {"enfileirados": fila.enfileirados, "amostrados_fora": fila.amostrados_fora,
+                "perdidos": fila.perdidos, "na_fila": fila.queue.qsize()}
+
+
+def configurar(formato="texto", nivel=logging.INFO, amostra=1.0, saida=None, tamanho_fila=TAMANHO_FILA):
+    """Troca os handlers do logger raiz pela fila e inicia a thread que escreve em ``saida`` (stderr).
+
+    ``formato`` é ``"texto"`` (o mesmo formato do ``basicConfig`` de antes) ou
+    ``"json"``. Uma nova chamada encerra a thread anterior.
+    """
+    global _atual
+    if _atual is not None:
+        _atual.parar()
+    escrita = logging.StreamHandler(saida)
+    escrita.setFormatter(FormatoJSON() if formato == "json" else logging.Formatter(FORMATO_TEXTO))
+    fila_handler = FilaRegistro(queue.Queue(tamanho_fila), amostra)
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    raiz.addHandler(fila_handler)
+    raiz.setLevel(nivel)
+    listener = logging.handlers.QueueListener(fila_handler.queue, escrita)
+    listener.start()
+    _atual = Registro(fila_handler, listener)
+    # Na saída do processo, o que ficou na fila ainda é escrito
+    atexit.register(_atual.parar)
+    return _atual
@@ -0,0 +1,206 @@
+"""Teclados e textos das respostas do bot.
+
+Os teclados são montados uma vez na importação e reaproveitados em todas as
+respostas (os objetos do python-telegram-bot são imutáveis). Os cartões e
+resumos saem de templates prontos, com a formatação de dinheiro pt-BR
+(``13,00``) feita em um só lugar.
+"""
+import functools
+import html
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+
+from dinamica import CONDICAO_DINAMICA
+
+# Button Constants
+BTN_NOVO_ORCAMENTO = "🚀 Novo Orçamento"
+BTN_CANCELAR = "❌ Cancelar"
+BTN_CONSUMO = "⛽ Calcular Consumo"
+BTN_RESUMO = "📅 Resumo Diário"
+
+EMOJI_CATEGORIA = {'Padrão': '🚘', 'Executivo': '💼'}
+EMOJI_CONDICAO = {"normal": "☀️", "chuva": "🌧️", "transito": "🚦"}
+
+# Main menu (start, cancel and the end of every flow)
+MENU_PRINCIPAL = InlineKeyboardMarkup([
+    [InlineKeyboardButton(BTN_NOVO_ORCAMENTO, callback_data="novo_orcamento")],
+    [InlineKeyboardButton(BTN_CONSUMO, callback_data="consumo")],
+    [InlineKeyboardButton(BTN_RESUMO, callback_data="diario")]
+])
+
+MENU_NOVO_ORCAMENTO = InlineKeyboardMarkup([
+    [InlineKeyboardButton(BTN_NOVO_ORCAMENTO, callback_data="novo_orcamento")]
+])
+
+TECLADO_CATEGORIA = InlineKeyboardMarkup([
+    [InlineKeyboardButton('🚘 Padrão', callback_data='categoria_padrao'), InlineKeyboardButton('💼 Executivo', callback_data='categoria_exec')],
+    [InlineKeyboardButton(BTN_CANCELAR, callback_data='cancelar')]
+])
+
+TECLADO_CONDICAO = InlineKeyboardMarkup([
+    [InlineKeyboardButton("☀️ Normal (1.0x)", callback_data="normal")],
+    [InlineKeyboardButton("🌧️ Chuva/Noite (1.2x)", callback_data="chuva")],
+    [InlineKeyboardButton("🚦 Trânsito Pesado (1.4x)", callback_data="transito")],
+    [InlineKeyboardButton(BTN_CANCELAR, callback_data="cancelar")]
+])
+
+# One-button reply keyboard sent with every typed-input question
+TECLADO_CANCELAR = ReplyKeyboardMarkup(
+    [[KeyboardButton(BTN_CANCELAR)]],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+
+REMOVER_TECLADO = ReplyKeyboardRemove()
+
+# Daily summary pre-filled from the ride ledger
+TECLADO_DIARIO_LIVRO = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✍️ Digitar manualmente", callback_data="diario_manual")],
+    [InlineKeyboardButton(BTN_CANCELAR, callback_data="cancelar")]
+])
+
+
+def teclado_aceitar(callback_data):
+    """Botão do painel do motorista que registra a corrida no livro."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ Corrida aceita", callback_data=callback_data)]])
+
+
+@functools.cache
+def teclado_condicao(percentual):
+    """Teclado das condições; acima de 100% traz primeiro o botão da dinâmica sugerida."""
+    if percentual <= 100:
+        return TECLADO_CONDICAO
+    dinamica = [InlineKeyboardButton(f"⚡ Dinâmica sugerida ({percentual / 100:g}x)", callback_data=CONDICAO_DINAMICA)]
+    return InlineKeyboardMarkup([dinamica, *TECLADO_CONDICAO.inline_keyboard])
+
+
+def teclado_lugares(lugares):
+    """Sugestões do guia de lugares, um botão por ``(número, nome)``."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(f"📍 {nome}", callback_data=f"lugar:{numero}")]
+                                 for numero, nome in lugares])
+
+
+def teclado_historico(termo, pagina):
+    """Botões de página do ``/historico`` (``historico.Pagina``): o id da ponta da página e o termo vão no callback."""
+    botoes = []
+    if pagina.mais_recentes:
+        botoes.append(InlineKeyboardButton("◀️ Mais recentes", callback_data=f"hist:d:{pagina.orcamentos[0].id}:{termo}"))
+    if pagina.mais_antigos:
+        botoes.append(InlineKeyboardButton("Mais antigos ▶️", callback_data=f"hist:a:{pagina.orcamentos[-1].id}:{termo}"))
+    return InlineKeyboardMarkup([botoes]) if botoes else None
+
+
+def brl(valor):
+    """Formata um número no padrão pt-BR com duas casas: 13.5 -> '13,50'."""
+    return f"{valor:.2f}".replace('.', ',')
+
+
+# Os templates são f-strings compiladas junto com as funções: cada resposta
+# custa só a interpolação, sem montar listas ou concatenar pedaços.
+
+
+def cartao_motorista(preco, distancia, minutos, multiplicador, condicao, carro, categoria, minima):
+    return (
+        f"<b>🚖 PAINEL DO MOTORISTA</b>\n"
+        f"──────────────\n"
+        f"<b>💵 FINAL: R$ {preco:.2f}</b>\n".replace('.', ',') +
+        f"📏 Dist: {distancia} km\n"
+        f"⏱️ Tempo: {minutos:.0f} min\n"
+        f"🌧️ Fator: {multiplicador}x ({condicao})\n"
+        f"Veículo: {carro} ({categoria})\n"
+        f"──────────────\n"
+        f"<i>(Mínimo: R$ {minima:.2f})</i>"
+    )
+
+
+def cartao_passageiro(preco, distancia, minutos, carro, categoria):
+    return (
+        f"Olá! Segue o orçamento da sua viagem:\n\n"
+        f"<b>R$ {preco:.2f}</b>\n\n".replace('.', ',') +
+        f"🚗 <b>Veículo:</b> {carro} ({categoria})\n"
+        f"📏 <b>Distância:</b> {distancia} km\n"
+        f"⏱️ <b>Tempo Estimado:</b> {minutos:.0f} min\n\n"
+        f"<i>Qualquer dúvida, estou à disposição!</i>"
+    )
+
+
+def resultado_consumo(km, litros, km_por_litro, litros_100km):
+    return (
+        f"📊 Resultado do Consumo:\n\n"
+        f"🚗 Kilômetros rodados: {km} km\n"
+        f"⛽ Litros: {litros}\n\n" +
+        f"📈 Consumo: <b>{km_por_litro:.2f} km/l</b>\n"
+        f"📉 Consumo médio: <b>{litros_100km:.2f} L/100km</b>\n".replace('.', ',')
+    )
+
+
+def resumo_diario(corridas, ganho, combustivel, lucro, lucro_corrida, margem):
+    # Nenhum texto fixo tem ponto: um replace só formata todos os valores
+    return (
+        f"📊 <b>Resumo Diário</b>\n\n"
+        f"🚖 Corridas: <b>{corridas}</b>\n"
+        f"💰 Ganho total: <b>R$ {ganho:.2f}</b>\n"
+        f"⛽ Combustível: <b>R$ {combustivel:.2f}</b>\n\n"
+        f"🧾 Lucro líquido: <b>R$ {lucro:.2f}</b>\n"
+        f"📈 Lucro por corrida: <b>R$ {lucro_corrida:.2f}</b>\n"
+        f"📊 Margem: <b>{margem:.2f}%</b>\n"
+    ).replace('.', ',')
+
+
+def resumo_livro(resumo):
+    """Totais registrados pelo botão "Corrida aceita" (``corridas.Resumo``)."""
+    return (
+        f"📒 <b>Corridas registradas</b>\n"
+        f"Hoje: <b>{resumo.dia.corridas}</b> · R$ {resumo.dia.centavos / 100:.2f}\n"
+        f"Semana: <b>{resumo.semana.corridas}</b> · R$ {resumo.semana.centavos / 100:.2f}\n"
+        f"Mês: <b>{resumo.mes.corridas}</b> · R$ {resumo.mes.centavos / 100:.2f}\n"
+    ).replace('.', ',')
+
+
+def resumo_paradas(trechos, distancia, minutos, precos, exato):
+    """Ordem de visita do ``/paradas``: ``trechos`` = [(número da parada, km do trecho)], ``precos`` = {categoria: reais}."""
+    linhas = "".join(f"{posicao}) Parada {parada} · {km:.1f} km\n" for posicao, (parada, km) in enumerate(trechos, start=1))
+    valores = "".join(f"{EMOJI_CATEGORIA[categoria]} {categoria}: <b>R$ {preco:.2f}</b>\n" for categoria, preco in precos.items())
+    aviso = "" if exato else "<i>(Ordem aproximada: com muitas paradas a busca não testa todas as combinações.)</i>\n"
+    return (
+        f"🧭 <b>Melhor ordem das paradas</b>\n\n"
+        f"📍 Origem\n{linhas}\n"
+        f"📏 Total: {distancia:.1f} km · ⏱️ ~{minutos:.0f} min\n"
+        f"{valores}"
+    ).replace('.', ',') + aviso
+
+
+def historico_orcamentos(orcamentos, termo):
+    """Uma página do ``/historico`` (``historico.Orcamento``), do mais recente ao mais antigo."""
+    titulo = f"🔎 <b>Orçamentos com “{html.escape(termo)}”</b>\n\n" if termo else "🗂️ <b>Últimos orçamentos</b>\n\n"
+    return titulo + "\n".join(_linha_historico(orcamento) for orcamento in orcamentos)
+
+
+def _linha_historico(o):
+    rotulos = " · ".join(html.escape(rotulo) for rotulo in (o.cliente, o.rota) if rotulo)
+    return (
+        f"📅 {datetime.fromtimestamp(o.ts):%d/%m/%Y %H:%M} · <b>R$ {brl(o.centavos / 100)}</b>\n"
+        f"{EMOJI_CATEGORIA.get(o.categoria, '🚘')} {o.categoria} · {EMOJI_CONDICAO.get(o.condicao, '⚡')} "
+        f"{o.metros / 1000:.1f} km · {o.segundos / 60:.0f} min\n".replace('.', ',') +
+        (f"🏷️ {rotulos}\n" if rotulos else "")
+    )
+
+
+_ALERTAS_CONSUMO = {
+    "baixo": "🚨 <b>Consumo bem abaixo do normal!</b> Confira vazamentos, pneus ou se os valores foram digitados certo.\n",
+    "alto": "⚠️ <b>Consumo bem acima do normal.</b> Confira se os litros e os km foram digitados certo.\n",
+}
+
+
+def historico_consumo(historico, alerta=None):
+    """Estatísticas dos últimos abastecimentos (``consumo.HistoricoConsumo``)."""
+    texto = _ALERTAS_CONSUMO.get(alerta, "")
+    if historico.n < 2:
+        return texto
+    return (
+        f"\n{texto}"
+        f"📚 <b>Últimos {historico.n} abastecimentos</b>\n" +
+        f"Média: {historico.media:.2f} km/l · Tendência: {historico.ewma:.2f} km/l\n"
+        f"Melhor: {historico.maximo:.2f} · Pior: {historico.minimo:.2f} km/l\n".replace('.', ',')
+    )
@@ -0,0 +1,428 @@
+"""Roteamento offline: distância e tempo entre dois pontos pela malha viária.
+
+``preparar`` converte um extrato do OpenStreetMap (``.osm`` XML) num arquivo
+binário compacto: nós e arestas em arrays (formato CSR, só a maior
+componente fortemente conexa) e as tabelas de landmarks do A* com
+landmarks (ALT). ``GrafoRotas`` carrega esse arquivo, encaixa as coordenadas
+no nó mais próximo (grade espacial) e responde as consultas com A* guiado
+pelos landmarks, com cache LRU por par de nós. O custo minimizado é o tempo;
+a distância é somada ao longo do mesmo caminho. ``matriz`` dá as rotas entre
+todos os pares de uma lista de pontos (orçamento com várias paradas).
+
+Uso: python -m rotas preparar cidade.osm dados/rotas.grafo [--landmarks 8]
+"""
+import functools
+import heapq
+import math
+import re
+import struct
+import sys
+from array import array
+from typing import NamedTuple
+
+MAGICO = b'ROTA1'
+_CABECALHO = struct.Struct('<5s3xIII')
+# Tamanho da célula da grade de busca do nó mais próximo (~550 m)
+CELULA_GRAUS = 0.005
+# Maior distância (m) aceita entre o ponto pedido e a malha
+MAX_ENCAIXE_METROS = 1500
+LANDMARKS_ATIVOS = 4
+_METROS_POR_GRAU = 111195
+CACHE_ROTAS = 4096
+CACHE_MATRIZES = 256
+# Até tantos pontos a matriz sai do A* par a par; acima, de um Dijkstra por ponto (ver bench_paradas)
+MATRIZ_A_ESTRELA = 13
+
+# Velocidade (km/h) por tipo de via quando o OSM não traz maxspeed
+VELOCIDADES = {
+    "motorway": 90, "trunk": 70, "primary": 50, "secondary": 45, "tertiary": 40,
+    "unclassified": 30, "residential": 30, "living_street": 10, "service": 15, "road": 30,
+    "motorway_link": 50, "trunk_link": 40, "primary_link": 40, "secondary_link": 35, "tertiary_link": 30,
+}
+# maxspeed numérico, com unidade opcional ("60", "40 mph", "80 km/h"); "none", "signals" e afins ficam de fora
+_MAXSPEED = re.compile(r"\s*(\d+(?:\.\d+)?)\s*(mph|km/h|kmh|kph)?\s*$")
+_KM_POR_MILHA = 1.609344
+
+
+class Rota(NamedTuple):
+    metros: float
+    segundos: float
+
+
+class Matriz(NamedTuple):
+    """Rotas entre todos os pares de pontos: ``metros[i][j]`` vai do ponto i ao j (tuplas, fica no cache)."""
+    metros: tuple
+    segundos: tuple
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distância em metros entre dois pontos (lat/lon em graus)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 12742000 * math.asin(math.sqrt(a))
+
+
+class GrafoRotas:
+    def __init__(self, lats, lons, inicios, destinos, metros, segundos, landmarks, de_landmark, para_landmark,
+                 cache=CACHE_ROTAS, cache_matrizes=CACHE_MATRIZES):
+        self.lats = lats
+        self.lons = lons
+        self.inicios = inicios
+        self.destinos = destinos
+        self.metros = metros
+        self.segundos = segundos
+        self.landmarks = landmarks
+        self.de_landmark = de_landmark
+        self.para_landmark = para_landmark
+        self._grade = {}
+        for no in range(len(lats)):
+            self._grade.setdefault(_celula(lats[no], lons[no]), []).append(no)
+        self._rota_entre_nos = functools.lru_cache(maxsize=cache)(self._a_estrela)
+        self._matriz_entre_nos = functools.lru_cache(maxsize=cache_matrizes)(self._montar_matriz)
+
+    @property
+    def n_nos(self):
+        return len(self.lats)
+
+    @classmethod
+    def carregar(cls, caminho, cache=CACHE_ROTAS, cache_matrizes=CACHE_MATRIZES):
+        with open(caminho, "rb") as arquivo:
+            dados = arquivo.read()
+        magico, n, m, k = _CABECALHO.unpack_from(dados)
+        if magico != MAGICO:
+            raise ValueError(f"{caminho} não é um grafo de rotas.")
+        posicao = _CABECALHO.size
+        partes = []
+        for tipo, tamanho in (('d', n), ('d', n), ('I', n + 1), ('I', m), ('f', m), ('f', m),
+                              ('I', k), ('f', k * n), ('f', k * n)):
+            parte = array(tipo)
+            fim = posicao + tamanho * parte.itemsize
+            parte.frombytes(dados[posicao:fim])
+            partes.append(parte)
+            posicao = fim
+        return cls(*partes, cache=cache, cache_matrizes=cache_matrizes)
+
+    def salvar(self, caminho):
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(_CABECALHO.pack(MAGICO, len(self.lats), len(self.destinos), len(self.landmarks)))
+            for parte in (self.lats, self.lons, self.inicios, self.destinos, self.metros, self.segundos,
+                          self.landmarks, self.de_landmark, self.para_landmark):
+                parte.tofile(arquivo)
+
+    # --- consultas ----------------------------------------------------------
+
+    def no_mais_proximo(self, lat, lon):
+        """Nó da malha mais perto de (lat, lon), ou ``None`` se estiver a mais de ``MAX_ENCAIXE_METROS``."""
+        clat, clon = _celula(lat, lon)
+        # Aproximação plana (graus², longitude encolhida pelo cosseno): basta para comparar vizinhos
+        escala = math.cos(math.radians(lat)) ** 2
+        lats, lons = self.lats, self.lons
+        melhor, melhor_dist = None, (MAX_ENCAIXE_METROS / _METROS_POR_GRAU) ** 2
+        raio_max = int(MAX_ENCAIXE_METROS / (CELULA_GRAUS * _METROS_POR_GRAU)) + 1
+        for raio in range(raio_max + 1):
+            for dlat in range(-raio, raio + 1):
+                for dlon in range(-raio, raio + 1):
+                    if max(abs(dlat), abs(dlon)) != raio:
+                        continue
+                    for no in self._grade.get((clat + dlat, clon + dlon), ()):
+                        dist = (lats[no] - lat) ** 2 + (lons[no] - lon) ** 2 * escala
+                        if dist < melhor_dist:
+                            melhor, melhor_dist = no, dist
+            # Células além do anel atual estão a pelo menos raio * célula de distância
+            if melhor is not None and melhor_dist < (raio * CELULA_GRAUS) ** 2 * escala:
+                break
+        return melhor
+
+    def rota(self, lat1, lon1, lat2, lon2):
+        """``Rota`` (metros, segundos) entre dois pontos, ou ``None`` se algum estiver fora da malha."""
+        origem = self.no_mais_proximo(lat1, lon1)
+        destino = self.no_mais_proximo(lat2, lon2)
+        if origem is None or destino is None:
+            return None
+        return self._rota_entre_nos(origem, destino)
+
+    def matriz(self, pontos):
+        """``Matriz`` entre todos os ``pontos`` [(lat, lon)], ou ``None`` se algum estiver fora da malha."""
+        nos = [self.no_mais_proximo(lat, lon) for lat, lon in pontos]
+        if None in nos:
+            return None
+        return self._matriz_entre_nos(tuple(nos))
+
+    def estatisticas(self):
+        """Tamanho da malha e acertos dos caches de rotas e de matrizes."""
+        cache = self._rota_entre_nos.cache_info()
+        matrizes = self._matriz_entre_nos.cache_info()
+        return {"nos": self.n_nos, "arestas": len(self.destinos), "cache_acertos": cache.hits,
+                "cache_faltas": cache.misses, "cache_tamanho": cache.currsize,
+                "matrizes_acertos": matrizes.hits, "matrizes_faltas": matrizes.misses}
+
+    def _montar_matriz(self, nos):
+        if len(nos) <= MATRIZ_A_ESTRELA:
+            # Poucos pontos: o A* guiado é mais rápido que um Dijkstra até o ponto
+            # mais longe, e os pares entram no mesmo cache do /rota
+            rotas = [[self._rota_entre_nos(a, b) if a != b else Rota(0.0, 0.0) for b in nos] for a in nos]
+        else:
+            # Muitos pontos: um Dijkstra por origem até fechar todos os outros (n buscas em vez de n²)
+            alvos = set(nos)
+            rotas = []
+            for origem in nos:
+                tempo, distancia = self._ate_todos(origem, alvos)
+                rotas.append([Rota(distancia[no], tempo[no]) for no in nos])
+        return Matriz(tuple(tuple(rota.metros for rota in linha) for linha in rotas),
+                      tuple(tuple(rota.segundos for rota in linha) for linha in rotas))
+
+    def _ate_todos(self, origem, alvos):
+        """Tempo e distância de ``origem`` até cada nó fechado, parando quando todos os ``alvos`` fecham."""
+        inicios, destinos, segundos, metros = self.inicios, self.destinos, self.segundos, self.metros
+        tempo = {origem: 0.0}
+        distancia = {origem: 0.0}
+        fechados = set()
+        faltam = len(alvos)
+        fila = [(0.0, origem)]
+        while fila:
+            tempo_u, u = heapq.heappop(fila)
+            if u in fechados:
+                continue
+            fechados.add(u)
+            if u in alvos:
+                faltam -= 1
+                if not faltam:
+                    break
+            distancia_u = distancia[u]
+            for aresta in range(inicios[u], inicios[u + 1]):
+                v = destinos[aresta]
+                novo = tempo_u + segundos[aresta]
+                if novo < tempo.get(v, math.inf):
+                    tempo[v] = novo
+                    distancia[v] = distancia_u + metros[aresta]
+                    heapq.heappush(fila, (novo, v))
+        return tempo, distancia
+
+    def _a_estrela(self, origem, destino):
+        n = self.n_nos
+        de, para = self.de_landmark, self.para_landmark
+        # Landmarks que dão o maior limite inferior para este par
+        limites = sorted(
+            ((max(de[i * n + destino] - de[i * n + origem], para[i * n + origem] - para[i * n + destino]), i)
+             for i in range(len(self.landmarks))),
+            reverse=True,
+        )
+        ativos = [(i * n, de[i * n + destino], para[i * n + destino]) for _, i in limites[:LANDMARKS_ATIVOS]]
+
+        def h(v):
+            melhor = 0.0
+            for base, de_t, para_t in ativos:
+                estimativa = de_t - de[base + v]
+                if estimativa > melhor:
+                    melhor = estimativa
+                estimativa = para[base + v] - para_t
+                if estimativa > melhor:
+                    melhor = estimativa
+            return melhor
+
+        inicios, destinos, segundos, metros = self.inicios, self.destinos, self.segundos, self.metros
+        tempo = {origem: 0.0}
+        distancia = {origem: 0.0}
+        fechados = set()
+        fila = [(h(origem), origem)]
+        while fila:
+            _, u = heapq.heappop(fila)
+            if u == destino:
+                return Rota(distancia[u], tempo[u])
+            if u in fechados:
+                continue
+            fechados.add(u)
+            tempo_u, distancia_u = tempo[u], distancia[u]
+            for aresta in range(inicios[u], inicios[u + 1]):
+                v = destinos[aresta]
+                novo = tempo_u + segundos[aresta]
+                if novo < tempo.get(v, math.inf):
+                    tempo[v] = novo
+                    distancia[v] = distancia_u + metros[aresta]
+                    heapq.heappush(fila, (novo + h(v), v))
+        return None
+
+
+def ler_coordenada(texto):
+    """``"lat,lon"`` (ponto decimal) em ``(lat, lon)``; levanta ``ValueError`` se inválida."""
+    lat, lon = (float(parte) for parte in texto.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Coordenada fora do globo: {texto}")
+    return lat, lon
+
+
+def _celula(lat, lon):
+    return int(math.floor(lat / CELULA_GRAUS)), int(math.floor(lon / CELULA_GRAUS))
+
+
+# --- pré-processamento --------------------------------------------------------
+
+def _velocidade_maxima(texto):
+    """km/h da tag ``maxspeed`` (a primeira de "50;70"); ``None`` se não for um número positivo."""
+    casou = _MAXSPEED.match(texto.split(";")[0])
+    if casou is None:
+        return None
+    velocidade = float(casou.group(1)) * (_KM_POR_MILHA if casou.group(2) == "mph" else 1)
+    return velocidade if velocidade > 0 else None
+
+
+def ler_osm(caminho):
+    """Nós (id -> (lat, lon)) e arestas (origem, destino, km/h) das vias de carro de um ``.osm`` XML."""
+    import xml.etree.ElementTree as ET
+
+    coordenadas = {}
+    arestas = []
+    for _, elemento in ET.iterparse(caminho, events=("end",)):
+        if elemento.tag == "node":
+            coordenadas[int(elemento.get("id"))] = (float(elemento.get("lat")), float(elemento.get("lon")))
+        elif elemento.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in elemento.iter("tag")}
+            velocidade = VELOCIDADES.get(tags.get("highway"))
+            if velocidade and tags.get("access") not in ("no", "private"):
+                velocidade = _velocidade_maxima(tags.get("maxspeed", "")) or velocidade
+                refs = [int(nd.get("ref")) for nd in elemento.iter("nd")]
+                sentido = tags.get("oneway")
+                if sentido == "-1":
+                    refs.reverse()
+                mao_unica = sentido in ("yes", "true", "1", "-1") or tags.get("junction") == "roundabout" \
+                    or tags.get("highway") == "motorway"
+                for a, b in zip(refs, refs[1:]):
+                    arestas.append((a, b, velocidade))
+                    if not mao_unica:
+                        arestas.append((b, a, velocidade))
+        if elemento.tag in ("node", "way", "relation"):
+            # Os filhos (tags, nds) já foram lidos: sem clear, o arquivo inteiro fica na memória
+            elemento.clear()
+    return coordenadas, arestas
+
+
+def montar_grafo(coordenadas, arestas, n_landmarks=8):
+    """``GrafoRotas`` com a maior componente fortemente conexa e ``n_landmarks`` landmarks."""
+    arestas = [(a, b, v) for a, b, v in arestas if a in coordenadas and b in coordenadas and a != b and v > 0]
+    componente = _maior_componente(arestas)
+    ids = sorted(componente)
+    indice = {no: i for i, no in enumerate(ids)}
+    n = len(ids)
+
+    # CSR: arestas ordenadas por origem; custo = tempo (s) e distância (m)
+    saidas = [[] for _ in range(n)]
+    for a, b, velocidade in arestas:
+        if a in componente and b in componente:
+            metros = haversine(*coordenadas[a], *coordenadas[b])
+            saidas[indice[a]].append((indice[b], metros, metros / (velocidade / 3.6)))
+    inicios, destinos, metros, segundos = array('I', [0]), array('I'), array('f'), array('f')
+    for lista in saidas:
+        for destino, m, s in lista:
+            destinos.append(destino)
+            metros.append(m)
+            segundos.append(s)
+        inicios.append(len(destinos))
+
+    lats = array('d', (coordenadas[no][0] for no in ids))
+    lons = array('d', (coordenadas[no][1] for no in ids))
+    landmarks, de_landmark, para_landmark = _landmarks(n, inicios, destinos, segundos, n_landmarks)
+    return GrafoRotas(lats, lons, inicios, destinos, metros, segundos, landmarks, de_landmark, para_landmark)
+
+
+def _maior_componente(arestas):
+    frente, tras = {}, {}
+    for a, b, _ in arestas:
+        frente.setdefault(a, []).append(b)
+        tras.setdefault(b, []).append(a)
+
+    def alcancaveis(inicio, vizinhos):
+        vistos, pilha = {inicio}, [inicio]
+        while pilha:
+            for v in vizinhos.get(pilha.pop(), ()):
+                if v not in vistos:
+                    vistos.add(v)
+                    pilha.append(v)
+        return vistos
+
+    # A componente de um nó = quem ele alcança ∩ quem o alcança; tenta os nós de
+    # maior grau até achar uma que cubra mais da metade do que sobra
+    restantes = set(frente)
+    melhor = set()
+    for no in sorted(frente, key=lambda v: -len(frente[v])):
+        if no not in restantes:
+            continue
+        componente = alcancaveis(no, frente) & alcancaveis(no, tras)
+        restantes -= componente
+        if len(componente) > len(melhor):
+            melhor = componente
+        if len(melhor) >= len(restantes):
+            break
+    return melhor
+
+
+def _dijkstra(n, inicios, destinos, custos, origem):
+    # Soma em float64; a tabela final é convertida para float32
+    dist = array('d', [math.inf]) * n
+    dist[origem] = 0.0
+    fila = [(0.0, origem)]
+    while fila:
+        d, u = heapq.heappop(fila)
+        if d > dist[u]:
+            continue
+        for aresta in range(inicios[u], inicios[u + 1]):
+            v = destinos[aresta]
+            nd = d + custos[aresta]
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(fila, (nd, v))
+    return dist
+
+
+def _landmarks(n, inicios, destinos, segundos, quantidade):
+    """Landmarks escolhidos pelo mais distante dos já escolhidos, com tempos de/para cada nó."""
+    # Grafo reverso para as distâncias até o landmark
+    contagem = array('I', [0]) * (n + 1)
+    for v in destinos:
+        contagem[v + 1] += 1
+    for i in range(n):
+        contagem[i + 1] += contagem[i]
+    r_inicios = array('I', contagem)
+    r_destinos, r_custos = array('I', [0]) * len(destinos), array('f', [0.0]) * len(destinos)
+    posicao = array('I', contagem)
+    for u in range(n):
+        for aresta in range(inicios[u], inicios[u + 1]):
+            v = destinos[aresta]
+            r_destinos[posicao[v]] = u
+            r_custos[posicao[v]] = segundos[aresta]
+            posicao[v] += 1
+
+    escolhidos, de_landmark, para_landmark = array('I'), array('f'), array('f')
+    minimo = array('d', [math.inf]) * n
+    proximo = 0
+    for _ in range(min(quantidade, n)):
+        escolhidos.append(proximo)
+        de = _dijkstra(n, inicios, destinos, segundos, proximo)
+        de_landmark.extend(array('f', de))
+        para_landmark.extend(array('f', _dijkstra(n, r_inicios, r_destinos, r_custos, proximo)))
+        for v in range(n):
+            if de[v] < minimo[v]:
+                minimo[v] = de[v]
+        proximo = max(range(n), key=minimo.__getitem__)
+    return escolhidos, de_landmark, para_landmark
+
+
+def preparar(caminho_osm, caminho_grafo, n_landmarks=8):
+    coordenadas, arestas = ler_osm(caminho_osm)
+    grafo = montar_grafo(coordenadas, arestas, n_landmarks)
+    grafo.salvar(caminho_grafo)
+    return grafo
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pré-processa um extrato .osm para o roteamento offline.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("preparar")
+    p.add_argument("osm")
+    p.add_argument("grafo")
+    p.add_argument("--landmarks", type=int, default=8)
+    args = parser.parse_args()
+    grafo = preparar(args.osm, args.grafo, args.landmarks)
+    print(f"{grafo.n_nos} nós, {len(grafo.destinos)} arestas, {len(grafo.landmarks)} landmarks -> {args.grafo}",
+          file=sys.stderr)
@@ -0,0 +1,170 @@
+"""Sessão de cada usuário: o ``context.user_data`` do bot.
+
+No lugar do dict aberto do PTB, ``Sessao`` tem os campos fixos em
+``__slots__`` (``ContextTypes(user_data=Sessao)``): um terço a menos de
+memória que um dict com as mesmas chaves (``benchmarks/bench_sessoes.py``), e
+um nome errado vira ``AttributeError`` em vez de uma chave nova esquecida.
+
+Os campos de fluxo (orçamento, consumo e resumo diário) só valem enquanto a
+conversa está aberta. As conversas expiram pelo ``conversation_timeout`` do
+PTB, com ``expirar_conversa`` no estado ``TIMEOUT`` limpando esses campos.
+Sobram as sessões na memória: ``agendar_varredura`` põe no ``job_queue`` uma
+varredura periódica que limpa os campos de fluxo de quem está parado há mais
+de ``ttl`` segundos (as sessões restauradas da persistência não têm timeout
+agendado) e descarta as sessões que ficaram vazias.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+logger = logging.getLogger(__name__)
+
+TTL_SESSAO = 30 * 60
+INTERVALO_VARREDURA = 60
+
+# Valem só durante a conversa; None = não informado
+CAMPOS_FLUXO = ('categoria', 'distance', 'minutes', 'origem', 'rota', 'liters', 'diaria_rides', 'diaria_centavos')
+
+
+class Sessao:
+    __slots__ = ('teclado_aberto', 'consumo_hist') + CAMPOS_FLUXO
+
+    def __init__(self):
+        # O teclado de "Cancelar" pode ter ficado aberto de antes (ex: sessão nova após restart)
+        self.teclado_aberto = True
+        self.consumo_hist = None
+        self.limpar_fluxo()
+
+    def limpar_fluxo(self):
+        for campo in CAMPOS_FLUXO:
+            setattr(self, campo, None)
+
+    def em_fluxo(self):
+        return any(getattr(self, campo) is not None for campo in CAMPOS_FLUXO)
+
+    def vazia(self):
+        """Nada a guardar: sem fluxo e sem histórico de consumo.
+
+        ``teclado_aberto`` não conta: uma sessão nova começa com ``True``, e o
+        pior de perder um ``False`` é um "Cancelar" removido sem precisar.
+        """
+        return self.consumo_hist is None and not self.em_fluxo()
+
+    def update(self, dados):
+        """Copia ``dados`` (outra ``Sessao`` ou o dict gravado pelas versões antigas); chaves desconhecidas são ignoradas.
+
+        É o que a persistência chama ao carregar o ``user_data`` do banco.
+        """
+        if isinstance(dados, Sessao):
+            dados = dados.__getstate__()
+        for campo, valor in dados.items():
+            if campo in self.__slots__:
+                setattr(self, campo, valor)
+
+    def __getstate__(self):
+        # Só os campos preenchidos: o pickle da persistência fica do tamanho do dict antigo
+        return {campo: getattr(self, campo) for campo in self.__slots__ if getattr(self, campo) is not None}
+
+    def __setstate__(self, estado):
+        self.__init__()
+        self.update(estado)
+
+    def __repr__(self):
+        campos = ", ".join(f"{campo}={getattr(self, campo)!r}" for campo in self.__slots__
+                           if getattr(self, campo) is not None)
+        return f"Sessao({campos})"
+
+
+async def expirar_conversa(update, context):
+    """Handler do estado ``ConversationHandler.TIMEOUT``: apaga os valores do fluxo abandonado.
+
+    Roda num job, fora de um update, então o PTB não marca o ``user_data``
+    para a persistência; sem isso os campos voltariam depois de um restart.
+    """
+    sessao = context.user_data
+    if sessao is not None and sessao.em_fluxo():
+        sessao.limpar_fluxo()
+        context.application.mark_data_for_update_persistence(user_ids=update.effective_user.id)
+
+
+class Varredura:
+    """Limpa os fluxos e descarta as sessões de quem ficou ``ttl`` segundos sem update.
+
+    ``marcar_visto`` (um ``TypeHandler`` no grupo -1) guarda o instante do
+    último update de cada usuário num ``OrderedDict`` em ordem de atividade,
+    então a varredura só tira da frente quem passou do prazo: o custo é o
+    número de expirados, não o de sessões na memória.
+    """
+
+    def __init__(self, ttl=TTL_SESSAO):
+        self.ttl = ttl
+        # user_id -> time.time() do último update, do mais antigo para o mais recente
+        self._vistos = OrderedDict()
+        self._partida = time.time()
+        # As sessões restauradas da persistência ainda não foram conferidas
+        self._restauradas = True
+
+    async def marcar_visto(self, update, context):
+        if update.effective_user is not None:
+            self._vistos[update.effective_user.id] = time.time()
+            self._vistos.move_to_end(update.effective_user.id)
+
+    def varrer(self, sessoes, agora=None):
+        """Expira quem passou do prazo; devolve ``(limpas, descartaveis)``, listas de user_id.
+
+        ``sessoes`` é o ``application.user_data``. ``limpas`` são as sessões
+        que tiveram os campos de fluxo apagados (o chamador as marca para a
+        persistência) e ``descartaveis`` as que ficaram vazias (o chamador faz
+        o ``drop_user_data``).
+        """
+        agora = time.time() if agora is None else agora
+        limite = agora - self.ttl
+        parados = []
+        if self._restauradas and agora - self._partida >= self.ttl:
+            # Sessões restauradas da persistência sem nenhum update desde a
+            # partida: conferidas uma vez, um ttl depois, como se vistas nela
+            self._restauradas = False
+            parados.extend(user_id for user_id in sessoes if user_id not in self._vistos)
+        while self._vistos:
+            user_id, visto = next(iter(self._vistos.items()))
+            if visto >= limite:
+                break
+            del self._vistos[user_id]
+            parados.append(user_id)
+
+        limpas, descartaveis = [], []
+        for user_id in parados:
+            sessao = sessoes.get(user_id)
+            if sessao is None:
+                continue
+            if sessao.em_fluxo():
+                sessao.limpar_fluxo()
+                limpas.append(user_id)
+            if sessao.vazia():
+                descartaveis.append(user_id)
+        return limpas, descartaveis
+
+    async def _job(self, context):
+        inicio = time.perf_counter()
+        limpas, descartaveis = self.varrer(context.application.user_data)
+        if limpas:
+            context.application.mark_data_for_update_persistence(user_ids=limpas)
+        for user_id in descartaveis:
+            context.application.drop_user_data(user_id)
+        if limpas or descartaveis:
+            logger.info("Sessões expiradas: %d fluxos limpos, %d sessões descartadas (%.1f ms)",
+                        len(limpas), len(descartaveis), (time.perf_counter() - inicio) * 1e3)
+
+
+def agendar_varredura(application, ttl=TTL_SESSAO, intervalo=INTERVALO_VARREDURA):
+    """Registra o ``TypeHandler`` de atividade e agenda no ``job_queue`` a ``Varredura`` das sessões."""
+    if application.job_queue is None:
+        logger.warning("Sem job_queue (instale python-telegram-bot[job-queue]): sessões abandonadas não expiram.")
+        return None
+    varredura = Varredura(ttl)
+    application.add_handler(TypeHandler(Update, varredura.marcar_visto), group=-1)
+    application.job_queue.run_repeating(varredura._job, intervalo, first=intervalo, name="varrer_sessoes")
+    return varredura
@@ -0,0 +1,84 @@
+"""Transporte da Bot API: um pool de conexões para os envios e outro para o getUpdates.
+
+Cada handler faz de uma a três chamadas à Bot API, e um pico de updates vira
+centenas de chamadas ao mesmo tempo. Com o cliente padrão do PTB (pool de
+256 conexões) todas elas vão de uma vez para o pool do httpcore, que a cada
+chamada que entra ou sai percorre a fila inteira contra todas as conexões:
+numa rajada de 500 chamadas isso é CPU quadrática, e o loop do bot para
+(ver benchmarks/bench_transporte.py). O perfil dos envios:
+
+- entrega ao httpx no máximo ``concorrencia`` chamadas de cada vez (as outras
+  esperam numa fila nossa, de custo constante), com um pool do mesmo tamanho:
+  nenhuma chamada espera conexão no pool, e nenhuma perde o envio por
+  ``TimedOut`` de pool cheio;
+- mantém as conexões ociosas por ``keepalive`` segundos (o httpx fecha em 5 s:
+  num bot com picos espaçados, cada pico pagaria de novo o TCP e o TLS);
+- negocia HTTP/2 (ALPN) quando o pacote ``h2`` está instalado: as chamadas
+  simultâneas dividem uma conexão. Um servidor só HTTP/1.1 (ou uma URL
+  ``http://``) continua em HTTP/1.1.
+
+O getUpdates (long polling) fica num pool próprio de uma conexão, então nunca
+ocupa uma conexão dos envios nem espera por elas.
+
+As ``RequisicaoMedida`` contam chamadas e conexões abertas (o reaproveitamento
+do pool) para o /metrics; a latência de cada método sai no histograma
+``bot_api_segundos``.
+"""
+import asyncio
+import importlib.util
+
+import httpx
+
+from metricas import RequisicaoMedida
+
+CONCORRENCIA = 16
+KEEPALIVE = 60.0
+
+
+def http2_disponivel():
+    return importlib.util.find_spec("h2") is not None
+
+
+class RequisicaoEnvios(RequisicaoMedida):
+    """``RequisicaoMedida`` que entrega ao httpx no máximo ``concorrencia`` chamadas ao mesmo tempo."""
+
+    def __init__(self, concorrencia, *args, **kwargs):
+        self.na_fila = 0
+        self._vagas = asyncio.Semaphore(concorrencia)
+        super().__init__(*args, **kwargs)
+
+    async def do_request(self, *args, **kwargs):
+        self.na_fila += 1
+        try:
+            await self._vagas.acquire()
+        finally:
+            self.na_fila -= 1
+        try:
+            return await super().do_request(*args, **kwargs)
+        finally:
+            self._vagas.release()
+
+    def estatisticas(self):
+        return {**super().estatisticas(), "na_fila": self.na_fila}
+
+
+def requisicao_envios(concorrencia=CONCORRENCIA, keepalive=KEEPALIVE, http2=None, tls=None, **httpx_kwargs):
+    """``RequisicaoEnvios`` dos envios. ``http2=None`` liga o HTTP/2 se o ``h2`` estiver instalado.
+
+    ``httpx_kwargs`` vão para o ``httpx.AsyncClient`` (ex: ``http1=False``
+    para HTTP/2 sem TLS num servidor local).
+    """
+    if http2 is None:
+        http2 = http2_disponivel()
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia,
+                           keepalive_expiry=keepalive)
+    # Os dois ligados: o HTTP/2 é oferecido e o servidor escolhe
+    kwargs = {"limits": limites, "http1": True, "http2": http2}
+    if tls is not None:
+        kwargs["verify"] = tls
+    return RequisicaoEnvios(concorrencia, connection_pool_size=concorrencia, httpx_kwargs={**kwargs, **httpx_kwargs})
+
+
+def requisicao_updates(tls=None):
+    """``RequisicaoMedida`` do getUpdates: uma conexão, sempre a mesma."""
+    return RequisicaoMedida(connection_pool_size=1, httpx_kwargs={"verify": tls} if tls is not None else None)
@@ -0,0 +1,222 @@
+"""Modo webhook: recebe os updates do Telegram num servidor HTTP local.
+
+Alternativa ao ``run_polling``. Um servidor asyncio mínimo (sem dependências
+extras) aceita os POSTs do Telegram, valida o cabeçalho
+``X-Telegram-Bot-Api-Secret-Token`` e entrega o update para a fila da
+``Application``. ``GET /health`` responde o estado do bot para o supervisor ou
+o balanceador de carga.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import re
+import signal
+import time
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# O Telegram só aceita 1-256 caracteres A-Z, a-z, 0-9, _ e - no secret_token
+_SECRET_VALIDO = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+_TAMANHO_MAXIMO = 1024 * 1024
+# Segundos para chegar cada cabeçalho (inclusive a próxima requisição numa conexão ociosa) e cada corpo
+TEMPO_LEITURA = 30.0
+_MAX_CABECALHOS = 100
+
+_STATUS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class ConfigWebhook:
+    """Configuração do modo webhook, lida das variáveis de ambiente."""
+
+    def __init__(self, url, secret_token, listen="127.0.0.1", port=8080, path="telegram"):
+        if not url:
+            raise ValueError("WEBHOOK_URL é obrigatório no modo webhook.")
+        if not secret_token or not _SECRET_VALIDO.match(secret_token):
+            raise ValueError("WEBHOOK_SECRET deve ter 1-256 caracteres (A-Z, a-z, 0-9, _ ou -).")
+        self.url = url.rstrip('/')
+        self.secret_token = secret_token
+        self.listen = listen
+        self.port = int(port)
+        self.path = '/' + path.strip('/')
+
+    @property
+    def webhook_url(self):
+        return self.url + self.path
+
+    @classmethod
+    def from_env(cls, env):
+        return cls(
+            url=env.get("WEBHOOK_URL"),
+            secret_token=env.get("WEBHOOK_SECRET"),
+            listen=env.get("WEBHOOK_LISTEN", "127.0.0.1"),
+            port=env.get("WEBHOOK_PORT", "8080"),
+            path=env.get("WEBHOOK_PATH", "telegram"),
+        )
+
+
+class ServidorWebhook:
+    """Servidor HTTP/1.1 com keep-alive que entrega updates à Application."""
+
+    def __init__(self, application, config):
+        self.application = application
+        self.config = config
+        self.recebidos = 0
+        self.rejeitados = 0
+        self.tempo_leitura = TEMPO_LEITURA
+        self._iniciado_em = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._atender, self.config.listen, self.config.port)
+        self._iniciado_em = time.monotonic()
+        logger.info("Webhook ouvindo em %s:%s%s", self.config.listen, self.config.port, self.config.path)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def porta(self):
+        """Porta efetiva (útil quando configurada como 0)."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                requisicao = await asyncio.wait_for(_ler_cabecalhos(reader), self.tempo_leitura)
+                if requisicao is None:
+                    break
+                metodo, caminho, cabecalhos = requisicao
+                tamanho = int(cabecalhos.get('content-length', 0))
+                if tamanho < 0:
+                    raise ValueError(tamanho)
+                # O corpo só é lido depois do caminho, do secret e do tamanho conferidos
+                status, resposta = self._recusar(metodo, caminho, cabecalhos, tamanho)
+                lido = status is None
+                if lido:
+                    corpo = await asyncio.wait_for(reader.readexactly(tamanho), self.tempo_leitura) if tamanho else b''
+                    status, resposta = await self._entregar(corpo)
+                # Com um corpo não lido na conexão, a próxima requisição sairia torta: fecha
+                manter = cabecalhos.get('connection', '').lower() != 'close' and (lido or not tamanho)
+                _escrever_resposta(writer, status, resposta, manter)
+                await writer.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _recusar(self, metodo, caminho, cabecalhos, tamanho):
+        """``(status, resposta)`` decidida só pelos cabeçalhos, ou ``(None, None)`` para ler o corpo e entregar o update."""
+        if caminho == '/health':
+            if metodo != 'GET':
+                return 405, {"ok": False}
+            return 200, {
+                "ok": self.application.running,
+                "modo": "webhook",
+                "pendentes": self.application.update_queue.qsize(),
+                "recebidos": self.recebidos,
+                "rejeitados": self.rejeitados,
+                "uptime": round(time.monotonic() - self._iniciado_em, 1),
+            }
+
+        if caminho != self.config.path:
+            return 404, {"ok": False}
+        if metodo != 'POST':
+            return 405, {"ok": False}
+        # Comparação em tempo constante: o tempo da resposta não revela o secret aos poucos
+        if not hmac.compare_digest(cabecalhos.get('x-telegram-bot-api-secret-token', '').encode('latin-1'),
+                                   self.config.secret_token.encode()):
+            self.rejeitados += 1
+            logger.warning("Webhook: secret token inválido.")
+            return 403, {"ok": False}
+        if tamanho > _TAMANHO_MAXIMO:
+            self.rejeitados += 1
+            return 413, {"ok": False}
+        return None, None
+
+    async def _entregar(self, corpo):
+        try:
+            dados = json.loads(corpo)
+            # JSON válido que não é um objeto ([], null, 1) não é um update
+            if not isinstance(dados, dict):
+                raise ValueError("update não é um objeto JSON")
+            update = Update.de_json(dados, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            # AttributeError: campos internos de tipo errado (ex: "message": 1)
+            self.rejeitados += 1
+            return 400, {"ok": False}
+
+        self.recebidos += 1
+        await self.application.update_queue.put(update)
+        return 200, {"ok": True}
+
+
+async def _ler_cabecalhos(reader):
+    """``(método, caminho, cabecalhos)`` da próxima requisição, sem o corpo; ``None`` se a conexão fechou."""
+    linha = await reader.readline()
+    if not linha:
+        return None
+    metodo, caminho, _ = linha.decode('latin-1').split(' ', 2)
+
+    cabecalhos = {}
+    while True:
+        linha = await reader.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        if len(cabecalhos) >= _MAX_CABECALHOS:
+            raise ValueError("cabeçalhos demais")
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip()
+    return metodo, caminho.split('?', 1)[0], cabecalhos
+
+
+def _escrever_resposta(writer, status, resposta, manter):
+    corpo = json.dumps(resposta).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {_STATUS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(corpo)}\r\n"
+        f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n".encode() + corpo
+    )
+
+
+async def rodar_webhook(application, config, drop_pending_updates=False):
+    """Registra o webhook no Telegram e atende até receber SIGINT/SIGTERM.
+
+    Chama ``post_init``/``post_shutdown`` da Application como o ``run_polling``.
+    """
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C chega como KeyboardInterrupt
+            pass
+
+    servidor = ServidorWebhook(application, config)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=config.webhook_url,
+            secret_token=config.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=drop_pending_updates,
+        )
+        await application.start()
+        await servidor.start()
+        try:
+            await parar.wait()
+        finally:
+            await servidor.stop()
+            await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)